@@ -0,0 +1,40 @@
+"""
+Configuración de gunicorn.
+El tipo de worker se elige con variables de entorno:
+
+- gthread (por defecto): cada proceso atiende varias peticiones en hilos, de
+  modo que una lectura lenta de Google Sheets no bloquea el proceso entero.
+- gevent: cada proceso atiende cientos de conexiones con greenlets; las
+  llamadas HTTP a Google Sheets ceden el control mientras esperan la red.
+- sync: un proceso por petición, el comportamiento original.
+"""
+import logging
+import os
+
+# Configurar logging
+logger = logging.getLogger('gunicorn.error')
+
+def _worker_class(name):
+    """Tipo de worker pedido, o gthread si gevent no está instalado"""
+    if name == 'gevent':
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            logger.warning("gevent no está instalado; se usarán workers gthread")
+            return 'gthread'
+    return name
+
+# Heroku define WEB_CONCURRENCY según el tamaño del dyno
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = _worker_class(os.environ.get('GUNICORN_WORKER_CLASS', 'gthread').lower())
+
+# Hilos por proceso (solo gthread: con más de un hilo gunicorn convierte los
+# workers sync en gthread) y conexiones simultáneas por proceso (gevent)
+threads = int(os.environ.get('GUNICORN_THREADS', 8)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+
+# Segundos sin respuesta antes de reiniciar un worker; Heroku corta a los 30.
+# SHEETS_FETCH_TIMEOUT y SHEETS_CACHE_WAIT_TIMEOUT (server/config.py) deben ser
+# menores para que una lectura lenta de Google Sheets falle antes que la petición.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
@@ -17,6 +17,10 @@ def create_app():
     app = Flask(__name__, static_folder='../client/build', static_url_path='')
     CORS(app)  # Habilitar CORS para todas las rutas
     
+    # Serializar las respuestas JSON con orjson y tipos de NumPy/pandas
+    from server.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+    
     # Cargar configuración
     from server.config import get_config
     config_class = get_config()
@@ -29,6 +33,16 @@ def create_app():
     from server.routes.api import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # Cargar las últimas instantáneas de las hojas guardadas en disco
+    from server.sheets_service import restore_snapshots
+    restore_snapshots()
+    
+    # Precalentar las consultas frecuentes en la caché de respuestas
+    if (app.config.get('PREWARM_ENABLED') and app.config.get('RESPONSE_CACHE_ENABLED')
+            and app.config.get('SHEETS_CACHE_ENABLED')):
+        from server.routes.api import start_prewarm
+        start_prewarm(app)
+    
     # Verificar si la carpeta static existe
     if not os.path.exists(app.static_folder):
         logger.warning(f"La carpeta static '{app.static_folder}' no existe. Se usará un directorio temporal.")
@@ -40,6 +54,33 @@ def create_app():
             with open(index_path, 'w') as f:
                 f.write('<html><body><h1>App en construcción</h1><p>La aplicación está en proceso de despliegue.</p></body></html>')
     
+    # Compresión de respuestas y archivos estáticos precomprimidos
+    from server.compression import compress_response, precompress_static, send_precompressed
+    if app.config.get('COMPRESSION_ENABLED') and app.config.get('STATIC_PRECOMPRESS'):
+        try:
+            precompress_static(app.static_folder, app.config['COMPRESSION_MIN_SIZE'])
+        except Exception as e:
+            logger.error(f"Error al precomprimir los archivos estáticos: {e}")
+    
+    if app.config.get('COMPRESSION_ENABLED'):
+        app.view_functions['static'] = lambda filename: send_precompressed(app.static_folder, filename)
+        
+        @app.after_request
+        def compress(response):
+            """Comprimir las respuestas de texto que superan el tamaño mínimo"""
+            return compress_response(
+                response,
+                min_size=app.config['COMPRESSION_MIN_SIZE'],
+                gzip_level=app.config['COMPRESSION_GZIP_LEVEL'],
+                brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY']
+            )
+    
+    def send_static(filename):
+        """Enviar un archivo del build, precomprimido si está habilitado"""
+        if app.config.get('COMPRESSION_ENABLED'):
+            return send_precompressed(app.static_folder, filename)
+        return send_from_directory(app.static_folder, filename)
+    
     # Ruta para servir la aplicación React
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
@@ -48,12 +89,12 @@ def create_app():
         logger.info(f"Solicitando ruta: {path}")
         if path and os.path.exists(os.path.join(app.static_folder, path)):
             logger.info(f"Sirviendo archivo: {path}")
-            return send_from_directory(app.static_folder, path)
+            return send_static(path)
         
         index_path = os.path.join(app.static_folder, 'index.html')
         if os.path.exists(index_path):
             logger.info("Sirviendo index.html")
-            return send_from_directory(app.static_folder, 'index.html')
+            return send_static('index.html')
         else:
             logger.error(f"No se pudo encontrar index.html en {app.static_folder}")
             return jsonify({
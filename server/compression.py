@@ -0,0 +1,216 @@
+"""
+Compresión de las respuestas HTTP.
+Comprime con brotli o gzip, según lo que acepte el cliente, las respuestas de
+texto que superan un tamaño mínimo, y sirve los archivos del build de React
+desde versiones precomprimidas (.br/.gz) generadas una sola vez.
+"""
+import gzip
+import logging
+import mimetypes
+import os
+import sys
+import zlib
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Tipos de contenido que merece la pena comprimir
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain',
+    'text/css', 'text/javascript', 'application/javascript', 'image/svg+xml'
+}
+
+# Archivos estáticos que se precomprimen
+PRECOMPRESS_EXTENSIONS = ('.html', '.js', '.css', '.json', '.map', '.svg', '.txt', '.ico')
+
+# Extensión del archivo precomprimido de cada codificación
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+def available_encodings():
+    """Codificaciones soportadas, de mayor a menor preferencia"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def negotiate_encoding():
+    """
+    Elige la codificación para la petición actual según Accept-Encoding
+
+    Returns:
+        str: 'br', 'gzip' o None si el cliente no acepta ninguna
+    """
+    for encoding in available_encodings():
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+def _compress(data, encoding, level):
+    """Comprime un bloque completo de bytes"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level['br'])
+    return gzip.compress(data, compresslevel=level['gzip'], mtime=0)
+
+def compress_body(data, encoding, gzip_level=6, brotli_quality=4):
+    """
+    Comprime un cuerpo completo con la codificación indicada
+
+    Args:
+        data (bytes): Cuerpo sin comprimir
+        encoding (str): 'br' o 'gzip'
+        gzip_level (int): Nivel de compresión gzip (1-9)
+        brotli_quality (int): Calidad de compresión brotli (0-11)
+
+    Returns:
+        bytes: Cuerpo comprimido
+    """
+    return _compress(data, encoding, {'gzip': gzip_level, 'br': brotli_quality})
+
+def _iter_compressed(chunks, encoding, level):
+    """Comprime por bloques una respuesta generada por streaming"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level['br'])
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level['gzip'], zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+def compress_response(response, min_size=1024, gzip_level=6, brotli_quality=4):
+    """
+    Comprime una respuesta si el cliente lo acepta y merece la pena
+
+    Las respuestas por streaming se comprimen por bloques sin conocer su tamaño.
+    Las que ya vienen comprimidas (p. ej. desde la caché de respuestas) no se
+    vuelven a comprimir. Los ETag pasan a ser débiles porque el cuerpo enviado
+    depende de la codificación.
+
+    Args:
+        response (flask.Response): Respuesta generada por la vista
+        min_size (int): Tamaño mínimo en bytes para comprimir una respuesta completa
+        gzip_level (int): Nivel de compresión gzip (1-9)
+        brotli_quality (int): Calidad de compresión brotli (0-11)
+
+    Returns:
+        flask.Response: La misma respuesta, comprimida o no
+    """
+    if 'Content-Encoding' in response.headers:
+        return _weaken_etag(response)
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    level = {'gzip': gzip_level, 'br': brotli_quality}
+    if response.is_streamed:
+        response.response = _iter_compressed(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(_compress(data, encoding, level))
+
+    response.headers['Content-Encoding'] = encoding
+    return _weaken_etag(response)
+
+def _weaken_etag(response):
+    """Convierte en débil el ETag de una respuesta comprimida"""
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def send_precompressed(directory, filename):
+    """
+    Envía un archivo estático, usando su versión .br/.gz si existe y el cliente la acepta
+
+    Args:
+        directory (str): Carpeta de archivos estáticos
+        filename (str): Ruta del archivo dentro de la carpeta
+
+    Returns:
+        flask.Response: Respuesta con el archivo
+    """
+    encoding = negotiate_encoding()
+    if encoding is not None:
+        compressed = filename + ENCODING_SUFFIXES[encoding]
+        path = safe_join(directory, compressed)
+        if path is not None and os.path.isfile(path):
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_from_directory(directory, compressed, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+
+    response = send_from_directory(directory, filename)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def _write_atomic(path, data):
+    """Escribe un archivo mediante un temporal y rename"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def precompress_static(directory, min_size=1024):
+    """
+    Genera las versiones .br/.gz de los archivos estáticos de texto
+
+    Solo se regeneran los archivos precomprimidos que falten o sean más
+    antiguos que el original, por lo que llamarla en cada arranque es barato.
+
+    Args:
+        directory (str): Carpeta del build de React
+        min_size (int): Tamaño mínimo en bytes para precomprimir un archivo
+
+    Returns:
+        int: Número de archivos precomprimidos generados
+    """
+    level = {'gzip': 9, 'br': 11}
+    generated = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+
+            data = None
+            for encoding in available_encodings():
+                target = path + ENCODING_SUFFIXES[encoding]
+                if os.path.exists(target) and os.stat(target).st_mtime >= stat.st_mtime:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                _write_atomic(target, _compress(data, encoding, level))
+                generated += 1
+
+    if generated:
+        logger.info(f"Generados {generated} archivos estáticos precomprimidos en {directory}")
+    return generated
+
+if __name__ == '__main__':
+    # Uso: python -m server.compression client/build
+    logging.basicConfig(level=logging.INFO)
+    precompress_static(sys.argv[1] if len(sys.argv) > 1 else 'client/build')
@@ -1,5 +1,6 @@
 import os
 import json
+import tempfile
 from dotenv import load_dotenv
 import logging
 
@@ -17,6 +18,54 @@ class Config:
     SPREADSHEET_ID = os.environ.get('SPREADSHEET_ID')
     GOOGLE_CREDENTIALS = os.environ.get('GOOGLE_CREDENTIALS')
     
+    # Tiempos máximos de lectura (segundos). Deben quedar por debajo del tiempo
+    # máximo de una petición: 30 s del router de Heroku y GUNICORN_TIMEOUT, de
+    # modo que una lectura lenta falle (y se sirva la instantánea anterior)
+    # antes de que se corte la petición. Las llamadas no se reintentan, así que
+    # SHEETS_FETCH_TIMEOUT acota toda la lectura y SHEETS_HTTP_TIMEOUT cada llamada.
+    SHEETS_HTTP_TIMEOUT = int(os.environ.get('SHEETS_HTTP_TIMEOUT', 20))
+    
+    # Lectura en paralelo de las hojas (una petición por hoja). Por defecto 0:
+    # una sola petición batchGet para todas, que consume menos cuota de la API
+    SHEETS_FETCH_WORKERS = int(os.environ.get('SHEETS_FETCH_WORKERS', 0))
+    SHEETS_FETCH_TIMEOUT = int(os.environ.get('SHEETS_FETCH_TIMEOUT', 25))
+    
+    # Caché de instantáneas de las hojas (segundos)
+    SHEETS_CACHE_ENABLED = os.environ.get('SHEETS_CACHE_ENABLED', '1') != '0'
+    SHEETS_CACHE_TTL = int(os.environ.get('SHEETS_CACHE_TTL', 60))
+    SHEETS_CACHE_MAX_STALE = int(os.environ.get('SHEETS_CACHE_MAX_STALE', 900))
+    SHEETS_CACHE_WAIT_TIMEOUT = int(os.environ.get('SHEETS_CACHE_WAIT_TIMEOUT', 25))
+    
+    # Sincronización incremental de las hojas (solo filas nuevas)
+    SHEETS_INCREMENTAL_SYNC = os.environ.get('SHEETS_INCREMENTAL_SYNC', '1') != '0'
+    SHEETS_FULL_SYNC_INTERVAL = int(os.environ.get('SHEETS_FULL_SYNC_INTERVAL', 3600))
+    SHEETS_SYNC_TAIL_ROWS = int(os.environ.get('SHEETS_SYNC_TAIL_ROWS', 20))
+    
+    # Instantáneas en disco (Feather) para arranques en caliente
+    SNAPSHOT_STORE_ENABLED = os.environ.get('SNAPSHOT_STORE_ENABLED', '1') != '0'
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(tempfile.gettempdir(), 'cafe-dashboard-snapshots')
+    
+    # Caché de respuestas de la API (JSON ya serializado)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') != '0'
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+    
+    # Precalentamiento de las consultas frecuentes tras cada nueva instantánea.
+    # Entradas 'endpoint[:ventana]' con ventana 'month' (mes actual) o 'Nd' (últimos N días)
+    PREWARM_ENABLED = os.environ.get('PREWARM_ENABLED', '1') != '0'
+    PREWARM_QUERIES = os.environ.get(
+        'PREWARM_QUERIES', 'summary,summary:7d,daily:7d,coffee-types,proceso-ganancia')
+    PREWARM_DELAY = float(os.environ.get('PREWARM_DELAY', 1.0))
+    
+    # Peticiones condicionales (ETag) y caché del navegador (segundos)
+    API_CACHE_MAX_AGE = int(os.environ.get('API_CACHE_MAX_AGE', 0))
+    
+    # Compresión gzip/brotli de las respuestas y de los archivos estáticos
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') != '0'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+    STATIC_PRECOMPRESS = os.environ.get('STATIC_PRECOMPRESS', '1') != '0'
+    
     # Otras configuraciones
     LOG_LEVEL = logging.INFO
     
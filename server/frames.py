@@ -0,0 +1,449 @@
+"""
+Normalización de los DataFrames leídos de Google Sheets.
+Convierte una sola vez por instantánea las fechas, importes, categorías e IDs
+para que los cálculos trabajen directamente con columnas tipadas.
+"""
+import hashlib
+import json
+import logging
+import threading
+import weakref
+from datetime import datetime
+from itertools import repeat
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, union_categoricals
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Esquema común a todas las hojas (nombres de columna en minúsculas)
+DATE_COLUMNS = ['fecha']
+NUMERIC_COLUMNS = ['cantidad', 'precio', 'total', 'monto', 'preciototal', 'precio_kg', 'precio_total']
+CATEGORICAL_COLUMNS = ['tipo_cafe', 'cliente']
+
+# Origen de los números de serie de fecha de Google Sheets
+SHEETS_EPOCH = '1899-12-30'
+
+def is_id_column(col):
+    """Indica si una columna contiene identificadores ('id', 'codigo', 'proceso_id', 'compras_ids'...)"""
+    name = str(col).lower()
+    return name in ['id', 'codigo'] or name.endswith('_id') or name.endswith('_ids') or name.startswith('id_')
+
+def parse_dates(series):
+    """
+    Convierte una columna de fechas a datetime64
+
+    Acepta texto y los números de serie que devuelve la API con UNFORMATTED_VALUE.
+    Los valores no válidos se convierten en NaT.
+    """
+    if is_datetime64_any_dtype(series):
+        return series
+
+    is_serial = series.map(lambda value: isinstance(value, (int, float)) and not isinstance(value, bool))
+    parsed = pd.to_datetime(series.where(~is_serial), errors='coerce')
+    if is_serial.any():
+        serial = pd.to_datetime(pd.to_numeric(series.where(is_serial), errors='coerce'),
+                                unit='D', origin=SHEETS_EPOCH)
+        parsed = parsed.where(~is_serial, serial)
+    return parsed
+
+def parse_ids(series):
+    """Convierte una columna de IDs a texto sin espacios; los vacíos quedan como ''"""
+    return series.map(lambda value: str(value).strip() if pd.notna(value) else '')
+
+def normalize_sheet(df):
+    """
+    Tipa las columnas conocidas de una hoja
+
+    - `fecha`: datetime64 (NaT si no es válida)
+    - importes y cantidades: float64 (0.0 si no son numéricos)
+    - `tipo_cafe`, `cliente`: categóricas
+    - IDs: texto sin espacios
+
+    El DataFrame resultante se comparte entre peticiones a través de la caché
+    y debe tratarse como de solo lectura.
+
+    Args:
+        df (pandas.DataFrame): DataFrame tal como se leyó de la hoja
+
+    Returns:
+        pandas.DataFrame: Nuevo DataFrame con las columnas tipadas
+    """
+    if df.empty and len(df.columns) == 0:
+        return df
+
+    normalized = df.copy(deep=False)
+    for position, col in enumerate(df.columns):
+        name = str(col).lower()
+        series = df.iloc[:, position]
+        try:
+            if name in DATE_COLUMNS:
+                series = parse_dates(series)
+            elif name in NUMERIC_COLUMNS:
+                series = pd.to_numeric(series, errors='coerce').fillna(0).astype('float64')
+            elif name in CATEGORICAL_COLUMNS:
+                series = series.astype('category')
+            elif is_id_column(name):
+                series = parse_ids(series)
+        except Exception as e:
+            logger.error(f"Error al normalizar la columna {col}: {e}")
+        normalized.isetitem(position, series)
+
+    return normalized
+
+def append_rows(df, new_rows):
+    """
+    Añade al final de un DataFrame normalizado las filas de otro con las mismas columnas
+
+    Las columnas categóricas se combinan uniendo sus categorías para conservar el tipo.
+
+    Returns:
+        pandas.DataFrame: Nuevo DataFrame con índice consecutivo
+    """
+    if len(df.columns) == 0:
+        return new_rows.reset_index(drop=True)
+    if new_rows.empty:
+        return df
+
+    combined = pd.concat([df, new_rows], ignore_index=True)
+    for position in range(len(df.columns)):
+        old = df.iloc[:, position]
+        new = new_rows.iloc[:, position]
+        if isinstance(old.dtype, pd.CategoricalDtype) and isinstance(new.dtype, pd.CategoricalDtype):
+            merged = union_categoricals([old.array, new.array], sort_categories=True)
+            combined.isetitem(position, pd.Series(merged, index=combined.index))
+    return combined
+
+def frame_to_records(df):
+    """
+    Convierte un DataFrame normalizado en una lista de registros serializables a JSON
+
+    Las fechas se devuelven como texto 'YYYY-MM-DD HH:MM:SS' y los valores
+    ausentes como None.
+    """
+    records = df.copy(deep=False)
+    for position in range(len(df.columns)):
+        series = df.iloc[:, position]
+        if is_datetime64_any_dtype(series):
+            series = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+        series = series.astype(object)
+        records.isetitem(position, series.where(series.notna(), None))
+    return records.to_dict(orient='records')
+
+def _json_value(value):
+    """Codifica un valor de Python como bytes JSON"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+def _json_numbers(values):
+    """
+    Codifica un array numérico sin valores ausentes como fragmentos JSON
+
+    Con orjson el array se serializa entero sin pasar por objetos de Python y
+    se separa por comas (los números no contienen comas). En ambos casos los
+    decimales quedan con la representación más corta que se lee de vuelta
+    como el mismo valor.
+    """
+    if orjson is not None:
+        encoded = orjson.dumps(np.ascontiguousarray(values), option=orjson.OPT_SERIALIZE_NUMPY)
+        return np.array(encoded[1:-1].split(b','), dtype=object)
+    return np.array([repr(value).encode('ascii') for value in values.tolist()], dtype=object)
+
+def _json_strings(values):
+    """
+    Codifica una lista no vacía de textos como fragmentos JSON con una sola llamada
+
+    Dentro de un texto codificado las comillas siempre van escapadas, así que
+    la secuencia '","' solo aparece entre dos elementos de la lista.
+    """
+    encoded = _json_value(values)
+    return b'"' + np.array(encoded[2:-2].split(b'","'), dtype=object) + b'"'
+
+def _json_column(series):
+    """
+    Codifica los valores de una columna como fragmentos de texto JSON
+
+    - números y booleanos sin valores ausentes: el array completo de una vez
+    - categóricas: cada categoría una sola vez, repartida según los códigos
+    - fechas y textos: todos los textos de una vez, null si faltan
+    - resto: valor a valor, null si falta
+
+    Returns:
+        numpy.ndarray: Un fragmento (bytes) por fila
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = [_json_value(value) for value in series.cat.categories.astype(object).tolist()]
+        # El código -1 (valor ausente) toma el último elemento: null
+        return np.array(categories + [b'null'], dtype=object)[series.cat.codes.to_numpy()]
+    if is_datetime64_any_dtype(series):
+        series = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+    elif isinstance(series.dtype, np.dtype) and not series.hasnans:
+        values = series.to_numpy()
+        if series.dtype.kind == 'b':
+            return np.where(values, b'true', b'false').astype(object)
+        if series.dtype.kind in 'iu' or (series.dtype == np.float64 and np.isfinite(values).all()):
+            return _json_numbers(values)
+
+    values = series.astype(object)
+    present = values.notna().to_numpy()
+    items = values[present].tolist()
+    fragments = np.full(len(values), b'null', dtype=object)
+    if items and all(type(item) is str for item in items):
+        fragments[present] = _json_strings(items)
+    elif items:
+        fragments[present] = np.array([_json_value(item) for item in items], dtype=object)
+    return fragments
+
+def frame_to_json(df):
+    """
+    Serializa un DataFrame normalizado como lista JSON de registros
+
+    Equivale a serializar frame_to_records(df) con las claves ordenadas, pero
+    sin construir un dict por fila: cada columna se codifica de una vez y cada
+    registro se forma uniendo las claves con el fragmento de cada columna. Los
+    números decimales se escriben con la representación más corta que se lee
+    de vuelta como el mismo valor (140.64 y no 140.639999999999986), igual que
+    en el resto de respuestas.
+
+    Returns:
+        str: Texto JSON
+    """
+    if len(df) == 0:
+        return '[]'
+
+    # Con columnas repetidas, cada registro conserva el último valor (como to_dict)
+    df = df.loc[:, ~df.columns.duplicated(keep='last')]
+    if len(df.columns) == 0:
+        return '[' + ','.join(['{}'] * len(df)) + ']'
+
+    order = sorted(range(len(df.columns)), key=lambda position: str(df.columns[position]))
+    # Cada registro se une a partir de las claves y del fragmento de cada columna
+    parts = []
+    for position in order:
+        key = _json_value(str(df.columns[position])) + b':'
+        parts.append(repeat((b',' if parts else b'{') + key))
+        parts.append(_json_column(df.iloc[:, position]).tolist())
+    parts.append(repeat(b'}'))
+    return (b'[' + b','.join(map(b''.join, zip(*parts))) + b']').decode('utf-8')
+
+def detail_records(df):
+    """
+    Convierte un DataFrame en registros con la fecha ya formateada como 'YYYY-MM-DD'
+
+    Las fechas no válidas (o una columna 'fecha' sin tipo fecha) quedan como None.
+    """
+    if 'fecha' in df.columns:
+        if is_datetime64_any_dtype(df['fecha']):
+            fechas = df['fecha'].dt.strftime('%Y-%m-%d').astype(object)
+            df = df.assign(fecha=fechas.where(fechas.notna(), None))
+        else:
+            df = df.assign(fecha=None)
+    return df.to_dict(orient='records')
+
+def is_appended(previous, df):
+    """
+    Indica si df es igual a previous con filas añadidas al final
+
+    Las columnas categóricas se comparan por sus valores, ya que las filas
+    nuevas pueden añadir categorías.
+    """
+    if previous is None or list(previous.columns) != list(df.columns) or len(df) < len(previous):
+        return False
+
+    head = df.iloc[:len(previous)]
+    for position in range(len(df.columns)):
+        old = previous.iloc[:, position].reset_index(drop=True)
+        new = head.iloc[:, position].reset_index(drop=True)
+        if isinstance(old.dtype, pd.CategoricalDtype) or isinstance(new.dtype, pd.CategoricalDtype):
+            old = old.astype(object)
+            new = new.astype(object)
+        if not old.equals(new):
+            return False
+    return True
+
+def _localize(value, timezone):
+    """Timestamp con zona horaria: las fechas sin zona se interpretan como hora local de timezone"""
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        return stamp.tz_localize(timezone)
+    return stamp.tz_convert(timezone)
+
+def local_now(timezone='America/Lima'):
+    """Fecha y hora actuales en timezone (el servidor puede estar en UTC, como en Heroku)"""
+    return datetime.now(ZoneInfo(timezone))
+
+def range_start(start_date, timezone='America/Lima'):
+    """Primer instante incluido en un rango que empieza en start_date ('YYYY-MM-DD')"""
+    return _localize(start_date, timezone)
+
+def range_end(end_date, timezone='America/Lima'):
+    """Último instante incluido en un rango que termina en end_date ('YYYY-MM-DD')"""
+    return _localize(pd.Timestamp(end_date).replace(hour=23, minute=59, second=59), timezone)
+
+def local_wall_time(fechas, timezone='America/Lima'):
+    """
+    Fechas como hora local de timezone sin zona horaria
+
+    Las fechas de las hojas no llevan zona y ya están en hora local; las que
+    sí la llevan se convierten a timezone.
+    """
+    if getattr(fechas.dt, 'tz', None) is None:
+        return fechas
+    return fechas.dt.tz_convert(timezone).dt.tz_localize(None)
+
+class DateIndex:
+    """
+    Posiciones de las filas de un DataFrame ordenadas por fecha
+
+    Permite filtrar por rango de fechas con dos búsquedas binarias en lugar de
+    comparar la columna completa. Las filas sin fecha válida no forman parte
+    del índice, igual que no cumplen ninguna comparación de fechas.
+    """
+
+    def __init__(self, fechas, timezone='America/Lima'):
+        """
+        Args:
+            fechas (pandas.Series): Columna de fechas del DataFrame
+            timezone (str): Zona horaria de las fechas sin zona
+        """
+        values = local_wall_time(parse_dates(fechas), timezone).to_numpy()
+        positions = np.flatnonzero(~np.isnat(values))
+        order = np.argsort(values[positions], kind='stable')
+        self.timezone = timezone
+        self.keys = values[positions][order]
+        self.positions = positions[order]
+        # Filas con fecha ya ordenadas y sin huecos: los rangos son cortes contiguos
+        self.contiguous = bool((np.diff(self.positions) == 1).all())
+
+    def _bound(self, stamp):
+        """Límite de búsqueda en la misma escala que las claves del índice"""
+        return np.datetime64(stamp.tz_convert(self.timezone).tz_localize(None)).astype(self.keys.dtype)
+
+    def take(self, df, start=None, end=None):
+        """
+        Filas de df con fecha entre start y end (ambos incluidos y opcionales)
+
+        Las filas conservan el orden del DataFrame. Si el índice es contiguo, el
+        resultado es un corte de df en lugar de una copia.
+
+        Args:
+            df (pandas.DataFrame): DataFrame del que se construyó el índice
+            start (pandas.Timestamp): Primer instante incluido, con zona horaria
+            end (pandas.Timestamp): Último instante incluido, con zona horaria
+
+        Returns:
+            pandas.DataFrame: Filas dentro del rango
+        """
+        lo = 0 if start is None else np.searchsorted(self.keys, self._bound(start), side='left')
+        hi = len(self.keys) if end is None else np.searchsorted(self.keys, self._bound(end), side='right')
+        if hi <= lo:
+            return df.iloc[:0]
+        if self.contiguous:
+            return df.iloc[self.positions[lo]:self.positions[hi - 1] + 1]
+        return df.take(np.sort(self.positions[lo:hi]))
+
+# Índices de fechas de los DataFrames compartidos (p. ej. los de la caché de hojas).
+# Cada entrada se descarta cuando su DataFrame deja de existir.
+_date_indexes = {}
+_date_indexes_lock = threading.Lock()
+
+def date_index(df, fecha_col='fecha', timezone='America/Lima'):
+    """
+    Índice de fechas de un DataFrame, construido la primera vez que se pide
+
+    Los DataFrames normalizados son de solo lectura, por lo que el índice se
+    reutiliza mientras el DataFrame exista.
+
+    Returns:
+        DateIndex: Índice de la columna fecha_col
+    """
+    key = (id(df), fecha_col, timezone)
+    entry = _date_indexes.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+
+    index = DateIndex(df[fecha_col], timezone)
+    ref = weakref.ref(df, lambda _, key=key: _date_indexes.pop(key, None))
+    with _date_indexes_lock:
+        _date_indexes[key] = (ref, index)
+    return index
+
+def sequential_sum(series):
+    """
+    Suma los valores en orden, como un bucle que acumula desde 0.0
+
+    Series.sum() usa suma por pares, que puede diferir en el último decimal;
+    np.cumsum acumula estrictamente en orden sin recorrer los valores en Python.
+
+    Returns:
+        float: Suma de los valores
+    """
+    values = series.to_numpy(dtype='float64')
+    if len(values) == 0:
+        return 0.0
+    return 0.0 + float(np.cumsum(values)[-1])
+
+def frame_fingerprint(df):
+    """
+    Huella del contenido de un DataFrame (columnas y valores en orden)
+
+    Dos procesos que leen los mismos datos obtienen la misma huella.
+
+    Returns:
+        str: Resumen SHA-1 en hexadecimal
+    """
+    digest = hashlib.sha1(repr([str(col) for col in df.columns]).encode('utf-8'))
+    if not df.empty:
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def filter_by_date_range(df, fecha_col='fecha', start_date=None, end_date=None, timezone='America/Lima'):
+    """
+    Filtra un DataFrame por rango de fechas sin modificar el original
+    
+    Args:
+        df (pandas.DataFrame): DataFrame a filtrar
+        fecha_col (str): Nombre de la columna de fecha
+        start_date (str): Fecha de inicio en formato 'YYYY-MM-DD'
+        end_date (str): Fecha de fin en formato 'YYYY-MM-DD'
+        timezone (str): Zona horaria para las fechas
+        
+    Returns:
+        pandas.DataFrame: DataFrame filtrado
+    """
+    if fecha_col not in df.columns:
+        logger.warning(f"Columna {fecha_col} no encontrada en el DataFrame")
+        return df
+    
+    # Límites del rango en la zona horaria indicada
+    start = end = None
+    if start_date:
+        try:
+            start = range_start(start_date, timezone)
+        except Exception as e:
+            logger.error(f"Error al filtrar por fecha de inicio: {e}")
+    
+    if end_date:
+        try:
+            end = range_end(end_date, timezone)
+        except Exception as e:
+            logger.error(f"Error al filtrar por fecha de fin: {e}")
+    
+    if start is None and end is None:
+        return df
+    
+    # Búsqueda binaria sobre el índice de fechas del DataFrame
+    try:
+        return date_index(df, fecha_col, timezone).take(df, start, end)
+    except Exception as e:
+        logger.error(f"Error al filtrar por fechas: {e}")
+        return df
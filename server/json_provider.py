@@ -0,0 +1,76 @@
+"""
+Serialización JSON de las respuestas de la API.
+Usa orjson si está instalado y entiende de forma nativa los tipos de NumPy y
+pandas; los DataFrames se serializan directamente desde sus columnas.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+from server.frames import frame_to_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def _default(obj):
+    """Convierte los tipos de NumPy y pandas que el serializador no conoce"""
+    if isinstance(obj, pd.Timestamp):
+        return None if pd.isna(obj) else obj.strftime('%Y-%m-%d %H:%M:%S')
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    return DefaultJSONProvider.default(obj)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de la aplicación
+
+    - Con orjson, las respuestas se generan directamente como bytes, con las
+      claves ordenadas igual que el proveedor por defecto de Flask.
+    - Los escalares y arrays de NumPy, Timestamp y Series se serializan sin
+      convertirlos antes a mano.
+    - Un DataFrame se devuelve como lista de registros construida columna a
+      columna, con los decimales en su representación más corta.
+    """
+
+    default = staticmethod(_default)
+
+    def _dumps_bytes(self, obj, indent=False):
+        """Serializa un objeto a bytes JSON"""
+        if isinstance(obj, pd.DataFrame):
+            return frame_to_json(obj).encode('utf-8')
+        if orjson is None:
+            kwargs = {'indent': 2} if indent else {'separators': (',', ':')}
+            return super().dumps(obj, **kwargs).encode('utf-8')
+
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        """Serializa un objeto a texto JSON"""
+        if orjson is None and not isinstance(obj, pd.DataFrame):
+            kwargs.setdefault('default', _default)
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj, indent=kwargs.get('indent') is not None).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        """Genera la respuesta JSON sin pasar por texto intermedio"""
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,290 @@
+"""
+Índice de trazabilidad entre hojas: compra -> proceso -> almacén -> venta.
+Se construye una vez por instantánea de datos y se actualiza de forma
+incremental cuando las hojas solo reciben filas nuevas.
+"""
+import logging
+import threading
+
+from server.frames import detail_records, is_appended
+from server.schema import resolve_schema
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+LINEAGE_SHEETS = ['compras', 'proceso', 'almacen', 'ventas']
+
+def resolve_lineage_columns(sheets):
+    """
+    Identifica las columnas de ID y total que enlazan las hojas
+
+    Args:
+        sheets (dict): DataFrames de compras, proceso, almacen y ventas
+
+    Returns:
+        dict: Nombre lógico -> nombre real de la columna (None si no existe)
+    """
+    compras = resolve_schema('compras', sheets['compras'])
+    proceso = resolve_schema('proceso', sheets['proceso'])
+    almacen = resolve_schema('almacen', sheets['almacen'])
+    ventas = resolve_schema('ventas', sheets['ventas'])
+    return {
+        'compras_id': compras['id'],
+        'compras_total': compras['total'],
+        'proceso_id': proceso['id'],
+        'proceso_compras_id': proceso['compra_ref'],
+        'almacen_id': almacen['id'],
+        'almacen_proceso_id': almacen['proceso_ref'],
+        'ventas_almacen_id': ventas['almacen_ref'],
+        'ventas_total': ventas['total']
+    }
+
+class LineageSnapshot:
+    """
+    Índice hash de los enlaces entre compras, procesos, lotes de almacén y ventas
+    para una instantánea concreta de las hojas
+
+    Una vez construido no se modifica, por lo que puede consultarse desde
+    varios hilos sin bloqueos. Las consultas son O(1) u O(k) sobre los
+    registros enlazados. Los registros guardados tienen la fecha formateada
+    como 'YYYY-MM-DD'.
+    """
+
+    def __init__(self, columns=None, frames=None):
+        self.columns = columns or {}
+        self.frames = frames or {}      # hoja -> DataFrame indexado
+        self._compras = {}              # compra_id -> primer registro de compra
+        self._procesos = {}             # proceso_id -> primer registro de proceso
+        self._lotes = {}                # almacen_id -> primer registro de almacén
+        self._lotes_por_proceso = {}    # proceso_id -> registros de almacén
+        self._ventas_por_lote = {}      # almacen_id -> registros de venta
+        self._sin_vender = {}           # almacen_id -> None (conjunto ordenado)
+
+    @classmethod
+    def build(cls, sheets):
+        """
+        Indexa por completo una instantánea de las hojas
+
+        Args:
+            sheets (dict): DataFrames normalizados de compras, proceso, almacen y ventas
+
+        Returns:
+            LineageSnapshot: Índice nuevo
+        """
+        snapshot = cls(resolve_lineage_columns(sheets), {name: sheets[name] for name in LINEAGE_SHEETS})
+        for name in LINEAGE_SHEETS:
+            snapshot._add_rows(name, sheets[name])
+        return snapshot
+
+    def extend(self, sheets):
+        """
+        Índice nuevo con las filas añadidas al final de las hojas que cambiaron
+
+        Los diccionarios y las listas de registros que reciben filas se copian
+        antes de modificarlos, de modo que este índice no cambia.
+
+        Args:
+            sheets (dict): DataFrames que solo añaden filas a los de este índice
+
+        Returns:
+            LineageSnapshot: Índice nuevo
+        """
+        snapshot = LineageSnapshot(self.columns, {name: sheets[name] for name in LINEAGE_SHEETS})
+        snapshot._compras = dict(self._compras)
+        snapshot._procesos = dict(self._procesos)
+        snapshot._lotes = dict(self._lotes)
+        snapshot._lotes_por_proceso = dict(self._lotes_por_proceso)
+        snapshot._ventas_por_lote = dict(self._ventas_por_lote)
+        snapshot._sin_vender = dict(self._sin_vender)
+
+        new_rows = {name: sheets[name].iloc[len(self.frames[name]):]
+                    for name in LINEAGE_SHEETS if sheets[name] is not self.frames.get(name)}
+        grouped = [('almacen', self.columns.get('almacen_proceso_id'), snapshot._lotes_por_proceso),
+                   ('ventas', self.columns.get('ventas_almacen_id'), snapshot._ventas_por_lote)]
+        for name, key_col, index in grouped:
+            if name in new_rows and key_col is not None:
+                for key in set(new_rows[name][key_col]):
+                    if key in index:
+                        index[key] = list(index[key])
+
+        for name, df in new_rows.items():
+            snapshot._add_rows(name, df)
+        return snapshot
+
+    def matches(self, sheets):
+        """Indica si el índice corresponde exactamente a esos DataFrames"""
+        return all(sheets[name] is self.frames.get(name) for name in LINEAGE_SHEETS)
+
+    def _add_rows(self, name, df):
+        """Indexa las filas de una hoja (solo durante la construcción)"""
+        if df.empty:
+            return
+
+        cols = self.columns
+        if name == 'compras':
+            self._add_keyed(df, cols['compras_id'], self._compras)
+        elif name == 'proceso':
+            self._add_keyed(df, cols['proceso_id'], self._procesos)
+        elif name == 'almacen':
+            self._add_keyed(df, cols['almacen_id'], self._lotes)
+            self._add_grouped(df, cols['almacen_proceso_id'], self._lotes_por_proceso)
+            lote_col = cols['almacen_id']
+            if lote_col is not None:
+                for almacen_id in df[lote_col]:
+                    if almacen_id and almacen_id not in self._ventas_por_lote:
+                        self._sin_vender[almacen_id] = None
+        elif name == 'ventas':
+            self._add_grouped(df, cols['ventas_almacen_id'], self._ventas_por_lote)
+            lote_col = cols['ventas_almacen_id']
+            if lote_col is not None:
+                for almacen_id in df[lote_col]:
+                    self._sin_vender.pop(almacen_id, None)
+
+    @staticmethod
+    def _add_keyed(df, key_col, index):
+        """Guarda el primer registro de cada ID"""
+        if key_col is None:
+            return
+        for key, record in zip(df[key_col], detail_records(df)):
+            if key:
+                index.setdefault(key, record)
+
+    @staticmethod
+    def _add_grouped(df, key_col, index):
+        """Agrupa los registros por ID en el orden de la hoja"""
+        if key_col is None:
+            return
+        for key, record in zip(df[key_col], detail_records(df)):
+            if key:
+                index.setdefault(key, []).append(record)
+
+    def compra(self, compra_id):
+        """Registro de la compra con el ID indicado, o None"""
+        return self._compras.get(compra_id)
+
+    def lots_for_proceso(self, proceso_id):
+        """Registros de almacén generados por un proceso"""
+        return list(self._lotes_por_proceso.get(proceso_id, []))
+
+    def ventas_for_lot(self, almacen_id):
+        """Registros de venta de un lote de almacén"""
+        return list(self._ventas_por_lote.get(almacen_id, []))
+
+    def ventas_for_proceso(self, proceso_id):
+        """Registros de venta de todos los lotes generados por un proceso"""
+        lote_col = self.columns.get('almacen_id')
+        ventas = []
+        if lote_col is None:
+            return ventas
+        for lote in self._lotes_por_proceso.get(proceso_id, []):
+            if lote[lote_col]:
+                ventas.extend(self._ventas_por_lote.get(lote[lote_col], []))
+        return ventas
+
+    def cost_basis(self, almacen_id):
+        """
+        Costo de origen de un lote de almacén
+
+        El costo es el total de la compra enlazada al proceso que generó el lote,
+        igual que en la ganancia por proceso.
+
+        Returns:
+            dict: IDs de proceso y compra, costo y precio por kg; None si el lote no existe
+        """
+        lote = self._lotes.get(almacen_id)
+        if lote is None:
+            return None
+
+        cols = self.columns
+        proceso_id = lote[cols['almacen_proceso_id']] if cols['almacen_proceso_id'] else ''
+        proceso = self._procesos.get(proceso_id) if proceso_id else None
+        compra_id = proceso[cols['proceso_compras_id']] if proceso and cols['proceso_compras_id'] else ''
+        compra = self._compras.get(compra_id) if compra_id else None
+
+        return {
+            'almacen_id': almacen_id,
+            'proceso_id': proceso_id,
+            'compra_id': compra_id,
+            'costo_compra': float(compra[cols['compras_total']]) if compra and cols['compras_total'] else 0.0,
+            'precio_kg': float(compra.get('precio', 0)) if compra else 0.0
+        }
+
+    def unsold_lots(self):
+        """IDs de los lotes de almacén que no tienen ninguna venta, en el orden de la hoja"""
+        return list(self._sin_vender)
+
+    def trace(self, almacen_id):
+        """
+        Trazabilidad completa de un lote de almacén
+
+        Returns:
+            dict: Compra, proceso, lote y ventas enlazados con sus totales;
+                None si el lote no existe
+        """
+        costo = self.cost_basis(almacen_id)
+        if costo is None:
+            return None
+
+        ventas = self.ventas_for_lot(almacen_id)
+        ventas_total_col = self.columns['ventas_total']
+        ingresos = sum(float(venta[ventas_total_col]) for venta in ventas) if ventas_total_col else 0.0
+
+        return {
+            'lote': self._lotes[almacen_id],
+            'proceso': self._procesos.get(costo['proceso_id']),
+            'compra': self._compras.get(costo['compra_id']),
+            'ventas': ventas,
+            'resumen': {
+                'vendido': bool(ventas),
+                'kg_vendidos': float(sum(float(venta.get('cantidad', 0)) for venta in ventas)),
+                'ingresos_ventas': float(ingresos),
+                'costo_compra': costo['costo_compra']
+            }
+        }
+
+class LineageIndex:
+    """
+    Índice de trazabilidad sincronizado con la última instantánea de las hojas
+
+    Cada sincronización construye un LineageSnapshot nuevo aparte y lo publica
+    con una sola asignación, así que las consultas nunca ven un índice a medio
+    reconstruir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = LineageSnapshot()
+
+    @property
+    def current(self):
+        """Último índice publicado"""
+        return self._current
+
+    def update(self, sheets):
+        """
+        Sincroniza el índice con una nueva instantánea de las hojas
+
+        Si las hojas que cambiaron solo tienen filas añadidas al final, se
+        indexan únicamente esas filas; en otro caso se reconstruye el índice.
+
+        Args:
+            sheets (dict): DataFrames normalizados de compras, proceso, almacen y ventas
+
+        Returns:
+            LineageSnapshot: Índice de exactamente esos DataFrames
+        """
+        with self._lock:
+            current = self._current
+            if current.matches(sheets):
+                return current
+
+            changed = [name for name in LINEAGE_SHEETS if sheets[name] is not current.frames.get(name)]
+            if all(is_appended(current.frames.get(name), sheets[name]) for name in changed):
+                snapshot = current.extend(sheets)
+                logger.info(f"Índice de trazabilidad actualizado con filas nuevas de {', '.join(changed)}")
+            else:
+                snapshot = LineageSnapshot.build(sheets)
+                logger.info("Índice de trazabilidad reconstruido")
+
+            self._current = snapshot
+            return snapshot
@@ -0,0 +1,130 @@
+"""
+Precalentamiento de las consultas más frecuentes del dashboard.
+Un hilo de fondo recalcula las consultas configuradas cada vez que llega una
+nueva instantánea de las hojas (y al cambiar de día, cuando se desplazan los
+rangos por defecto) y deja sus respuestas en la caché de respuestas.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from server.frames import local_now
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def parse_hot_queries(spec):
+    """
+    Interpreta la lista de consultas a precalentar
+
+    Formato: entradas separadas por comas con el endpoint y, opcionalmente, la
+    ventana de fechas tras ':' ('month' para el mes actual o 'Nd' para los
+    últimos N días). Sin ventana se usa la del endpoint por defecto.
+
+    Ejemplo: 'summary,summary:7d,daily:7d,coffee-types'
+
+    Returns:
+        list: Tuplas (endpoint, ventana o None)
+    """
+    queries = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        endpoint, _, window = item.partition(':')
+        queries.append((endpoint.strip(), window.strip() or None))
+    return queries
+
+def seconds_until_midnight(now=None):
+    """Segundos que faltan hasta la próxima medianoche en hora de Lima"""
+    now = now or local_now()
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+class PrewarmScheduler:
+    """
+    Hilo de fondo que ejecuta el precalentamiento tras cada nueva instantánea
+
+    `notify` solo marca que hay trabajo pendiente, por lo que puede registrarse
+    como listener de la caché de hojas sin retrasar la lectura. Las
+    notificaciones que llegan seguidas se agrupan en una sola ejecución.
+    """
+
+    def __init__(self, warm, delay=1.0):
+        """
+        Args:
+            warm (callable): Recalcula las consultas y devuelve cuántas se guardaron
+            delay (float): Segundos que se esperan tras una notificación antes de ejecutar
+        """
+        self._warm = warm
+        self.delay = delay
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'runs': 0,
+            'errors': 0,
+            'warmed': 0,
+            'last_run_at': None,
+            'last_run_seconds': None
+        }
+
+    def start(self):
+        """Arranca el hilo (si no está en marcha) y programa una primera ejecución"""
+        self.notify()
+
+    def notify(self, frames=None):
+        """
+        Programa una ejecución del precalentamiento
+
+        Args:
+            frames (dict): Hojas recién leídas (se ignoran; firma de listener)
+        """
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def stats(self):
+        """Devuelve los contadores de ejecución del precalentamiento"""
+        with self._lock:
+            return dict(self._stats)
+
+    def _ensure_thread(self):
+        """Arranca el hilo en este proceso si aún no está en marcha"""
+        with self._lock:
+            # Tras un fork (gunicorn --preload) el hilo del proceso padre no existe
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run_loop, name='prewarm-scheduler', daemon=True)
+            self._thread.start()
+
+    def _run_loop(self):
+        """Bucle del hilo: espera una instantánea nueva o el cambio de día"""
+        while True:
+            # Un segundo de margen para que la fecha ya haya cambiado
+            self._wakeup.wait(timeout=seconds_until_midnight() + 1)
+            time.sleep(self.delay)
+            self._wakeup.clear()
+            self.run_once()
+
+    def run_once(self):
+        """Ejecuta el precalentamiento una vez, registrando cualquier error"""
+        started = time.monotonic()
+        try:
+            warmed = self._warm()
+        except Exception as e:
+            logger.error(f"Error al precalentar las consultas: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['warmed'] += warmed
+            self._stats['last_run_at'] = datetime.now().isoformat()
+            self._stats['last_run_seconds'] = round(elapsed, 3)
+        logger.info(f"Precalentadas {warmed} consultas en {elapsed:.2f}s")
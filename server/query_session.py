@@ -0,0 +1,116 @@
+"""
+Sesiones de consulta: una instantánea de las hojas compartida por todos los
+cálculos de una petición.
+Los cálculos anidados (p. ej. la ganancia por proceso dentro del resumen)
+reutilizan las hojas ya leídas y los DataFrames ya filtrados por fecha en
+lugar de volver a leerlos y filtrarlos.
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from server.frames import filter_by_date_range
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Sesión activa en el contexto actual (hilo o greenlet)
+_active_session = contextvars.ContextVar('query_session', default=None)
+
+class QuerySession:
+    """
+    Hojas y DataFrames filtrados de una petición
+
+    Todas las hojas que se piden durante la sesión pertenecen a la misma
+    instantánea: cada hoja se lee una sola vez y los filtros por rango de
+    fechas se calculan una sola vez por hoja y rango.
+    """
+
+    def __init__(self, reader):
+        """
+        Args:
+            reader (callable): Recibe nombres de hojas y devuelve un dict con sus DataFrames
+        """
+        self._reader = reader
+        self._frames = {}
+        self._filtered = {}
+        self._derived = {}
+
+    def sheets(self, *sheet_names):
+        """
+        DataFrames de las hojas indicadas en la instantánea de la sesión
+
+        Las hojas que aún no se han leído en la sesión se leen juntas.
+
+        Returns:
+            dict: DataFrame de cada hoja indexado por nombre en minúsculas
+        """
+        keys = [name.lower() for name in sheet_names]
+        missing = [key for key in keys if key not in self._frames]
+        if missing:
+            self._frames.update(self._reader(*missing))
+        return {key: self._frames[key] for key in keys}
+
+    def filtered(self, sheet_names, start_date=None, end_date=None):
+        """
+        DataFrames de las hojas indicadas filtrados por rango de fechas
+
+        Args:
+            sheet_names (iterable): Nombres de las hojas
+            start_date (str): Fecha de inicio en formato 'YYYY-MM-DD'
+            end_date (str): Fecha de fin en formato 'YYYY-MM-DD'
+
+        Returns:
+            dict: DataFrame filtrado de cada hoja indexado por nombre en minúsculas
+        """
+        sheets = self.sheets(*sheet_names)
+        if not (start_date or end_date):
+            return sheets
+
+        result = {}
+        for key, df in sheets.items():
+            memo_key = (key, start_date, end_date)
+            if memo_key not in self._filtered:
+                self._filtered[memo_key] = filter_by_date_range(df, 'fecha', start_date, end_date)
+            result[key] = self._filtered[memo_key]
+        return result
+
+    def derived(self, name, build):
+        """
+        Objeto derivado de la instantánea de la sesión (p. ej. un índice), calculado una vez
+
+        Args:
+            name (str): Nombre del objeto dentro de la sesión
+            build (callable): Recibe la sesión y construye el objeto
+
+        Returns:
+            Objeto construido en la primera llamada de la sesión
+        """
+        if name not in self._derived:
+            self._derived[name] = build(self)
+        return self._derived[name]
+
+@contextmanager
+def query_session(reader):
+    """
+    Sesión de consulta activa, o una nueva si no hay ninguna
+
+    Los cálculos llamados dentro del bloque obtienen la misma sesión.
+
+    Args:
+        reader (callable): Lector de hojas para la sesión nueva
+
+    Yields:
+        QuerySession: Sesión compartida
+    """
+    session = _active_session.get()
+    if session is not None:
+        yield session
+        return
+
+    session = QuerySession(reader)
+    token = _active_session.set(session)
+    try:
+        yield session
+    finally:
+        _active_session.reset(token)
@@ -0,0 +1,139 @@
+"""
+Consultas sobre los datos crudos de una hoja.
+Aplica filtros, orden, paginación y proyección de columnas sobre el DataFrame
+antes de convertirlo en registros, para serializar solo las filas pedidas.
+"""
+import logging
+
+from server.frames import filter_by_date_range, frame_to_records
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Filas convertidas a la vez en las exportaciones por streaming
+EXPORT_CHUNK_ROWS = 1000
+
+# Formatos de exportación por streaming -> tipo MIME
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+class RawQueryError(ValueError):
+    """Parámetro de consulta no válido"""
+
+def _split(value):
+    """Separa una lista de valores por comas ignorando los vacíos"""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def _resolve_columns(df, names, param):
+    """
+    Busca columnas por nombre sin distinguir mayúsculas
+
+    Raises:
+        RawQueryError: Si alguna columna no existe
+    """
+    by_name = {}
+    for col in df.columns:
+        by_name.setdefault(str(col).lower(), col)
+    missing = [name for name in names if name.lower() not in by_name]
+    if missing:
+        raise RawQueryError(f"Columnas no encontradas en {param}: {', '.join(missing)}")
+    return [by_name[name.lower()] for name in names]
+
+def _non_negative_int(args, name):
+    """Lee un parámetro entero mayor o igual que cero, o None si no se indica"""
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise RawQueryError(f"El parámetro {name} debe ser un número entero")
+    if number < 0:
+        raise RawQueryError(f"El parámetro {name} no puede ser negativo")
+    return number
+
+def apply_raw_query(df, args):
+    """
+    Aplica a una hoja los parámetros de consulta de los endpoints /api/raw
+
+    Query parameters:
+        start_date, end_date: Rango de fechas (YYYY-MM-DD) sobre la columna 'fecha'
+        tipo_cafe: Tipos de café separados por comas
+        sort: Columnas separadas por comas; con '-' delante en orden descendente
+        offset: Primera fila devuelta (por defecto 0)
+        limit: Número máximo de filas devueltas (por defecto todas)
+        fields: Columnas devueltas, separadas por comas (por defecto todas)
+
+    Args:
+        df (pandas.DataFrame): DataFrame normalizado de la hoja (no se modifica)
+        args (Mapping): Parámetros de la petición
+
+    Returns:
+        tuple: (DataFrame de la página, número total de filas que cumplen los filtros)
+
+    Raises:
+        RawQueryError: Si algún parámetro no es válido
+    """
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    if start_date or end_date:
+        df = filter_by_date_range(df, 'fecha', start_date, end_date)
+
+    tipos = _split(args.get('tipo_cafe', ''))
+    if tipos:
+        tipo_col = _resolve_columns(df, ['tipo_cafe'], 'tipo_cafe')[0]
+        wanted = {tipo.lower() for tipo in tipos}
+        df = df[df[tipo_col].astype(str).str.strip().str.lower().isin(wanted)]
+
+    sort = _split(args.get('sort', ''))
+    if sort:
+        columns = _resolve_columns(df, [key.lstrip('-') for key in sort], 'sort')
+        ascending = [not key.startswith('-') for key in sort]
+        df = df.sort_values(columns, ascending=ascending, kind='stable', na_position='last')
+
+    total = len(df)
+    offset = _non_negative_int(args, 'offset') or 0
+    limit = _non_negative_int(args, 'limit')
+    if offset or limit is not None:
+        df = df.iloc[offset:offset + limit if limit is not None else None]
+
+    fields = _split(args.get('fields', ''))
+    if fields:
+        df = df[_resolve_columns(df, fields, 'fields')]
+
+    return df, total
+
+def iter_ndjson(df, dumps, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Genera un DataFrame como JSON delimitado por saltos de línea (un registro por línea)
+
+    Los registros se crean por bloques de `chunk_rows` filas, de modo que la
+    memoria usada no depende del tamaño de la hoja.
+
+    Args:
+        df (pandas.DataFrame): DataFrame normalizado
+        dumps (callable): Serializa un registro a texto JSON
+        chunk_rows (int): Filas por bloque
+
+    Yields:
+        str: Bloque de líneas JSON
+    """
+    for start in range(0, len(df), chunk_rows):
+        records = frame_to_records(df.iloc[start:start + chunk_rows])
+        yield ''.join(dumps(record) + '\n' for record in records)
+
+def iter_csv(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Genera un DataFrame como CSV con cabecera, por bloques de `chunk_rows` filas
+
+    Las fechas se escriben como 'YYYY-MM-DD HH:MM:SS' y los valores ausentes vacíos.
+
+    Yields:
+        str: Bloque de líneas CSV
+    """
+    yield df.iloc[:0].to_csv(index=False)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(
+            index=False, header=False, date_format='%Y-%m-%d %H:%M:%S')
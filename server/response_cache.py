@@ -0,0 +1,142 @@
+"""
+Caché de respuestas de la API ya serializadas.
+Guarda el JSON de los endpoints de agregados por endpoint, parámetros y
+versión de los datos, de modo que las peticiones repetidas sobre la misma
+instantánea no vuelven a calcular ni a serializar el resultado.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """
+    Caché LRU acotada de cuerpos de respuesta (bytes)
+
+    Las entradas pertenecen a una versión de los datos: al consultar o guardar
+    con una versión distinta de la actual se descartan todas las entradas.
+    Junto a cada cuerpo se guardan sus versiones comprimidas (gzip, br) a
+    medida que se piden, para no volver a comprimirlo en cada acierto.
+    """
+
+    def __init__(self, max_entries=256):
+        """
+        Args:
+            max_entries (int): Número máximo de respuestas guardadas
+        """
+        self.max_entries = max(max_entries, 1)
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    def _check_version(self, version):
+        """Descarta las entradas si cambió la versión de los datos (requiere el lock)"""
+        if version != self._version:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        """
+        Obtiene una respuesta guardada
+
+        Args:
+            key (tuple): Endpoint y parámetros normalizados
+            version (int): Versión de los datos
+
+        Returns:
+            bytes: Cuerpo de la respuesta, o None si no está en la caché
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[None]
+
+    def get_encoded(self, key, version, encoding):
+        """
+        Obtiene la versión comprimida de una respuesta guardada
+
+        Args:
+            key (tuple): Endpoint y parámetros normalizados
+            version (int): Versión de los datos
+            encoding (str): Codificación ('gzip' o 'br')
+
+        Returns:
+            bytes: Cuerpo comprimido, o None si aún no se ha guardado
+        """
+        with self._lock:
+            if version != self._version:
+                return None
+            entry = self._entries.get(key)
+            return entry.get(encoding) if entry is not None else None
+
+    def put_encoded(self, key, version, encoding, body):
+        """
+        Guarda la versión comprimida de una respuesta ya guardada con esa versión de datos
+
+        Args:
+            key (tuple): Endpoint y parámetros normalizados
+            version (int): Versión de los datos con la que se calculó
+            encoding (str): Codificación ('gzip' o 'br')
+            body (bytes): Cuerpo comprimido
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if version == self._version and entry is not None:
+                entry[encoding] = body
+
+    def put(self, key, version, body):
+        """
+        Guarda una respuesta calculada con la versión de datos indicada
+
+        Args:
+            key (tuple): Endpoint y parámetros normalizados
+            version (int): Versión de los datos con la que se calculó
+            body (bytes): Cuerpo de la respuesta
+        """
+        with self._lock:
+            if self._version is not None and version is not None and version < self._version:
+                # Calculada con datos que ya fueron reemplazados
+                return
+            self._check_version(version)
+            # Cuerpo sin comprimir en la clave None y comprimidos por codificación
+            self._entries[key] = {None: body}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        """Descarta todas las respuestas guardadas"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Devuelve los contadores de la caché
+
+        Returns:
+            dict: Aciertos, fallos, expulsiones, invalidaciones y tamaño
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['data_version'] = self._version
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
@@ -0,0 +1,372 @@
+"""
+Tabla de agregados diarios precalculada a partir de la instantánea de las hojas.
+Guarda por día los kilos, importes y número de operaciones de cada hoja para
+que los resúmenes sumen filas diarias en lugar de recorrer los registros, y se
+actualiza de forma incremental cuando las hojas solo reciben filas nuevas.
+"""
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from server.frames import filter_by_date_range, is_appended, range_end, range_start
+from server.schema import resolve_schema
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+ROLLUP_SHEETS = ['compras', 'ventas', 'gastos', 'proceso', 'almacen']
+
+# Métricas aditivas por día. Las compras con y sin adelantos se calculan a
+# partir del proceso y, como alternativa, a partir de las compras.
+ROLLUP_COLUMNS = ['kg_comprados', 'kg_vendidos', 'ingresos', 'gastos', 'efectivo', 'transferencia',
+                  'con_adelantos', 'sin_adelantos', 'compras_con_adelantos', 'compras_sin_adelantos',
+                  'ops_compras', 'ops_ventas', 'ops_gastos', 'ops_almacen']
+
+def _column_or_zero(df, col):
+    """Devuelve la columna indicada o una serie de ceros alineada con el DataFrame"""
+    if col is not None and col in df.columns:
+        return df[col]
+    return pd.Series(0.0, index=df.index)
+
+def _payment_method_flags(gastos_df, descripcion_col):
+    """
+    Clasifica una sola vez los gastos por método de pago según su descripción
+
+    Returns:
+        tuple: Máscaras (efectivo, transferencia) alineadas con gastos_df
+    """
+    if descripcion_col is None:
+        sin_metodo = pd.Series(False, index=gastos_df.index)
+        return sin_metodo, sin_metodo
+
+    descripcion = gastos_df[descripcion_col].astype(str).str.upper()
+    return (descripcion.str.contains('EFECTIVO', na=False),
+            descripcion.str.contains('TRANSFERENCIA', na=False))
+
+def _adelanto_split(df, nota_col, total_col):
+    """
+    Separa el total de cada fila en compras con y sin adelanto
+
+    Las filas cuya nota contiene "Compra con adelanto" cuentan como adelanto;
+    sin columna de notas todas cuentan como compras sin adelanto.
+
+    Returns:
+        tuple: Series (con_adelantos, sin_adelantos) alineadas con df
+    """
+    total = _column_or_zero(df, total_col)
+    if nota_col is None:
+        return _column_or_zero(df, None), total
+    es_adelanto = df[nota_col].astype(str).str.contains('Compra con adelanto', case=False, na=False)
+    return total.where(es_adelanto, 0.0), total.where(~es_adelanto, 0.0)
+
+def has_proceso_split(proceso_df):
+    """Indica si la hoja de proceso permite separar las compras con y sin adelantos"""
+    schema = resolve_schema('proceso', proceso_df)
+    return schema['nota'] is not None and schema['total'] is not None
+
+def _sum_by_day(df, columns, fecha_col):
+    """
+    Suma por día (fecha sin hora) las series indicadas
+
+    Las filas sin fecha válida (o de hojas sin columna 'fecha') se agrupan en
+    una fila con fecha NaT, que solo cuenta en los totales sin filtro de fechas.
+
+    Args:
+        df (pandas.DataFrame): DataFrame normalizado
+        columns (dict): Nombre de la métrica -> serie alineada con df (o escalar)
+        fecha_col (str): Columna de fecha de la hoja, o None si no tiene
+
+    Returns:
+        pandas.DataFrame: Una fila por día con actividad y una columna por métrica
+    """
+    if df.empty:
+        return pd.DataFrame(columns=list(columns), index=pd.DatetimeIndex([], name='fecha'), dtype='float64')
+
+    if fecha_col is not None:
+        dias = df[fecha_col].dt.normalize()
+    else:
+        dias = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    values = pd.DataFrame(columns, index=df.index)
+    return values.groupby(dias.rename('fecha'), dropna=False).sum()
+
+def sheet_rollup(name, df):
+    """
+    Calcula los agregados diarios de las métricas que aporta una hoja
+
+    Args:
+        name (str): Nombre interno de la hoja
+        df (pandas.DataFrame): Filas normalizadas de la hoja
+
+    Returns:
+        pandas.DataFrame: Una fila por día y una columna por métrica de la hoja
+    """
+    schema = resolve_schema(name, df)
+    if name == 'compras':
+        con_adelantos, sin_adelantos = _adelanto_split(df, schema['nota'], schema['total'])
+        columns = {
+            'kg_comprados': _column_or_zero(df, schema['cantidad']),
+            'compras_con_adelantos': con_adelantos,
+            'compras_sin_adelantos': sin_adelantos,
+            'ops_compras': 1
+        }
+    elif name == 'ventas':
+        columns = {
+            'kg_vendidos': _column_or_zero(df, schema['cantidad']),
+            'ingresos': _column_or_zero(df, schema['total']),
+            'ops_ventas': 1
+        }
+    elif name == 'gastos':
+        monto = _column_or_zero(df, schema['monto'])
+        es_efectivo, es_transferencia = _payment_method_flags(df, schema['descripcion'])
+        columns = {
+            'gastos': monto,
+            'efectivo': monto.where(es_efectivo, 0.0),
+            'transferencia': monto.where(es_transferencia, 0.0),
+            'ops_gastos': 1
+        }
+    elif name == 'proceso':
+        # En proceso, las compras con adelantos tienen una nota "Compra con adelanto"
+        if has_proceso_split(df):
+            con_adelantos, sin_adelantos = _adelanto_split(df, schema['nota'], schema['total'])
+        else:
+            con_adelantos = sin_adelantos = _column_or_zero(df, None)
+        columns = {
+            'con_adelantos': con_adelantos,
+            'sin_adelantos': sin_adelantos
+        }
+    else:
+        columns = {'ops_almacen': 1}
+    return _sum_by_day(df, columns, schema['fecha'])
+
+def _local_wall_time(stamp, timezone):
+    """Instante con zona horaria como hora local de timezone sin zona"""
+    return stamp.tz_convert(timezone).tz_localize(None)
+
+class PrefixSums:
+    """
+    Sumas acumuladas de las métricas diarias para totales de rango en O(1)
+
+    `cumulative[i]` es la suma de los `i` primeros días con fecha, de modo que el
+    total de los días `lo..hi-1` es `cumulative[hi] - cumulative[lo]`. Las
+    posiciones se obtienen con una búsqueda binaria sobre los días ordenados
+    (en hora local), con los mismos límites que filter_by_date_range.
+    """
+
+    def __init__(self, table):
+        """
+        Args:
+            table (pandas.DataFrame): Tabla diaria ordenada por 'fecha' (NaT al final)
+        """
+        dated = table['fecha'].notna()
+        self.days = pd.DatetimeIndex(table.loc[dated, 'fecha'])
+        values = table.loc[dated, ROLLUP_COLUMNS].to_numpy(dtype='float64')
+        self.cumulative = np.vstack([np.zeros((1, len(ROLLUP_COLUMNS))), np.cumsum(values, axis=0)])
+        self.undated = table.loc[~dated, ROLLUP_COLUMNS].to_numpy(dtype='float64').sum(axis=0)
+
+    def totals(self, start_date=None, end_date=None, timezone='America/Lima'):
+        """
+        Suma las métricas de los días dentro de un rango de fechas
+
+        Returns:
+            dict: Nombre de la métrica -> total; None si el inicio del rango no
+                es un día completo
+        """
+        lo, hi = 0, len(self.days)
+
+        # Límites del rango; una fecha inválida se ignora igual que en filter_by_date_range
+        start = end = None
+        if start_date:
+            try:
+                start = range_start(start_date, timezone)
+            except Exception as e:
+                logger.error(f"Error al filtrar por fecha de inicio: {e}")
+
+        if end_date:
+            try:
+                end = range_end(end_date, timezone)
+            except Exception as e:
+                logger.error(f"Error al filtrar por fecha de fin: {e}")
+
+        # Los días de la tabla están en hora local sin zona: los límites se
+        # comparan en esa misma escala. Un error aquí no debe convertirse en
+        # totales sin filtrar, así que no se captura.
+        if start is not None:
+            if start != start.normalize():
+                return None
+            lo = self.days.searchsorted(_local_wall_time(start, timezone), side='left')
+        if end is not None:
+            hi = self.days.searchsorted(_local_wall_time(end, timezone), side='right')
+        filtered = start is not None or end is not None
+
+        totals = self.cumulative[max(hi, lo)] - self.cumulative[lo]
+        if not filtered:
+            # Sin filtro aplicado también cuentan las filas sin fecha
+            totals = totals + self.undated
+        return dict(zip(ROLLUP_COLUMNS, totals.tolist()))
+
+class RollupSnapshot:
+    """
+    Agregados diarios de todas las hojas para una instantánea concreta
+
+    Una vez construido no se modifica (tabla diaria, sumas acumuladas y si el
+    proceso separa las compras con y sin adelantos), por lo que puede
+    consultarse desde varios hilos sin bloqueos y todos los totales de una
+    consulta salen de la misma instantánea.
+    """
+
+    def __init__(self, frames=None, parts=None):
+        """
+        Args:
+            frames (dict): Hoja -> DataFrame del que se calcularon los agregados
+            parts (dict): Hoja -> agregados diarios de sus métricas
+        """
+        self.frames = frames or {}
+        self._parts = parts or {}
+        self.table = self._combine()
+        self.prefix = PrefixSums(self.table)
+        self.proceso_split = 'proceso' in self.frames and has_proceso_split(self.frames['proceso'])
+
+    @classmethod
+    def build(cls, sheets):
+        """
+        Calcula los agregados de una instantánea de las hojas
+
+        Args:
+            sheets (dict): DataFrames normalizados de compras, ventas, gastos, proceso y almacen
+
+        Returns:
+            RollupSnapshot: Agregados nuevos
+        """
+        return cls().extend(sheets)
+
+    def extend(self, sheets):
+        """
+        Agregados de otra instantánea a partir de estos
+
+        Las hojas sin cambios conservan su parte; las que solo añaden filas
+        agregan únicamente esas filas y el resto se recalcula. Este objeto no
+        cambia.
+
+        Args:
+            sheets (dict): DataFrames normalizados de compras, ventas, gastos, proceso y almacen
+
+        Returns:
+            RollupSnapshot: Agregados de exactamente esos DataFrames
+        """
+        parts = dict(self._parts)
+        for name in ROLLUP_SHEETS:
+            df = sheets[name]
+            previous = self.frames.get(name)
+            if df is previous:
+                continue
+            if name in parts and is_appended(previous, df):
+                parts[name] = parts[name].add(sheet_rollup(name, df.iloc[len(previous):]), fill_value=0)
+            else:
+                parts[name] = sheet_rollup(name, df)
+        return RollupSnapshot({name: sheets[name] for name in ROLLUP_SHEETS}, parts)
+
+    def matches(self, sheets):
+        """Indica si los agregados corresponden exactamente a esos DataFrames"""
+        return all(sheets[name] is self.frames.get(name) for name in ROLLUP_SHEETS)
+
+    def _combine(self):
+        """Une las partes de cada hoja en una tabla con una fila por día"""
+        parts = [self._parts[name] for name in ROLLUP_SHEETS if name in self._parts]
+        if parts:
+            table = pd.concat(parts, axis=1, sort=True)
+        else:
+            table = pd.DataFrame(index=pd.DatetimeIndex([], name='fecha'))
+        table = table.reindex(columns=ROLLUP_COLUMNS).fillna(0).sort_index()
+        return table.rename_axis('fecha').reset_index()
+
+    def days(self, start_date=None, end_date=None):
+        """
+        Filas diarias dentro de un rango de fechas
+
+        El rango se aplica igual que filter_by_date_range sobre los registros.
+
+        Args:
+            start_date (str): Fecha de inicio en formato 'YYYY-MM-DD'
+            end_date (str): Fecha de fin en formato 'YYYY-MM-DD'
+
+        Returns:
+            pandas.DataFrame: Columna 'fecha' (día) y una columna por métrica
+        """
+        table = self.table
+        if start_date or end_date:
+            table = filter_by_date_range(table, 'fecha', start_date, end_date)
+        return table
+
+    def totals(self, start_date=None, end_date=None):
+        """
+        Suma las métricas de los días dentro de un rango de fechas
+
+        Los rangos de días completos se resuelven con las sumas acumuladas; el
+        resto, sumando las filas diarias del rango.
+
+        Returns:
+            dict: Nombre de la métrica -> total
+        """
+        totals = self.prefix.totals(start_date, end_date)
+        if totals is None:
+            totals = self.days(start_date, end_date)[ROLLUP_COLUMNS].sum().to_dict()
+        return totals
+
+class DailyRollup:
+    """
+    Agregados diarios sincronizados con la última instantánea de las hojas
+
+    Cada sincronización construye un RollupSnapshot nuevo aparte y lo publica
+    con una sola asignación. Solo se publican los agregados de las hojas más
+    recientes que ha leído la caché (ver `observe`): una petición que aún usa
+    una instantánea anterior obtiene sus propios agregados sin hacer
+    retroceder los compartidos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = RollupSnapshot()
+        self._latest = {}
+
+    @property
+    def current(self):
+        """Últimos agregados publicados"""
+        return self._current
+
+    def observe(self, frames):
+        """
+        Registra las hojas recién leídas (listener de la caché de hojas)
+
+        Args:
+            frames (dict): DataFrames recién leídos por el loader
+        """
+        with self._lock:
+            self._latest.update(frames)
+
+    def update(self, sheets):
+        """
+        Agregados de una instantánea de las hojas
+
+        Se calculan a partir de los publicados, de forma incremental para las
+        hojas que solo añaden filas, y se publican si son las hojas más
+        recientes (o las hojas aún no se han observado).
+
+        Args:
+            sheets (dict): DataFrames normalizados de compras, ventas, gastos, proceso y almacen
+
+        Returns:
+            RollupSnapshot: Agregados de exactamente esos DataFrames
+        """
+        with self._lock:
+            current = self._current
+            if current.matches(sheets):
+                return current
+
+            snapshot = current.extend(sheets)
+            if all(sheets[name] is self._latest.get(name, sheets[name]) for name in ROLLUP_SHEETS):
+                changed = [name for name in ROLLUP_SHEETS if sheets[name] is not current.frames.get(name)]
+                self._current = snapshot
+                logger.info(f"Agregados diarios actualizados para {', '.join(changed)}")
+            return snapshot
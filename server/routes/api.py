@@ -3,14 +3,20 @@ Rutas de la API para el backend.
 Define los endpoints para acceder a datos de Google Sheets.
 """
 import logging
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app, g, has_request_context, url_for
 from datetime import datetime, timedelta
 
 from server.sheets_service import (
     get_compras_data, get_ventas_data, get_gastos_data, get_proceso_data, get_almacen_data,
     calculate_daily_summary, get_daily_summaries, get_coffee_types_summary,
-    get_detailed_profit_by_process
+    get_detailed_profit_by_process, get_lineage_index, sheet_cache, sheet_sync, data_version, data_fingerprint
 )
+from server.config import get_config
+from server.frames import local_now
+from server.raw_query import apply_raw_query, iter_csv, iter_ndjson, EXPORT_FORMATS, RawQueryError
+from server.response_cache import ResponseCache
+from server.compression import available_encodings, compress_body, negotiate_encoding
+from server.prewarm import PrewarmScheduler, parse_hot_queries
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -18,6 +24,214 @@ logger = logging.getLogger(__name__)
 # Crear blueprint para las rutas de la API
 api_bp = Blueprint('api', __name__)
 
+# Respuestas ya serializadas de los endpoints de agregados
+response_cache = ResponseCache(get_config().RESPONSE_CACHE_SIZE)
+
+# Endpoints cuya respuesta no depende solo de los datos de las hojas
+NO_ETAG_ENDPOINTS = {'api.status', 'api.cache_stats'}
+
+@api_bp.before_request
+def _check_etag():
+    """
+    Responde 304 sin calcular nada si el cliente ya tiene la respuesta actual
+    
+    El ETag de cada URL depende solo del contenido de las hojas y del día
+    actual en Lima (los rangos por defecto se calculan a partir de hoy), por lo que
+    todos los workers envían el mismo para los mismos datos. No se envía
+    Last-Modified: la hora de lectura de las hojas es distinta en cada worker.
+    """
+    if request.method != 'GET' or request.endpoint in NO_ETAG_ENDPOINTS:
+        return None
+        
+    fingerprint = data_fingerprint()
+    if fingerprint is None:
+        return None
+        
+    g.etag = f"{fingerprint}-{local_now().strftime('%Y%m%d')}"
+    
+    # Comparación débil: las respuestas comprimidas llevan el ETag como débil
+    if request.if_none_match.contains_weak(g.etag):
+        return _set_validators(current_app.response_class(status=304))
+    return None
+
+@api_bp.after_request
+def _add_etag(response):
+    """Añade ETag y Cache-Control a las respuestas correctas"""
+    if response.status_code == 200 and 'etag' in g:
+        _set_validators(response)
+    return response
+
+def _set_validators(response):
+    """Copia los validadores de la petición actual en la respuesta"""
+    response.set_etag(g.etag)
+    max_age = current_app.config.get('API_CACHE_MAX_AGE', 0)
+    response.cache_control.private = True
+    if max_age > 0:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+def _cached_json(endpoint, params, compute):
+    """
+    Devuelve la respuesta JSON de un endpoint de agregados desde la caché de respuestas
+    
+    Args:
+        endpoint (str): Nombre del endpoint
+        params (tuple): Parámetros normalizados de la consulta
+        compute (callable): Calcula los datos si la respuesta no está en la caché
+        
+    Returns:
+        flask.Response: Respuesta JSON; 500 si los datos calculados contienen 'error'
+    """
+    version = data_version()
+    enabled = current_app.config.get('RESPONSE_CACHE_ENABLED') and version is not None
+    key = (endpoint, params)
+    
+    if enabled:
+        body = response_cache.get(key, version)
+        if body is not None:
+            return _cached_response(key, version, body)
+    
+    data = compute()
+    response = jsonify(data)
+    # Los resúmenes con error no se guardan ni llevan ETag (solo las respuestas
+    # 200 lo llevan): así la siguiente petición vuelve a intentarlo
+    if isinstance(data, dict) and 'error' in data:
+        response.status_code = 500
+        return response
+    if enabled:
+        body = response.get_data()
+        response_cache.put(key, version, body)
+        return _cached_response(key, version, body)
+    return response
+
+def _encoded_body(key, version, body, encoding):
+    """Cuerpo comprimido de una respuesta guardada, comprimiéndolo solo la primera vez"""
+    encoded = response_cache.get_encoded(key, version, encoding)
+    if encoded is None:
+        encoded = compress_body(body, encoding,
+                                gzip_level=current_app.config['COMPRESSION_GZIP_LEVEL'],
+                                brotli_quality=current_app.config['COMPRESSION_BROTLI_QUALITY'])
+        response_cache.put_encoded(key, version, encoding, encoded)
+    return encoded
+
+def _cached_response(key, version, body):
+    """
+    Respuesta JSON de un cuerpo guardado en la caché de respuestas
+    
+    Si el cliente acepta compresión, se envía la versión comprimida guardada
+    junto al cuerpo, de modo que cada codificación se comprime una sola vez
+    por versión de los datos. Fuera de una petición (precalentamiento) se
+    preparan todas las codificaciones disponibles.
+    """
+    response = current_app.response_class(body, mimetype='application/json')
+    if not current_app.config.get('COMPRESSION_ENABLED') or len(body) < current_app.config['COMPRESSION_MIN_SIZE']:
+        return response
+    
+    if not has_request_context():
+        # Precalentamiento: se dejan comprimidas todas las codificaciones disponibles
+        for encoding in available_encodings():
+            _encoded_body(key, version, body, encoding)
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is not None:
+        response.set_data(_encoded_body(key, version, body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def _default_range(start_date, end_date, window):
+    """
+    Completa el rango de fechas de una consulta con una ventana por defecto
+    
+    Args:
+        start_date (str): Fecha de inicio indicada, o None
+        end_date (str): Fecha de fin indicada, o None (hoy en hora de Lima)
+        window (str): 'month' para el mes actual o 'Nd' para los N días anteriores a end_date
+        
+    Returns:
+        tuple: (start_date, end_date) en formato 'YYYY-MM-DD'
+    """
+    # Los días del dashboard son días de Lima, no del reloj del servidor
+    today = local_now()
+    if not end_date:
+        end_date = today.strftime('%Y-%m-%d')
+        
+    if not start_date:
+        if window == 'month':
+            start_date = today.replace(day=1).strftime('%Y-%m-%d')
+        else:
+            days = int(window.rstrip('d'))
+            start_date = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=days)).strftime('%Y-%m-%d')
+    return start_date, end_date
+
+# Consultas que se pueden precalentar: endpoint -> (cálculo, ventana por defecto o None)
+HOT_QUERY_ENDPOINTS = {
+    'summary': (calculate_daily_summary, 'month'),
+    'daily': (get_daily_summaries, '7d'),
+    'proceso-ganancia': (get_detailed_profit_by_process, 'month'),
+    'coffee-types': (get_coffee_types_summary, None)
+}
+
+def warm_hot_queries(app, queries):
+    """
+    Calcula las consultas indicadas y guarda sus respuestas en la caché de respuestas
+    
+    Las claves coinciden con las de los endpoints, de modo que las peticiones
+    con los mismos parámetros (o sin parámetros) se sirven desde la caché.
+    
+    Args:
+        app (flask.Flask): Aplicación cuya configuración y JSON se usan
+        queries (list): Tuplas (endpoint, ventana o None) de parse_hot_queries
+        
+    Returns:
+        int: Número de consultas precalentadas
+    """
+    warmed = 0
+    with app.app_context():
+        if data_version() is None:
+            return 0
+        for endpoint, window in queries:
+            compute, default_window = HOT_QUERY_ENDPOINTS[endpoint]
+            params = _default_range(None, None, window or default_window) if default_window else ()
+            if _cached_json(endpoint, params, lambda: compute(*params)).status_code == 200:
+                warmed += 1
+    return warmed
+
+# Precalentamiento de las consultas frecuentes (se arranca en create_app)
+prewarm_scheduler = None
+
+def start_prewarm(app):
+    """
+    Arranca el precalentamiento de las consultas configuradas en PREWARM_QUERIES
+    
+    Se ejecuta al arrancar, tras cada nueva instantánea de las hojas y al
+    cambiar de día.
+    
+    Args:
+        app (flask.Flask): Aplicación ya configurada
+    """
+    global prewarm_scheduler
+    queries = []
+    for endpoint, window in parse_hot_queries(app.config.get('PREWARM_QUERIES', '')):
+        if endpoint not in HOT_QUERY_ENDPOINTS:
+            logger.warning(f"Consulta a precalentar desconocida: {endpoint} "
+                           f"(se aceptan: {', '.join(HOT_QUERY_ENDPOINTS)})")
+        elif window and window != 'month' and not (window.endswith('d') and window[:-1].isdigit()):
+            logger.warning(f"Ventana no válida para precalentar {endpoint}: {window} (month o Nd)")
+        else:
+            queries.append((endpoint, window))
+    if not queries:
+        return
+        
+    prewarm_scheduler = PrewarmScheduler(lambda: warm_hot_queries(app, queries),
+                                         delay=app.config.get('PREWARM_DELAY', 1.0))
+    sheet_cache.add_listener(prewarm_scheduler.notify)
+    prewarm_scheduler.start()
+    logger.info(f"Precalentamiento activado para: {', '.join(f'{e}:{w}' if w else e for e, w in queries)}")
+
 @api_bp.route('/status', methods=['GET'])
 def status():
     """Verificar estado de la API"""
@@ -26,6 +240,17 @@ def status():
         'timestamp': datetime.now().isoformat()
     })
 
+@api_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Obtener contadores de la caché de hojas (aciertos, fallos y edad)"""
+    stats = sheet_cache.stats()
+    if current_app.config.get('SHEETS_INCREMENTAL_SYNC'):
+        stats['sync'] = sheet_sync.stats()
+    stats['responses'] = response_cache.stats()
+    if prewarm_scheduler is not None:
+        stats['prewarm'] = prewarm_scheduler.stats()
+    return jsonify(stats)
+
 @api_bp.route('/summary', methods=['GET'])
 def summary():
     """
@@ -40,20 +265,12 @@ def summary():
         start_date = request.args.get('start_date', None)
         end_date = request.args.get('end_date', None)
         
-        # Si no se especifica end_date, usar la fecha actual
-        if not end_date:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            
-        # Si no se especifica start_date, usar el mes actual
-        if not start_date:
-            # Primer día del mes actual
-            current_month = datetime.now().replace(day=1)
-            start_date = current_month.strftime('%Y-%m-%d')
+        # Por defecto, desde el primer día del mes actual hasta hoy
+        start_date, end_date = _default_range(start_date, end_date, 'month')
         
         # Calcular resumen
-        data = calculate_daily_summary(start_date, end_date)
-        
-        return jsonify(data)
+        return _cached_json('summary', (start_date, end_date),
+                           lambda: calculate_daily_summary(start_date, end_date))
     except Exception as e:
         logger.error(f"Error al obtener resumen: {e}")
         return jsonify({
@@ -75,21 +292,12 @@ def daily_data():
         start_date = request.args.get('start_date', None)
         end_date = request.args.get('end_date', None)
         
-        # Si no se especifica end_date, usar la fecha actual
-        if not end_date:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            
-        # Si no se especifica start_date, usar una semana antes
-        if not start_date:
-            # Una semana atrás desde end_date
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-            start_date_obj = end_date_obj - timedelta(days=7)
-            start_date = start_date_obj.strftime('%Y-%m-%d')
+        # Por defecto, la semana anterior a end_date (hoy si no se indica)
+        start_date, end_date = _default_range(start_date, end_date, '7d')
         
         # Obtener datos diarios
-        data = get_daily_summaries(start_date, end_date)
-        
-        return jsonify(data)
+        return _cached_json('daily', (start_date, end_date),
+                           lambda: get_daily_summaries(start_date, end_date))
     except Exception as e:
         logger.error(f"Error al obtener datos diarios: {e}")
         return jsonify({
@@ -101,8 +309,7 @@ def daily_data():
 def coffee_types():
     """Obtener resumen de tipos de café"""
     try:
-        data = get_coffee_types_summary()
-        return jsonify(data)
+        return _cached_json('coffee-types', (), get_coffee_types_summary)
     except Exception as e:
         logger.error(f"Error al obtener tipos de café: {e}")
         return jsonify({
@@ -124,20 +331,12 @@ def proceso_ganancia():
         start_date = request.args.get('start_date', None)
         end_date = request.args.get('end_date', None)
         
-        # Si no se especifica end_date, usar la fecha actual
-        if not end_date:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            
-        # Si no se especifica start_date, usar el mes actual
-        if not start_date:
-            # Primer día del mes actual
-            current_month = datetime.now().replace(day=1)
-            start_date = current_month.strftime('%Y-%m-%d')
+        # Por defecto, desde el primer día del mes actual hasta hoy
+        start_date, end_date = _default_range(start_date, end_date, 'month')
         
         # Obtener datos detallados de ganancia por proceso
-        data = get_detailed_profit_by_process(start_date, end_date)
-        
-        return jsonify(data)
+        return _cached_json('proceso-ganancia', (start_date, end_date),
+                           lambda: get_detailed_profit_by_process(start_date, end_date))
     except Exception as e:
         logger.error(f"Error al obtener ganancia detallada por proceso: {e}")
         return jsonify({
@@ -145,12 +344,81 @@ def proceso_ganancia():
             'message': 'Error al obtener ganancia detallada por proceso'
         }), 500
 
+@api_bp.route('/trazabilidad/<almacen_id>', methods=['GET'])
+def trazabilidad(almacen_id):
+    """
+    Obtener la trazabilidad de un lote de almacén: compra, proceso y ventas
+    
+    Path parameters:
+        almacen_id: ID del lote en la hoja de almacén
+    """
+    try:
+        data = get_lineage_index().trace(almacen_id.strip())
+        if data is None:
+            return jsonify({
+                'error': f"Lote {almacen_id} no encontrado",
+                'message': 'Lote de almacén no encontrado'
+            }), 404
+        
+        return jsonify(data)
+    except Exception as e:
+        logger.error(f"Error al obtener trazabilidad del lote {almacen_id}: {e}")
+        return jsonify({
+            'error': str(e),
+            'message': 'Error al obtener trazabilidad del lote'
+        }), 500
+
+def _raw_response(df, sheet_label):
+    """
+    Devuelve los registros de una hoja aplicando los parámetros de consulta
+    
+    La respuesta es la lista de registros de la página. El total de filas que
+    cumplen los filtros se envía en la cabecera X-Total-Count y, si hay más
+    filas, la URL de la página siguiente en la cabecera Link.
+    
+    Con `format=ndjson` o `format=csv` los registros se envían por streaming
+    (transferencia por bloques) en lugar de como una lista JSON.
+    """
+    export_format = request.args.get('format', 'json').lower()
+    try:
+        if export_format != 'json' and export_format not in EXPORT_FORMATS:
+            raise RawQueryError(f"Formato no soportado: {export_format} (json, ndjson o csv)")
+        page, total = apply_raw_query(df, request.args)
+    except RawQueryError as e:
+        return jsonify({
+            'error': str(e),
+            'message': f'Parámetros no válidos para los datos de {sheet_label}'
+        }), 400
+    
+    if export_format == 'ndjson':
+        response = current_app.response_class(
+            iter_ndjson(page, current_app.json.dumps), mimetype=EXPORT_FORMATS['ndjson'])
+    elif export_format == 'csv':
+        response = current_app.response_class(iter_csv(page), mimetype=EXPORT_FORMATS['csv'])
+        response.headers['Content-Disposition'] = f'attachment; filename={request.path.rsplit("/", 1)[-1]}.csv'
+    else:
+        # El proveedor JSON serializa el DataFrame directamente desde sus columnas
+        response = jsonify(page)
+    response.headers['X-Total-Count'] = str(total)
+    
+    offset = int(request.args.get('offset') or 0)
+    if request.args.get('limit') and offset + len(page) < total:
+        args = request.args.to_dict()
+        args['offset'] = str(offset + len(page))
+        response.headers['Link'] = f'<{url_for(request.endpoint, _external=True, **args)}>; rel="next"'
+    return response
+
 @api_bp.route('/raw/compras', methods=['GET'])
 def raw_compras():
-    """Obtener datos de compras"""
+    """
+    Obtener datos de compras
+    
+    Query parameters:
+        start_date, end_date, tipo_cafe, sort, offset, limit, fields (ver apply_raw_query)
+        format: json (por defecto), ndjson o csv
+    """
     try:
-        df = get_compras_data()
-        return jsonify(df.to_dict(orient='records'))
+        return _raw_response(get_compras_data(), 'compras')
     except Exception as e:
         logger.error(f"Error al obtener datos de compras: {e}")
         return jsonify({
@@ -160,10 +428,15 @@ def raw_compras():
 
 @api_bp.route('/raw/ventas', methods=['GET'])
 def raw_ventas():
-    """Obtener datos de ventas"""
+    """
+    Obtener datos de ventas
+    
+    Query parameters:
+        start_date, end_date, tipo_cafe, sort, offset, limit, fields (ver apply_raw_query)
+        format: json (por defecto), ndjson o csv
+    """
     try:
-        df = get_ventas_data()
-        return jsonify(df.to_dict(orient='records'))
+        return _raw_response(get_ventas_data(), 'ventas')
     except Exception as e:
         logger.error(f"Error al obtener datos de ventas: {e}")
         return jsonify({
@@ -173,10 +446,15 @@ def raw_ventas():
 
 @api_bp.route('/raw/gastos', methods=['GET'])
 def raw_gastos():
-    """Obtener datos de gastos"""
+    """
+    Obtener datos de gastos
+    
+    Query parameters:
+        start_date, end_date, tipo_cafe, sort, offset, limit, fields (ver apply_raw_query)
+        format: json (por defecto), ndjson o csv
+    """
     try:
-        df = get_gastos_data()
-        return jsonify(df.to_dict(orient='records'))
+        return _raw_response(get_gastos_data(), 'gastos')
     except Exception as e:
         logger.error(f"Error al obtener datos de gastos: {e}")
         return jsonify({
@@ -186,10 +464,15 @@ def raw_gastos():
 
 @api_bp.route('/raw/proceso', methods=['GET'])
 def raw_proceso():
-    """Obtener datos de proceso"""
+    """
+    Obtener datos de proceso
+    
+    Query parameters:
+        start_date, end_date, tipo_cafe, sort, offset, limit, fields (ver apply_raw_query)
+        format: json (por defecto), ndjson o csv
+    """
     try:
-        df = get_proceso_data()
-        return jsonify(df.to_dict(orient='records'))
+        return _raw_response(get_proceso_data(), 'proceso')
     except Exception as e:
         logger.error(f"Error al obtener datos de proceso: {e}")
         return jsonify({
@@ -199,10 +482,15 @@ def raw_proceso():
 
 @api_bp.route('/raw/almacen', methods=['GET'])
 def raw_almacen():
-    """Obtener datos de almacén"""
+    """
+    Obtener datos de almacén
+    
+    Query parameters:
+        start_date, end_date, tipo_cafe, sort, offset, limit, fields (ver apply_raw_query)
+        format: json (por defecto), ndjson o csv
+    """
     try:
-        df = get_almacen_data()
-        return jsonify(df.to_dict(orient='records'))
+        return _raw_response(get_almacen_data(), 'almacén')
     except Exception as e:
         logger.error(f"Error al obtener datos de almacén: {e}")
         return jsonify({
@@ -0,0 +1,143 @@
+"""
+Registro de esquemas de las hojas.
+Resuelve una sola vez por combinación de encabezados qué columna real
+corresponde a cada campo lógico (id, total, nota, referencias entre hojas...)
+y avisa al cargar una hoja si le faltan columnas necesarias.
+"""
+import logging
+import threading
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+NOTA_NAMES = ['notas', 'nota', 'observacion', 'observaciones']
+
+class Field:
+    """
+    Regla para encontrar la columna de un campo lógico
+
+    Con `names` se elige la columna cuyo nombre en minúsculas aparece antes en
+    la lista; con `contains` la primera columna (en el orden de la hoja) cuyo
+    nombre contiene todos los fragmentos indicados.
+    """
+    __slots__ = ('names', 'contains', 'required')
+
+    def __init__(self, names=(), contains=(), required=False):
+        self.names = [name.lower() for name in names]
+        self.contains = [part.lower() for part in contains]
+        self.required = required
+
+    def resolve(self, columns):
+        """Columna real del campo entre los encabezados dados, o None"""
+        if self.contains:
+            return next((col for col in columns
+                         if all(part in str(col).lower() for part in self.contains)), None)
+        by_name = {}
+        for col in columns:
+            by_name.setdefault(str(col).lower(), col)
+        return next((by_name[name] for name in self.names if name in by_name), None)
+
+    def describe(self):
+        """Descripción de las columnas aceptadas, para los mensajes de error"""
+        if self.contains:
+            return f"una columna que contenga {' y '.join(repr(part) for part in self.contains)}"
+        return ', '.join(self.names)
+
+# Campos lógicos de cada hoja
+SHEET_FIELDS = {
+    'compras': {
+        'fecha': Field(['fecha'], required=True),
+        'id': Field(['id', 'codigo', 'compra_id'], required=True),
+        'total': Field(['total', 'preciototal'], required=True),
+        'cantidad': Field(['cantidad']),
+        'nota': Field(NOTA_NAMES)
+    },
+    'proceso': {
+        'fecha': Field(['fecha'], required=True),
+        'id': Field(['id', 'codigo', 'proceso_id'], required=True),
+        'compra_ref': Field(contains=['compras_', 'id'], required=True),
+        'total': Field(['total', 'preciototal']),
+        'nota': Field(NOTA_NAMES)
+    },
+    'almacen': {
+        'fecha': Field(['fecha']),
+        'id': Field(['id', 'codigo', 'almacen_id'], required=True),
+        'proceso_ref': Field(contains=['proceso', 'id'], required=True)
+    },
+    'ventas': {
+        'fecha': Field(['fecha'], required=True),
+        'almacen_ref': Field(contains=['almacen', 'id'], required=True),
+        'total': Field(['total', 'precio_total'], required=True),
+        'cantidad': Field(['cantidad'])
+    },
+    'gastos': {
+        'fecha': Field(['fecha'], required=True),
+        'monto': Field(['monto'], required=True),
+        'descripcion': Field(['descripcion'])
+    }
+}
+
+class SheetSchema:
+    """Columnas reales de los campos lógicos de una hoja con unos encabezados concretos"""
+
+    def __init__(self, sheet, columns):
+        """
+        Args:
+            sheet (str): Nombre interno de la hoja
+            columns (tuple): Encabezados de la hoja
+        """
+        fields = SHEET_FIELDS.get(sheet, {})
+        self.sheet = sheet
+        self.columns = {name: field.resolve(columns) for name, field in fields.items()}
+        self.missing = [name for name, field in fields.items()
+                        if field.required and self.columns[name] is None]
+
+    def __getitem__(self, field):
+        """Columna real del campo lógico, o None si la hoja no la tiene"""
+        return self.columns.get(field)
+
+    def errors(self):
+        """Mensajes que explican cada campo obligatorio sin columna"""
+        fields = SHEET_FIELDS.get(self.sheet, {})
+        return [f"falta '{name}' (se acepta {fields[name].describe()})" for name in self.missing]
+
+# Esquemas resueltos por hoja y encabezados
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+def resolve_schema(sheet, df):
+    """
+    Obtiene el esquema de una hoja, resolviéndolo solo la primera vez que se ven sus encabezados
+
+    Args:
+        sheet (str): Nombre interno de la hoja ('compras', 'ventas', etc.)
+        df (pandas.DataFrame): DataFrame de la hoja
+
+    Returns:
+        SheetSchema: Columnas reales de los campos lógicos
+    """
+    key = (sheet.lower(), tuple(df.columns))
+    schema = _schemas.get(key)
+    if schema is not None:
+        return schema
+
+    schema = SheetSchema(key[0], key[1])
+    with _schemas_lock:
+        _schemas.setdefault(key, schema)
+    if schema.missing and len(df.columns) > 0:
+        logger.warning(f"Encabezados incompletos en la hoja {sheet}: {'; '.join(schema.errors())}. "
+                       f"Encabezados: {list(df.columns)}")
+    return _schemas[key]
+
+def validate_schemas(frames):
+    """
+    Resuelve y valida el esquema de las hojas recién leídas
+
+    Pensada como listener de la caché de hojas: los problemas de encabezados
+    se registran al cargar la hoja y no en cada petición.
+
+    Args:
+        frames (dict): Nombre interno de la hoja -> DataFrame
+    """
+    for sheet, df in frames.items():
+        resolve_schema(sheet, df)
@@ -0,0 +1,229 @@
+"""
+Sincronización incremental de hojas de solo anexado.
+Guarda por hoja cuántas filas se han sincronizado (marca de agua) y en cada
+refresco descarga solo las filas nuevas, comprobando las últimas filas ya
+conocidas para detectar ediciones antiguas.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from server.frames import append_rows
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def _rows_checksum(rows):
+    """Suma de comprobación de una lista de filas tal como las devuelve la API"""
+    payload = json.dumps(rows, default=str, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+class _SyncState:
+    """Estado sincronizado de una hoja"""
+    __slots__ = ('header', 'rows', 'tail_checksum', 'frame', 'full_synced_at')
+
+    def __init__(self, header, rows, tail_checksum, frame, full_synced_at):
+        self.header = header                    # Fila de encabezados
+        self.rows = rows                        # Filas leídas, incluida la cabecera (marca de agua)
+        self.tail_checksum = tail_checksum      # Suma de comprobación de las últimas filas
+        self.frame = frame                      # DataFrame normalizado de la hoja
+        self.full_synced_at = full_synced_at    # Última lectura completa (monotonic)
+
+class IncrementalSheetLoader:
+    """
+    Loader de hojas para la caché de instantáneas con sincronización incremental
+
+    Cada llamada hace una sola petición batchGet con, por hoja:
+    - la hoja completa (`A:Z`) si es la primera lectura o toca reconciliar, o
+    - la cabecera (`A1:Z1`) y las filas desde la marca de agua menos `tail_rows`
+      (`A{n-k+1}:Z`), para añadir solo las filas nuevas.
+
+    Si la cabecera o las últimas filas conocidas cambiaron, la hoja se vuelve a
+    leer completa en una segunda petición. Cuando no hay filas nuevas se
+    devuelve el mismo DataFrame, de modo que los índices derivados no cambian.
+    """
+
+    def __init__(self, batch_get, to_frame, sheet_names, tail_rows=20, full_sync_interval=3600):
+        """
+        Args:
+            batch_get (callable): Recibe una lista de rangos A1 y devuelve la lista
+                de valores de cada rango en una sola llamada a la API
+            to_frame (callable): Convierte valores (cabecera + filas) en un DataFrame normalizado
+            sheet_names (dict): Nombre interno -> nombre real de la hoja
+            tail_rows (int): Filas ya sincronizadas que se vuelven a leer para detectar ediciones
+            full_sync_interval (int): Segundos entre lecturas completas de cada hoja
+        """
+        self._batch_get = batch_get
+        self._to_frame = to_frame
+        self._sheet_names = sheet_names
+        self.tail_rows = max(tail_rows, 1)
+        self.full_sync_interval = full_sync_interval
+        self._states = {}
+        # Serializa las sincronizaciones: dos lecturas incrementales simultáneas
+        # sobre el mismo estado duplicarían filas
+        self._lock = threading.Lock()
+        self._stats = {
+            'full_syncs': 0,
+            'incremental_syncs': 0,
+            'reconciles': 0,
+            'rows_appended': 0
+        }
+
+    def __call__(self, keys):
+        """
+        Sincroniza las hojas indicadas
+
+        Args:
+            keys (list): Nombres internos de las hojas
+
+        Returns:
+            dict: DataFrame normalizado de cada hoja
+        """
+        with self._lock:
+            now = time.monotonic()
+            full, incremental = [], []
+            for key in keys:
+                state = self._states.get(key)
+                if (state is None or state.rows < 2
+                        or now - state.full_synced_at >= self.full_sync_interval):
+                    full.append(key)
+                else:
+                    incremental.append(key)
+
+            ranges = []
+            for key in incremental:
+                sheet = self._sheet_names.get(key, key)
+                ranges.append(f"{sheet}!A1:Z1")
+                ranges.append(f"{sheet}!A{self._tail_start(self._states[key])}:Z")
+            for key in full:
+                ranges.append(f"{self._sheet_names.get(key, key)}!A:Z")
+
+            values = self._batch_get(ranges)
+            result = {}
+
+            mismatched = []
+            for position, key in enumerate(incremental):
+                header = values[2 * position]
+                tail = values[2 * position + 1]
+                if not self._apply_incremental(key, header[0] if header else None, tail):
+                    mismatched.append(key)
+
+            for position, key in enumerate(full):
+                self._apply_full(key, values[2 * len(incremental) + position], now)
+
+            if mismatched:
+                logger.info(f"Cambios en filas ya sincronizadas de {', '.join(mismatched)}; se releen completas")
+                self._stats['reconciles'] += len(mismatched)
+                ranges = [f"{self._sheet_names.get(key, key)}!A:Z" for key in mismatched]
+                for key, sheet_values in zip(mismatched, self._batch_get(ranges)):
+                    self._apply_full(key, sheet_values, now)
+
+            for key in keys:
+                result[key] = self._states[key].frame
+            return result
+
+    def _tail_start(self, state):
+        """Primera fila (1-indexada) del rango incremental de una hoja"""
+        return state.rows - min(self.tail_rows, state.rows - 1) + 1
+
+    def _apply_full(self, key, values, now):
+        """Reemplaza el estado de una hoja con una lectura completa"""
+        frame = self._to_frame(values)
+        data = values[1:]
+        self._states[key] = _SyncState(
+            header=values[0] if values else [],
+            rows=len(values),
+            tail_checksum=_rows_checksum(data[-self.tail_rows:]),
+            frame=frame,
+            full_synced_at=now
+        )
+        self._stats['full_syncs'] += 1
+        logger.info(f"Lectura completa de {self._sheet_names.get(key, key)}: {len(frame)} registros")
+
+    def _apply_incremental(self, key, header, tail):
+        """
+        Añade las filas nuevas de una hoja a su estado
+
+        Returns:
+            bool: False si la cabecera o las filas ya conocidas cambiaron
+        """
+        state = self._states[key]
+        known = min(self.tail_rows, state.rows - 1)
+        if header != state.header or len(tail) < known:
+            return False
+        if _rows_checksum(tail[:known]) != state.tail_checksum:
+            return False
+
+        new_rows = tail[known:]
+        if new_rows:
+            state.frame = append_rows(state.frame, self._to_frame([state.header] + new_rows))
+            state.rows += len(new_rows)
+            state.tail_checksum = _rows_checksum(tail[-self.tail_rows:])
+            self._stats['rows_appended'] += len(new_rows)
+            logger.info(f"Añadidas {len(new_rows)} filas nuevas de {self._sheet_names.get(key, key)}")
+
+        self._stats['incremental_syncs'] += 1
+        return True
+
+    def export_state(self, key):
+        """
+        Devuelve el estado serializable de una hoja para guardarlo junto a su DataFrame
+
+        Returns:
+            dict: Cabecera, marca de agua y suma de comprobación; None si no hay estado
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return None
+            return {
+                'header': state.header,
+                'rows': state.rows,
+                'tail_checksum': state.tail_checksum,
+                'full_sync_age': time.monotonic() - state.full_synced_at
+            }
+
+    def restore(self, key, frame, state):
+        """
+        Restaura el estado de una hoja guardado con export_state
+
+        La siguiente sincronización de la hoja será incremental si no ha
+        vencido el intervalo de lectura completa.
+
+        Args:
+            key (str): Nombre interno de la hoja
+            frame (pandas.DataFrame): DataFrame normalizado guardado
+            state (dict): Estado devuelto por export_state, con 'full_sync_age'
+                actualizado al momento de la restauración
+        """
+        with self._lock:
+            if key in self._states:
+                return
+            self._states[key] = _SyncState(
+                header=state['header'],
+                rows=state['rows'],
+                tail_checksum=state['tail_checksum'],
+                frame=frame,
+                full_synced_at=time.monotonic() - state['full_sync_age']
+            )
+
+    def stats(self):
+        """
+        Devuelve los contadores de sincronización y la marca de agua de cada hoja
+
+        Returns:
+            dict: Contadores y filas sincronizadas por hoja
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['sheets'] = {
+                key: {
+                    'rows': state.rows,
+                    'full_sync_age_seconds': round(now - state.full_synced_at, 3)
+                }
+                for key, state in self._states.items()
+            }
+        return stats
@@ -4,14 +4,26 @@ Proporciona funciones para leer y analizar datos de las hojas de café.
 """
 import os
 import json
+import hashlib
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import httplib2
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 import pandas as pd
-from datetime import datetime
-import pytz
 
 from server.config import get_config
+from server.snapshot_cache import SheetSnapshotCache
+from server.sheet_sync import IncrementalSheetLoader
+from server.snapshot_store import SnapshotStore, SnapshotWriter
+from server.frames import normalize_sheet, detail_records, frame_fingerprint, date_index, sequential_sum
+from server.lineage import LineageIndex, LINEAGE_SHEETS, resolve_lineage_columns
+from server.rollups import DailyRollup, ROLLUP_SHEETS
+from server.query_session import query_session
+from server.schema import resolve_schema, validate_schemas
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -29,98 +41,428 @@ SHEET_NAMES = {
     'almacen': 'Almacen'
 }
 
+# Credenciales compartidas por todo el proceso y un cliente de Sheets por hilo,
+# porque httplib2 no es seguro entre hilos
+_credentials = None
+_credentials_lock = threading.Lock()
+_thread_local = threading.local()
+
 def get_credentials():
-    """Obtiene las credenciales de Google Sheets desde las variables de entorno"""
-    try:
-        credentials_info = config.get_google_credentials_dict()
-        if not credentials_info:
-            logger.error("No se encontraron credenciales de Google válidas")
+    """
+    Obtiene las credenciales de Google Sheets desde las variables de entorno
+    
+    Las credenciales se crean una sola vez por proceso y se reutilizan, de modo
+    que el token OAuth se conserva entre lecturas y se renueva al expirar.
+    """
+    global _credentials
+    if _credentials is not None:
+        return _credentials
+        
+    with _credentials_lock:
+        if _credentials is not None:
+            return _credentials
+        try:
+            credentials_info = config.get_google_credentials_dict()
+            if not credentials_info:
+                logger.error("No se encontraron credenciales de Google válidas")
+                return None
+                
+            _credentials = service_account.Credentials.from_service_account_info(
+                credentials_info, scopes=SCOPES)
+            return _credentials
+        except Exception as e:
+            logger.error(f"Error al obtener credenciales: {e}")
             return None
-            
-        return service_account.Credentials.from_service_account_info(
-            credentials_info, scopes=SCOPES)
-    except Exception as e:
-        logger.error(f"Error al obtener credenciales: {e}")
-        return None
 
 def get_sheets_service():
-    """Crear servicio de Google Sheets"""
+    """
+    Obtiene el servicio de Google Sheets del hilo actual
+    
+    Cada hilo construye su cliente una sola vez a partir del documento de
+    descubrimiento incluido en googleapiclient, sin descargarlo. El cliente se
+    reconstruye si el proceso cambia (p. ej. tras el fork de gunicorn).
+    """
+    service = getattr(_thread_local, 'service', None)
+    if service is not None and _thread_local.pid == os.getpid():
+        return service
+        
     credentials = get_credentials()
     if not credentials:
         logger.error("No se pudo obtener credenciales para Google Sheets")
         return None
         
     try:
-        service = build('sheets', 'v4', credentials=credentials)
-        return service
+        # AuthorizedHttp renueva el token automáticamente cuando expira
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=config.SHEETS_HTTP_TIMEOUT))
+        service = build('sheets', 'v4', http=http, static_discovery=True, cache_discovery=False)
     except Exception as e:
         logger.error(f"Error al crear servicio de Google Sheets: {e}")
         return None
+        
+    _thread_local.service = service
+    _thread_local.pid = os.getpid()
+    return service
 
-def read_sheet_data(sheet_name):
+def _values_to_dataframe(values):
     """
-    Lee datos de una hoja específica de Google Sheets
+    Convierte los valores devueltos por la API (cabecera + filas) en un DataFrame
     
     Args:
-        sheet_name (str): Nombre de la hoja a leer ('compras', 'ventas', etc.)
+        values (list): Lista de filas, la primera con los encabezados
         
     Returns:
-        pandas.DataFrame: DataFrame con los datos de la hoja
+        pandas.DataFrame: DataFrame con los datos
+    """
+    if not values:
+        return pd.DataFrame()
+        
+    headers = values[0]
+    data = values[1:] if len(values) > 1 else []
+    
+    # Asegurarse de que todas las filas tengan la misma longitud
+    data = [row[:len(headers)] + [''] * (len(headers) - len(row)) for row in data]
+    
+    return pd.DataFrame(data, columns=headers)
+
+def _batch_get_request(ranges):
+    """
+    Lee varios rangos de la hoja de cálculo en una sola llamada batchGet
+    
+    Args:
+        ranges (list): Rangos en notación A1 ('Compras!A:Z', ...)
+        
+    Returns:
+        list: Valores (lista de filas) de cada rango, en el mismo orden
+        
+    Raises:
+        RuntimeError: Si no hay servicio o SPREADSHEET_ID configurado
+        Exception: Cualquier error devuelto por la API de Google Sheets
     """
     service = get_sheets_service()
     if not service:
-        logger.error("No se pudo obtener servicio de Google Sheets")
-        return pd.DataFrame()
+        raise RuntimeError("No se pudo obtener servicio de Google Sheets")
         
     spreadsheet_id = config.SPREADSHEET_ID
     if not spreadsheet_id:
-        logger.error("SPREADSHEET_ID no está configurado")
-        return pd.DataFrame()
+        raise RuntimeError("SPREADSHEET_ID no está configurado")
     
-    # Obtener el nombre real de la hoja
-    real_sheet_name = SHEET_NAMES.get(sheet_name.lower(), sheet_name)
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=ranges,
+        valueRenderOption='UNFORMATTED_VALUE'
+    ).execute()
     
-    try:
-        # Primero leer el rango para determinar cuántas filas hay
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=f"{real_sheet_name}!A:A"
-        ).execute()
+    value_ranges = result.get('valueRanges', [])
+    return [value_range.get('values', []) for value_range in value_ranges]
+
+# Pool compartido por todo el proceso para leer varias hojas en paralelo.
+# Su tamaño limita las peticiones simultáneas a la API desde el proceso.
+_fetch_executor = None
+_fetch_executor_pid = None
+_fetch_executor_lock = threading.Lock()
+
+def _get_fetch_executor():
+    """Obtiene el pool de lectura del proceso actual, o None si está deshabilitado"""
+    global _fetch_executor, _fetch_executor_pid
+    if config.SHEETS_FETCH_WORKERS < 1:
+        return None
+    with _fetch_executor_lock:
+        # Tras un fork los hilos del pool no existen en el proceso hijo
+        if _fetch_executor is None or _fetch_executor_pid != os.getpid():
+            _fetch_executor = ThreadPoolExecutor(
+                max_workers=config.SHEETS_FETCH_WORKERS, thread_name_prefix='sheets-fetch')
+            _fetch_executor_pid = os.getpid()
+        return _fetch_executor
+
+def _batch_get_values(ranges):
+    """
+    Lee varios rangos de la hoja de cálculo
+    
+    Por defecto todos los rangos van en una sola petición batchGet. Con
+    SHEETS_FETCH_WORKERS > 0 se envía una petición por hoja en paralelo: los
+    rangos de una misma hoja van en la misma petición, cada hilo del pool usa
+    su propio cliente de Google Sheets y la lectura tarda lo que la hoja más
+    lenta, a cambio de más peticiones a la cuota de la API.
+    
+    Args:
+        ranges (list): Rangos en notación A1 ('Compras!A:Z', ...)
         
-        values = result.get('values', [])
-        if not values:
-            logger.warning(f"No hay datos en la hoja {real_sheet_name}")
-            return pd.DataFrame()
-            
-        # Ahora leer todas las columnas para esas filas
-        num_rows = len(values)
-        range_name = f"{real_sheet_name}!A1:Z{num_rows}"
+    Returns:
+        list: Valores (lista de filas) de cada rango, en el mismo orden
+        
+    Raises:
+        TimeoutError: Si la lectura supera SHEETS_FETCH_TIMEOUT segundos
+        RuntimeError: Si no hay servicio o SPREADSHEET_ID configurado
+        Exception: Cualquier error devuelto por la API de Google Sheets
+    """
+    executor = _get_fetch_executor()
+    if executor is None:
+        return _batch_get_request(ranges)
+        
+    groups = {}
+    for position, sheet_range in enumerate(ranges):
+        groups.setdefault(sheet_range.rpartition('!')[0], []).append(position)
         
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=range_name,
-            valueRenderOption='UNFORMATTED_VALUE'
-        ).execute()
+    futures = [(positions, executor.submit(_batch_get_request, [ranges[i] for i in positions]))
+               for positions in groups.values()]
+    
+    results = [None] * len(ranges)
+    deadline = time.monotonic() + config.SHEETS_FETCH_TIMEOUT
+    try:
+        for positions, future in futures:
+            values = future.result(timeout=max(deadline - time.monotonic(), 0))
+            for position, sheet_values in zip(positions, values):
+                results[position] = sheet_values
+    except FuturesTimeoutError:
+        raise TimeoutError(f"La lectura de {len(groups)} hojas superó {config.SHEETS_FETCH_TIMEOUT} segundos")
+    finally:
+        for _, future in futures:
+            future.cancel()
+    return results
+
+def _values_to_sheet_frame(values):
+    """Convierte los valores de una hoja en un DataFrame normalizado"""
+    return normalize_sheet(_values_to_dataframe(values))
+
+def fetch_sheets_data(sheet_names=None):
+    """
+    Descarga varias hojas de Google Sheets en una sola llamada batchGet
+    
+    Cada hoja se normaliza (fechas, importes, categorías e IDs) al leerse.
+    
+    Args:
+        sheet_names (list): Nombres de las hojas a leer ('compras', 'ventas', etc.).
+            Si no se indica, se leen todas las hojas de SHEET_NAMES.
+        
+    Returns:
+        dict: DataFrame de cada hoja indexado por nombre en minúsculas
         
-        values = result.get('values', [])
+    Raises:
+        RuntimeError: Si no hay servicio o SPREADSHEET_ID configurado
+        Exception: Cualquier error devuelto por la API de Google Sheets
+    """
+    keys = [name.lower() for name in (sheet_names or SHEET_NAMES.keys())]
+    
+    # Rangos abiertos: la API recorta las filas vacías al final de cada hoja
+    ranges = [f"{SHEET_NAMES.get(key, key)}!A:Z" for key in keys]
+    
+    frames = {}
+    for key, values in zip(keys, _batch_get_values(ranges)):
+        real_sheet_name = SHEET_NAMES.get(key, key)
         if not values:
-            logger.warning(f"No hay datos en {range_name}")
-            return pd.DataFrame()
+            logger.warning(f"No hay datos en la hoja {real_sheet_name}")
             
-        # Convertir a DataFrame
-        headers = values[0]
-        data = values[1:] if len(values) > 1 else []
+        frames[key] = _values_to_sheet_frame(values)
+        logger.info(f"Leídos {len(frames[key])} registros de {real_sheet_name}")
         
-        # Asegurarse de que todas las filas tengan la misma longitud
-        data = [row + [''] * (len(headers) - len(row)) for row in data]
-        
-        df = pd.DataFrame(data, columns=headers)
-        logger.info(f"Leídos {len(df)} registros de {real_sheet_name}")
-        return df
+    return frames
+
+# Sincronización incremental: solo se descargan las filas nuevas de cada hoja
+sheet_sync = IncrementalSheetLoader(
+    _batch_get_values,
+    _values_to_sheet_frame,
+    SHEET_NAMES,
+    tail_rows=config.SHEETS_SYNC_TAIL_ROWS,
+    full_sync_interval=config.SHEETS_FULL_SYNC_INTERVAL
+)
+
+# Caché compartida por todo el proceso. Los DataFrames normalizados se
+# comparten sin copiar, por lo que los cálculos no deben modificarlos.
+sheet_cache = SheetSnapshotCache(
+    sheet_sync if config.SHEETS_INCREMENTAL_SYNC else fetch_sheets_data,
+    ttl=config.SHEETS_CACHE_TTL,
+    max_stale=config.SHEETS_CACHE_MAX_STALE,
+    group=SHEET_NAMES.keys(),
+    wait_timeout=config.SHEETS_CACHE_WAIT_TIMEOUT
+)
+
+# Los encabezados de cada hoja se validan al cargarla, no en cada cálculo
+sheet_cache.add_listener(validate_schemas)
+
+def _index_dates(frames):
+    """Ordena por fecha las hojas recién leídas para que los filtros por rango sean búsquedas binarias"""
+    for df in frames.values():
+        if 'fecha' in df.columns:
+            date_index(df)
+
+sheet_cache.add_listener(_index_dates)
+
+# Instantáneas en disco para arranques en caliente y como respaldo si la API falla
+snapshot_store = SnapshotStore(config.SNAPSHOT_DIR) if config.SNAPSHOT_STORE_ENABLED else None
+snapshot_writer = SnapshotWriter(snapshot_store) if snapshot_store is not None else None
+
+def _persist_snapshots(frames):
+    """Programa la escritura en disco de las hojas que cambiaron tras una lectura del loader"""
+    for key, df in frames.items():
+        # El estado de sincronización se toma ahora, junto con la hoja que describe
+        metadata = {'sync': sheet_sync.export_state(key) if config.SHEETS_INCREMENTAL_SYNC else None}
+        snapshot_writer.submit(key, df, metadata)
+
+def restore_snapshots():
+    """
+    Carga en la caché las últimas instantáneas guardadas en disco
+    
+    Las hojas restauradas se sirven de inmediato y se reconcilian con
+    Google Sheets en segundo plano.
+    
+    Returns:
+        int: Número de hojas restauradas
+    """
+    if snapshot_store is None or not snapshot_store.available or not config.SHEETS_CACHE_ENABLED:
+        return 0
+        
+    snapshots = snapshot_store.load_all(SHEET_NAMES.keys())
+    for key, (df, metadata, age) in snapshots.items():
+        sync_state = metadata.get('sync')
+        if config.SHEETS_INCREMENTAL_SYNC and sync_state:
+            sync_state['full_sync_age'] += age
+            sheet_sync.restore(key, df, sync_state)
+        snapshot_writer.mark_saved(key, df)
+        
+    _track_data_version({key: df for key, (df, metadata, age) in snapshots.items()})
+    sheet_cache.seed({key: (df, age) for key, (df, metadata, age) in snapshots.items()})
+    if snapshots:
+        logger.info(f"Restauradas desde disco las hojas: {', '.join(sorted(snapshots))}")
+    return len(snapshots)
+
+if snapshot_store is not None and snapshot_store.available:
+    sheet_cache.add_listener(_persist_snapshots)
+
+# Versión de los datos: aumenta cada vez que cambia el contenido de alguna hoja de la caché.
+# La huella identifica el contenido de las hojas y es igual en todos los workers.
+_data_version = 0
+_versioned_frames = {}
+_frame_fingerprints = {}
+_data_fingerprint = None
+_data_version_lock = threading.Lock()
+
+def _track_data_version(frames):
+    """Aumenta la versión de los datos si el contenido de alguna hoja leída cambió"""
+    global _data_version, _data_fingerprint
+    with _data_version_lock:
+        changed = [key for key, df in frames.items() if _versioned_frames.get(key) is not df]
+        if not changed:
+            return
+        for key in changed:
+            _versioned_frames[key] = frames[key]
+            _frame_fingerprints[key] = frame_fingerprint(frames[key])
+        fingerprint = hashlib.sha1(json.dumps(sorted(_frame_fingerprints.items())).encode('utf-8')).hexdigest()
+        # Una relectura con el mismo contenido (p. ej. la sincronización completa
+        # periódica) no invalida las respuestas guardadas ni los ETag
+        if fingerprint != _data_fingerprint:
+            _data_fingerprint = fingerprint
+            _data_version += 1
+
+sheet_cache.add_listener(_track_data_version)
+
+def data_version():
+    """
+    Obtiene la versión de los datos que sirve la caché de hojas
+    
+    Consulta la caché para que las hojas ausentes se lean y las vencidas se
+    refresquen igual que en una lectura normal.
+    
+    Returns:
+        int: Versión actual, o None si la caché está deshabilitada (cada
+            lectura puede devolver datos distintos)
+    """
+    if not config.SHEETS_CACHE_ENABLED:
+        return None
+    read_all_sheets()
+    return _data_version
+
+def data_fingerprint():
+    """
+    Obtiene la huella del contenido de las hojas
+    
+    Se calcula una sola vez por cada lectura de las hojas y es igual en todos
+    los workers que sirven los mismos datos.
+    
+    Returns:
+        str: Huella SHA-1, o None si la caché está deshabilitada o aún no hay datos
+    """
+    if data_version() is None:
+        return None
+    return _data_fingerprint
+
+def read_sheets(*sheet_names):
+    """
+    Lee varias hojas de Google Sheets con una sola llamada a la API
+    
+    Los datos se sirven desde la caché de instantáneas si está habilitada.
+    
+    Args:
+        *sheet_names (str): Nombres de las hojas a leer ('compras', 'ventas', etc.)
         
+    Returns:
+        dict: DataFrame de cada hoja indexado por nombre en minúsculas. Las hojas
+            que no se pudieron leer se devuelven como DataFrames vacíos.
+    """
+    keys = [name.lower() for name in sheet_names]
+    try:
+        if config.SHEETS_CACHE_ENABLED:
+            return sheet_cache.get_many(keys)
+        return fetch_sheets_data(keys)
     except Exception as e:
-        logger.error(f"Error al leer datos de {real_sheet_name}: {e}")
-        return pd.DataFrame()
+        logger.error(f"Error al leer datos de {', '.join(SHEET_NAMES.get(k, k) for k in keys)}: {e}")
+        return {key: pd.DataFrame() for key in keys}
+
+def read_all_sheets():
+    """
+    Lee todas las hojas de SHEET_NAMES con una sola llamada a la API
+    
+    Returns:
+        dict: DataFrame de cada hoja indexado por nombre en minúsculas
+    """
+    return read_sheets(*SHEET_NAMES.keys())
+
+def read_sheet_data(sheet_name):
+    """
+    Lee datos de una hoja específica de Google Sheets
+    
+    Args:
+        sheet_name (str): Nombre de la hoja a leer ('compras', 'ventas', etc.)
+        
+    Returns:
+        pandas.DataFrame: DataFrame con los datos de la hoja
+    """
+    return read_sheets(sheet_name)[sheet_name.lower()]
+
+# Índice de trazabilidad compartido, sincronizado con cada nueva instantánea
+lineage_index = LineageIndex()
+
+def get_lineage_index():
+    """
+    Obtiene el índice de trazabilidad sincronizado con la instantánea actual
+    
+    Dentro de una sesión de consulta, el índice corresponde exactamente a las
+    hojas de la sesión y no cambia aunque otra petición sincronice el índice
+    con una instantánea posterior.
+    
+    Returns:
+        LineageSnapshot: Índice compra -> proceso -> almacén -> venta
+    """
+    with query_session(read_sheets) as session:
+        return session.derived(
+            'lineage', lambda current: lineage_index.update(current.sheets(*LINEAGE_SHEETS)))
+
+# Agregados diarios compartidos; avanzan con cada nueva lectura de la caché
+daily_rollup = DailyRollup()
+sheet_cache.add_listener(daily_rollup.observe)
+
+def get_daily_rollup():
+    """
+    Obtiene los agregados diarios de la instantánea actual
+    
+    Dentro de una sesión de consulta, los agregados corresponden exactamente
+    a las hojas de la sesión, igual que el índice de trazabilidad.
+    
+    Returns:
+        RollupSnapshot: Métricas por día de todas las hojas
+    """
+    with query_session(read_sheets) as session:
+        return session.derived(
+            'daily_rollup', lambda current: daily_rollup.update(current.sheets(*ROLLUP_SHEETS)))
 
 def get_compras_data():
     """Obtiene datos de compras"""
@@ -142,52 +484,6 @@ def get_almacen_data():
     """Obtiene datos de almacen"""
     return read_sheet_data('almacen')
 
-def filter_by_date_range(df, fecha_col='fecha', start_date=None, end_date=None, timezone='America/Lima'):
-    """
-    Filtra un DataFrame por rango de fechas
-    
-    Args:
-        df (pandas.DataFrame): DataFrame a filtrar
-        fecha_col (str): Nombre de la columna de fecha
-        start_date (str): Fecha de inicio en formato 'YYYY-MM-DD'
-        end_date (str): Fecha de fin en formato 'YYYY-MM-DD'
-        timezone (str): Zona horaria para las fechas
-        
-    Returns:
-        pandas.DataFrame: DataFrame filtrado
-    """
-    if fecha_col not in df.columns:
-        logger.warning(f"Columna {fecha_col} no encontrada en el DataFrame")
-        return df
-    
-    # Convertir columna de fecha a datetime si no lo es
-    try:
-        df[fecha_col] = pd.to_datetime(df[fecha_col], errors='coerce')
-    except Exception as e:
-        logger.error(f"Error al convertir fechas: {e}")
-        return df
-    
-    # Filtrar por rango de fechas
-    if start_date:
-        try:
-            start_date = pd.to_datetime(start_date)
-            tz = pytz.timezone(timezone)
-            start_date = start_date.replace(tzinfo=tz)
-            df = df[df[fecha_col] >= start_date]
-        except Exception as e:
-            logger.error(f"Error al filtrar por fecha de inicio: {e}")
-    
-    if end_date:
-        try:
-            end_date = pd.to_datetime(end_date)
-            tz = pytz.timezone(timezone)
-            end_date = end_date.replace(hour=23, minute=59, second=59, tzinfo=tz)
-            df = df[df[fecha_col] <= end_date]
-        except Exception as e:
-            logger.error(f"Error al filtrar por fecha de fin: {e}")
-            
-    return df
-
 def calculate_compras_summary(start_date=None, end_date=None):
     """
     Calcula resumen de compras, separando las que tienen notas de adelantos de las que no
@@ -200,30 +496,14 @@ def calculate_compras_summary(start_date=None, end_date=None):
         dict: Resumen de compras con totales separados
     """
     try:
-        # Obtener datos de compras
-        compras_df = get_compras_data()
-        
-        # Filtrar por fecha si es necesario
-        if start_date or end_date:
-            compras_df = filter_by_date_range(compras_df, 'fecha', start_date, end_date)
-            
-        # Convertir tipos de datos para cálculos
-        for col in compras_df.columns:
-            if col.lower() in ['cantidad', 'precio', 'total', 'preciototal']:
-                compras_df[col] = pd.to_numeric(compras_df[col], errors='coerce').fillna(0)
-        
-        # Verificar si existe la columna 'notas'
-        nota_col = None
-        for col_name in compras_df.columns:
-            if col_name.lower() in ['notas', 'nota', 'observacion', 'observaciones']:
-                nota_col = col_name
-                break
-        
-        total_col = None
-        for col_name in compras_df.columns:
-            if col_name.lower() in ['total', 'preciototal']:
-                total_col = col_name
-                break
+        # Compras filtradas por fecha de la sesión de consulta
+        with query_session(read_sheets) as session:
+            compras_df = session.filtered(['compras'], start_date, end_date)['compras']
+        
+        # Columnas de notas y total según el esquema de la hoja
+        schema = resolve_schema('compras', compras_df)
+        nota_col = schema['nota']
+        total_col = schema['total']
                 
         if nota_col is None or total_col is None:
             logger.warning("No se encontró columna de notas o total en la hoja de compras")
@@ -234,11 +514,11 @@ def calculate_compras_summary(start_date=None, end_date=None):
             }
         
         # Separar compras con y sin adelantos - buscar específicamente texto que contenga "Compra con adelanto"
-        compras_df['es_adelanto'] = compras_df[nota_col].astype(str).str.contains('Compra con adelanto', case=False, na=False)
+        es_adelanto = compras_df[nota_col].astype(str).str.contains('Compra con adelanto', case=False, na=False)
         
         # Calcular totales
-        compras_con_adelantos = compras_df[compras_df['es_adelanto']][total_col].sum()
-        compras_sin_adelantos = compras_df[~compras_df['es_adelanto']][total_col].sum()
+        compras_con_adelantos = compras_df[es_adelanto][total_col].sum()
+        compras_sin_adelantos = compras_df[~es_adelanto][total_col].sum()
         total_compras = compras_con_adelantos + compras_sin_adelantos
         
         # Imprimir para depuración
@@ -272,71 +552,47 @@ def get_detailed_profit_by_process(start_date=None, end_date=None):
         dict: Detalles de ganancias por cada proceso
     """
     try:
-        # Obtener datos de todas las hojas necesarias
-        compras_df = get_compras_data()
-        proceso_df = get_proceso_data()
-        almacen_df = get_almacen_data()
-        ventas_df = get_ventas_data()
-        
-        # Filtrar por fecha si es necesario
-        if start_date or end_date:
-            proceso_df = filter_by_date_range(proceso_df, 'fecha', start_date, end_date)
-            
-        # Convertir tipos de datos para cálculos
-        for df in [compras_df, proceso_df, almacen_df, ventas_df]:
-            for col in df.columns:
-                if col.lower() in ['cantidad', 'precio', 'total', 'preciototal', 'precio_kg']:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        
-        # Identificar columnas relevantes en cada DataFrame
-        proceso_id_col = next((col for col in proceso_df.columns if col.lower() in ['id', 'codigo', 'proceso_id']), None)
-        compras_id_col = next((col for col in compras_df.columns if col.lower() in ['id', 'codigo', 'compra_id']), None)
-        compras_total_col = next((col for col in compras_df.columns if col.lower() in ['total', 'preciototal']), None)
-        proceso_compras_id_col = next((col for col in proceso_df.columns if 'compras_' in col.lower() and 'id' in col.lower()), None)
-        almacen_proceso_id_col = next((col for col in almacen_df.columns if 'proceso' in col.lower() and 'id' in col.lower()), None)
-        ventas_almacen_id_col = next((col for col in ventas_df.columns if 'almacen' in col.lower() and 'id' in col.lower()), None)
-        ventas_total_col = next((col for col in ventas_df.columns if col.lower() in ['total', 'precio_total']), None)
-        
-        # Verificar columnas identificadas
-        required_cols = {
-            'proceso_id_col': proceso_id_col,
-            'compras_id_col': compras_id_col, 
-            'compras_total_col': compras_total_col,
-            'proceso_compras_id_col': proceso_compras_id_col,
-            'almacen_proceso_id_col': almacen_proceso_id_col,
-            'ventas_almacen_id_col': ventas_almacen_id_col,
-            'ventas_total_col': ventas_total_col
-        }
-        
-        missing_cols = [k for k, v in required_cols.items() if v is None]
+        # Índice de trazabilidad y procesos del rango sobre la misma instantánea
+        with query_session(read_sheets) as session:
+            lineage = get_lineage_index()
+            proceso_df = session.filtered(['proceso'], start_date, end_date)['proceso']
+        
+        # Columnas relevantes identificadas por el índice
+        columns = lineage.columns
+        proceso_id_col = columns['proceso_id']
+        compras_total_col = columns['compras_total']
+        proceso_compras_id_col = columns['proceso_compras_id']
+        almacen_id_col = columns['almacen_id']
+        ventas_total_col = columns['ventas_total']
+        
+        missing_cols = [f"{k}_col" for k, v in columns.items() if v is None]
         if missing_cols:
             logger.warning(f"No se encontraron todas las columnas necesarias: {missing_cols}")
         
         # Resultados detallados por proceso
         detailed_results = []
         
+        if proceso_id_col is None:
+            proceso_records = []
+        else:
+            proceso_records = detail_records(proceso_df)
+        
         # Para cada proceso en el rango de fechas
-        for _, proceso_row in proceso_df.iterrows():
-            if proceso_id_col is None or proceso_id_col not in proceso_df.columns:
-                continue
-                
-            proceso_id = str(proceso_row[proceso_id_col]).strip() if pd.notna(proceso_row[proceso_id_col]) else ''
+        for proceso_row in proceso_records:
+            proceso_id = proceso_row[proceso_id_col]
             if not proceso_id:
                 continue
                 
-            # Obtener fecha del proceso
-            fecha_proceso = proceso_row['fecha'] if 'fecha' in proceso_df.columns and pd.notna(proceso_row['fecha']) else None
-            
             # 1. Encontrar la compra asociada al proceso
-            compra_id = str(proceso_row[proceso_compras_id_col]).strip() if pd.notna(proceso_row[proceso_compras_id_col]) else ''
+            compra_id = proceso_row[proceso_compras_id_col] if proceso_compras_id_col else ''
             
             # Datos básicos del proceso
             proceso_info = {
                 'proceso_id': proceso_id,
-                'fecha_proceso': fecha_proceso.strftime('%Y-%m-%d') if isinstance(fecha_proceso, (datetime, pd.Timestamp)) else None,
+                'fecha_proceso': proceso_row.get('fecha'),
                 'compra_id': compra_id,
-                'tipo_cafe': proceso_row['tipo_cafe'] if 'tipo_cafe' in proceso_df.columns else 'Desconocido',
-                'cantidad_entrada': float(proceso_row['cantidad']) if 'cantidad' in proceso_df.columns else 0.0,
+                'tipo_cafe': proceso_row['tipo_cafe'] if 'tipo_cafe' in proceso_row else 'Desconocido',
+                'cantidad_entrada': float(proceso_row['cantidad']) if 'cantidad' in proceso_row else 0.0,
                 'costo_compra': 0.0,
                 'ingresos_ventas': 0.0,
                 'ganancia': 0.0,
@@ -345,48 +601,44 @@ def get_detailed_profit_by_process(start_date=None, end_date=None):
             }
             
             # 2. Obtener costo de la compra asociada
-            if compra_id:
-                compra_matches = compras_df[compras_df[compras_id_col].astype(str).str.strip() == compra_id]
-                if not compra_matches.empty:
-                    compra_row = compra_matches.iloc[0]
-                    costo_compra = float(compra_row[compras_total_col]) if compras_total_col in compras_df.columns else 0.0
-                    proceso_info['costo_compra'] = costo_compra
-                    
-                    # Añadir detalles de la compra
-                    proceso_info['detalles']['compra'] = {
-                        'fecha': compra_row['fecha'].strftime('%Y-%m-%d') if isinstance(compra_row.get('fecha'), (datetime, pd.Timestamp)) else None,
-                        'tipo_cafe': compra_row.get('tipo_cafe', 'Desconocido'),
-                        'cantidad': float(compra_row.get('cantidad', 0)),
-                        'precio_kg': float(compra_row.get('precio', 0)),
-                        'total': costo_compra
-                    }
+            compra_row = lineage.compra(compra_id) if compra_id else None
+            if compra_row is not None:
+                costo_compra = float(compra_row[compras_total_col]) if compras_total_col else 0.0
+                proceso_info['costo_compra'] = costo_compra
+                
+                # Añadir detalles de la compra
+                proceso_info['detalles']['compra'] = {
+                    'fecha': compra_row.get('fecha'),
+                    'tipo_cafe': compra_row.get('tipo_cafe', 'Desconocido'),
+                    'cantidad': float(compra_row.get('cantidad', 0)),
+                    'precio_kg': float(compra_row.get('precio', 0)),
+                    'total': costo_compra
+                }
             
             # 3. Encontrar registros de almacén asociados a este proceso
             almacen_asociado = []
-            if almacen_proceso_id_col:
-                almacen_matches = almacen_df[almacen_df[almacen_proceso_id_col].astype(str).str.strip() == proceso_id]
-                for _, almacen_row in almacen_matches.iterrows():
-                    almacen_id = str(almacen_row[almacen_id_col]).strip() if pd.notna(almacen_row.get(almacen_id_col)) else ''
-                    almacen_asociado.append({
-                        'almacen_id': almacen_id,
-                        'fecha': almacen_row['fecha'].strftime('%Y-%m-%d') if isinstance(almacen_row.get('fecha'), (datetime, pd.Timestamp)) else None,
-                        'tipo_cafe': almacen_row.get('tipo_cafe', 'Desconocido'),
-                        'cantidad': float(almacen_row.get('cantidad', 0))
-                    })
+            for almacen_row in lineage.lots_for_proceso(proceso_id):
+                almacen_asociado.append({
+                    'almacen_id': almacen_row[almacen_id_col] if almacen_id_col else '',
+                    'fecha': almacen_row.get('fecha'),
+                    'tipo_cafe': almacen_row.get('tipo_cafe', 'Desconocido'),
+                    'cantidad': float(almacen_row.get('cantidad', 0))
+                })
             
             proceso_info['detalles']['almacen'] = almacen_asociado
             
             # 4. Encontrar ventas asociadas a los registros de almacén
             for almacen_item in almacen_asociado:
                 almacen_id = almacen_item['almacen_id']
-                ventas_matches = ventas_df[ventas_df[ventas_almacen_id_col].astype(str).str.strip() == almacen_id]
-                
-                for _, venta_row in ventas_matches.iterrows():
-                    venta_total = float(venta_row[ventas_total_col]) if ventas_total_col in ventas_df.columns else 0.0
+                if not almacen_id:
+                    continue
+                    
+                for venta_row in lineage.ventas_for_lot(almacen_id):
+                    venta_total = float(venta_row[ventas_total_col]) if ventas_total_col else 0.0
                     proceso_info['ingresos_ventas'] += venta_total
                     
                     venta_info = {
-                        'fecha': venta_row['fecha'].strftime('%Y-%m-%d') if isinstance(venta_row.get('fecha'), (datetime, pd.Timestamp)) else None,
+                        'fecha': venta_row.get('fecha'),
                         'cliente': venta_row.get('cliente', 'Desconocido'),
                         'tipo_cafe': venta_row.get('tipo_cafe', 'Desconocido'),
                         'cantidad': float(venta_row.get('cantidad', 0)),
@@ -444,61 +696,22 @@ def calculate_profit_by_process(start_date=None, end_date=None):
         dict: Resumen de ganancias por proceso
     """
     try:
-        # Obtener datos de todas las hojas necesarias
-        compras_df = get_compras_data()
-        proceso_df = get_proceso_data()
-        almacen_df = get_almacen_data()
-        ventas_df = get_ventas_data()
-        
-        # Filtrar por fecha si es necesario
-        if start_date or end_date:
-            compras_df = filter_by_date_range(compras_df, 'fecha', start_date, end_date)
-            proceso_df = filter_by_date_range(proceso_df, 'fecha', start_date, end_date)
-            almacen_df = filter_by_date_range(almacen_df, 'fecha', start_date, end_date)
-            ventas_df = filter_by_date_range(ventas_df, 'fecha', start_date, end_date)
-            
-        # Convertir tipos de datos para cálculos
-        for df in [compras_df, proceso_df, almacen_df, ventas_df]:
-            for col in df.columns:
-                if col.lower() in ['cantidad', 'precio', 'total', 'preciototal', 'precio_kg']:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        
-        # Identificar columnas relevantes en cada DataFrame
-        compras_id_col = None
-        for col in compras_df.columns:
-            if col.lower() in ['id', 'codigo', 'compra_id']:
-                compras_id_col = col
-                break
-                
-        compras_total_col = None
-        for col in compras_df.columns:
-            if col.lower() in ['total', 'preciototal']:
-                compras_total_col = col
-                break
-                
-        proceso_compras_id_col = None
-        for col in proceso_df.columns:
-            if 'compras_' in col.lower() and 'id' in col.lower():
-                proceso_compras_id_col = col
-                break
-                
-        almacen_id_col = None
-        for col in almacen_df.columns:
-            if col.lower() in ['id', 'codigo', 'almacen_id']:
-                almacen_id_col = col
-                break
-                
-        ventas_almacen_id_col = None
-        for col in ventas_df.columns:
-            if 'almacen' in col.lower() and 'id' in col.lower():
-                ventas_almacen_id_col = col
-                break
-                
-        ventas_total_col = None
-        for col in ventas_df.columns:
-            if col.lower() in ['total', 'precio_total']:
-                ventas_total_col = col
-                break
+        # Hojas filtradas por fecha de la sesión de consulta (compartidas con el resumen)
+        with query_session(read_sheets) as session:
+            sheets = session.filtered(['compras', 'proceso', 'almacen', 'ventas'], start_date, end_date)
+        compras_df = sheets['compras']
+        proceso_df = sheets['proceso']
+        almacen_df = sheets['almacen']
+        ventas_df = sheets['ventas']
+        
+        # Columnas relevantes según el esquema de cada hoja
+        columns = resolve_lineage_columns(sheets)
+        compras_id_col = columns['compras_id']
+        compras_total_col = columns['compras_total']
+        proceso_compras_id_col = columns['proceso_compras_id']
+        almacen_id_col = columns['almacen_id']
+        ventas_almacen_id_col = columns['ventas_almacen_id']
+        ventas_total_col = columns['ventas_total']
                 
         # Verificar que se encontraron todas las columnas necesarias
         if (compras_id_col is None or compras_total_col is None or 
@@ -517,38 +730,27 @@ def calculate_profit_by_process(start_date=None, end_date=None):
                 'ganancia_real': 0.0
             }
         
-        # Calcular costo total de compras que han sido procesadas
-        costo_compras_procesadas = 0.0
-        ingresos_ventas_procesadas = 0.0
-        
-        # Mapear compras a procesos
-        compras_procesadas = {}
+        # IDs de las compras que pasaron a proceso (sin espacios alrededor)
+        compras_procesadas = pd.Index([])
         if not proceso_df.empty and proceso_compras_id_col in proceso_df.columns:
-            for _, row in proceso_df.iterrows():
-                compra_id = row[proceso_compras_id_col]
-                if pd.notna(compra_id) and compra_id != '':
-                    # Limpiar el ID (a veces viene con espacios o caracteres adicionales)
-                    compra_id = str(compra_id).strip()
-                    compras_procesadas[compra_id] = True
+            compra_ids = proceso_df[proceso_compras_id_col]
+            compra_ids = compra_ids[compra_ids.notna() & (compra_ids != '')]
+            compras_procesadas = pd.Index(compra_ids.astype(str).str.strip().unique())
         
         # Sumar el costo de las compras procesadas
+        costo_compras_procesadas = 0.0
         if not compras_df.empty and compras_id_col in compras_df.columns and compras_total_col in compras_df.columns:
-            for _, row in compras_df.iterrows():
-                compra_id = str(row[compras_id_col]).strip() if pd.notna(row[compras_id_col]) else ''
-                if compra_id in compras_procesadas:
-                    costo_compras_procesadas += float(row[compras_total_col])
-        
-        # Mapear almacén a ventas
-        almacen_vendido = {}
-        if not ventas_df.empty and ventas_almacen_id_col in ventas_df.columns:
-            for _, row in ventas_df.iterrows():
-                almacen_id = row[ventas_almacen_id_col]
-                if pd.notna(almacen_id) and almacen_id != '':
-                    # Limpiar el ID
-                    almacen_id = str(almacen_id).strip()
-                    if ventas_total_col in ventas_df.columns:
-                        almacen_vendido[almacen_id] = float(row[ventas_total_col])
-                        ingresos_ventas_procesadas += float(row[ventas_total_col])
+            compras_ids = compras_df[compras_id_col]
+            compras_ids = compras_ids.where(compras_ids.notna(), '').astype(str).str.strip()
+            es_procesada = compras_ids.isin(compras_procesadas)
+            costo_compras_procesadas = sequential_sum(compras_df[compras_total_col][es_procesada])
+        
+        # Sumar los ingresos de las ventas de lotes de almacén
+        ingresos_ventas_procesadas = 0.0
+        if not ventas_df.empty and ventas_almacen_id_col in ventas_df.columns and ventas_total_col in ventas_df.columns:
+            almacen_ids = ventas_df[ventas_almacen_id_col]
+            es_de_almacen = almacen_ids.notna() & (almacen_ids != '')
+            ingresos_ventas_procesadas = sequential_sum(ventas_df[ventas_total_col][es_de_almacen])
         
         # Calcular ganancia real
         ganancia_real = ingresos_ventas_procesadas - costo_compras_procesadas
@@ -585,72 +787,30 @@ def calculate_daily_summary(start_date=None, end_date=None):
         dict: Resumen diario con estadísticas
     """
     try:
-        # Obtener datos
-        compras_df = get_compras_data()
-        ventas_df = get_ventas_data()
-        gastos_df = get_gastos_data()
-        
-        # Obtener también datos del proceso (que contiene compras con adelantos)
-        proceso_df = get_proceso_data()
-        
-        # Filtrar por fecha si es necesario
-        if start_date or end_date:
-            compras_df = filter_by_date_range(compras_df, 'fecha', start_date, end_date)
-            ventas_df = filter_by_date_range(ventas_df, 'fecha', start_date, end_date)
-            gastos_df = filter_by_date_range(gastos_df, 'fecha', start_date, end_date)
-            proceso_df = filter_by_date_range(proceso_df, 'fecha', start_date, end_date)
+        # Todos los cálculos del resumen comparten una instantánea de las hojas
+        with query_session(read_sheets):
+            # Sumar los agregados diarios de los días del rango
+            rollup = get_daily_rollup()
+            totals = rollup.totals(start_date, end_date)
             
-        # Convertir tipos de datos para cálculos
-        for df in [compras_df, ventas_df, gastos_df, proceso_df]:
-            for col in df.columns:
-                if col.lower() in ['cantidad', 'precio', 'total', 'monto', 'preciototal']:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        
-        # Calcular estadísticas
-        kg_comprados = compras_df['cantidad'].sum() if 'cantidad' in compras_df.columns else 0
-        kg_vendidos = ventas_df['cantidad'].sum() if 'cantidad' in ventas_df.columns else 0
-        ingresos = ventas_df['total'].sum() if 'total' in ventas_df.columns else 0
-        
-        # Análisis de gastos
-        gastos_total = gastos_df['monto'].sum() if 'monto' in gastos_df.columns else 0
-        
-        # Análisis de métodos de pago (basado en descripción)
-        if 'descripcion' in gastos_df.columns:
-            gastos_efectivo = gastos_df[gastos_df['descripcion'].astype(str).str.upper().str.contains('EFECTIVO', na=False)]['monto'].sum()
-            gastos_transferencia = gastos_df[gastos_df['descripcion'].astype(str).str.upper().str.contains('TRANSFERENCIA', na=False)]['monto'].sum()
+            # Calcular ganancia real basada en procesos
+            profit_summary = calculate_profit_by_process(start_date, end_date)
+        
+        kg_comprados = totals['kg_comprados']
+        kg_vendidos = totals['kg_vendidos']
+        ingresos = totals['ingresos']
+        gastos_total = totals['gastos']
+        gastos_efectivo = totals['efectivo']
+        gastos_transferencia = totals['transferencia']
+        
+        # Compras con y sin adelantos según el proceso; si el proceso no tiene
+        # columnas de notas y total, según las notas de las compras
+        if rollup.proceso_split:
+            compras_con_adelantos = totals['con_adelantos']
+            compras_sin_adelantos = totals['sin_adelantos']
         else:
-            gastos_efectivo = 0
-            gastos_transferencia = 0
-            
-        # Calcular resumen de compras (con y sin adelantos) usando los datos de proceso
-        # En proceso, las compras con adelantos tienen una nota que comienza con "Compra con adelanto"
-        nota_col = None
-        for col_name in proceso_df.columns:
-            if col_name.lower() in ['notas', 'nota', 'observacion', 'observaciones']:
-                nota_col = col_name
-                break
-                
-        total_col = None
-        for col_name in proceso_df.columns:
-            if col_name.lower() in ['total', 'preciototal']:
-                total_col = col_name
-                break
-                
-        compras_con_adelantos = 0
-        compras_sin_adelantos = 0
-                
-        if nota_col is not None and total_col is not None:
-            proceso_df['es_adelanto'] = proceso_df[nota_col].astype(str).str.contains('Compra con adelanto', case=False, na=False)
-            compras_con_adelantos = proceso_df[proceso_df['es_adelanto']][total_col].sum()
-            compras_sin_adelantos = proceso_df[~proceso_df['es_adelanto']][total_col].sum()
-        else:
-            # Si no se encuentran las columnas en proceso, usar la función calculate_compras_summary
-            compras_summary = calculate_compras_summary(start_date, end_date)
-            compras_con_adelantos = compras_summary['compras_con_adelantos']
-            compras_sin_adelantos = compras_summary['compras_sin_adelantos']
-        
-        # Calcular ganancia real basada en procesos
-        profit_summary = calculate_profit_by_process(start_date, end_date)
+            compras_con_adelantos = totals['compras_con_adelantos']
+            compras_sin_adelantos = totals['compras_sin_adelantos']
             
         # Construir resumen
         summary = {
@@ -680,9 +840,9 @@ def calculate_daily_summary(start_date=None, end_date=None):
                 'otro': float(gastos_total - gastos_efectivo - gastos_transferencia)
             },
             'operaciones': {
-                'compras': len(compras_df),
-                'ventas': len(ventas_df),
-                'gastos': len(gastos_df)
+                'compras': int(totals['ops_compras']),
+                'ventas': int(totals['ops_ventas']),
+                'gastos': int(totals['ops_gastos'])
             }
         }
         
@@ -711,130 +871,46 @@ def get_daily_summaries(start_date=None, end_date=None):
         list: Lista de resúmenes diarios
     """
     try:
-        # Obtener datos
-        compras_df = get_compras_data()
-        ventas_df = get_ventas_data()
-        gastos_df = get_gastos_data()
-        proceso_df = get_proceso_data()
-        almacen_df = get_almacen_data()
-        
-        # Convertir columnas de fecha a datetime
-        for df in [compras_df, ventas_df, gastos_df, proceso_df, almacen_df]:
-            if 'fecha' in df.columns:
-                df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-        
-        # Filtrar por fecha si es necesario
-        if start_date or end_date:
-            compras_df = filter_by_date_range(compras_df, 'fecha', start_date, end_date)
-            ventas_df = filter_by_date_range(ventas_df, 'fecha', start_date, end_date)
-            gastos_df = filter_by_date_range(gastos_df, 'fecha', start_date, end_date)
-            proceso_df = filter_by_date_range(proceso_df, 'fecha', start_date, end_date)
-            almacen_df = filter_by_date_range(almacen_df, 'fecha', start_date, end_date)
-            
-        # Convertir tipos de datos para cálculos
-        for df in [compras_df, ventas_df, gastos_df, proceso_df, almacen_df]:
-            for col in df.columns:
-                if col.lower() in ['cantidad', 'precio', 'total', 'monto', 'preciototal']:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        
-        # Obtener todas las fechas únicas
-        all_dates = pd.DataFrame()
-        for df in [compras_df, ventas_df, gastos_df, proceso_df, almacen_df]:
-            if 'fecha' in df.columns and not df.empty:
-                all_dates = pd.concat([all_dates, df[['fecha']]])
-        
-        if all_dates.empty:
+        # Días con actividad en alguna hoja dentro del rango
+        daily = get_daily_rollup().days(start_date, end_date)
+        daily = daily[daily['fecha'].notna()]
+        
+        if daily.empty:
             return []
-            
-        # Extraer solo la fecha (sin hora)
-        all_dates['fecha_solo'] = all_dates['fecha'].dt.date
-        unique_dates = sorted(all_dates['fecha_solo'].unique())
-        
-        # Preparar columnas para proceso
-        nota_col_proceso = None
-        for col_name in proceso_df.columns:
-            if col_name.lower() in ['notas', 'nota', 'observacion', 'observaciones']:
-                nota_col_proceso = col_name
-                break
-                
-        total_col_proceso = None
-        for col_name in proceso_df.columns:
-            if col_name.lower() in ['total', 'preciototal']:
-                total_col_proceso = col_name
-                break
-                
-        if nota_col_proceso is not None and total_col_proceso is not None:
-            proceso_df['es_adelanto'] = proceso_df[nota_col_proceso].astype(str).str.contains('Compra con adelanto', case=False, na=False)
         
         daily_summaries = []
-        
-        for date in unique_dates:
-            str_date = date.strftime('%Y-%m-%d')
-            
-            # Filtrar por día específico
-            day_compras = compras_df[compras_df['fecha'].dt.date == date] if 'fecha' in compras_df.columns else pd.DataFrame()
-            day_ventas = ventas_df[ventas_df['fecha'].dt.date == date] if 'fecha' in ventas_df.columns else pd.DataFrame()
-            day_gastos = gastos_df[gastos_df['fecha'].dt.date == date] if 'fecha' in gastos_df.columns else pd.DataFrame()
-            day_proceso = proceso_df[proceso_df['fecha'].dt.date == date] if 'fecha' in proceso_df.columns else pd.DataFrame()
-            day_almacen = almacen_df[almacen_df['fecha'].dt.date == date] if 'fecha' in almacen_df.columns else pd.DataFrame()
-            
-            # Calcular estadísticas del día
-            kg_comprados = day_compras['cantidad'].sum() if 'cantidad' in day_compras.columns else 0
-            kg_vendidos = day_ventas['cantidad'].sum() if 'cantidad' in day_ventas.columns else 0
-            ingresos = day_ventas['total'].sum() if 'total' in day_ventas.columns else 0
-            gastos_total = day_gastos['monto'].sum() if 'monto' in day_gastos.columns else 0
-            
-            # Análisis de métodos de pago (basado en descripción)
-            if 'descripcion' in day_gastos.columns and not day_gastos.empty:
-                gastos_efectivo = day_gastos[day_gastos['descripcion'].astype(str).str.upper().str.contains('EFECTIVO', na=False)]['monto'].sum()
-                gastos_transferencia = day_gastos[day_gastos['descripcion'].astype(str).str.upper().str.contains('TRANSFERENCIA', na=False)]['monto'].sum()
-            else:
-                gastos_efectivo = 0
-                gastos_transferencia = 0
-                
-            # Calcular compras con y sin adelantos para el día desde hoja de proceso
-            compras_con_adelantos = 0
-            compras_sin_adelantos = 0
-            
-            if nota_col_proceso is not None and total_col_proceso is not None and not day_proceso.empty:
-                compras_con_adelantos = day_proceso[day_proceso['es_adelanto']][total_col_proceso].sum()
-                compras_sin_adelantos = day_proceso[~day_proceso['es_adelanto']][total_col_proceso].sum()
-                
-            # Calcular ganancia real basada en procesos para el día
-            # Esto es una simplificación, ya que el proceso real puede involucrar días múltiples
+        for row in daily.to_dict(orient='records'):
+            # La ganancia real por día es una simplificación: el proceso real puede involucrar días múltiples
             ganancia_real = 0
             
-            # Construir resumen del día
-            day_summary = {
-                'fecha': str_date,
+            daily_summaries.append({
+                'fecha': row['fecha'].strftime('%Y-%m-%d'),
                 'inventario': {
-                    'kg_comprados': float(kg_comprados),
-                    'kg_vendidos': float(kg_vendidos)
+                    'kg_comprados': float(row['kg_comprados']),
+                    'kg_vendidos': float(row['kg_vendidos'])
                 },
                 'financiero': {
-                    'ingresos': float(ingresos),
-                    'gastos': float(gastos_total),
-                    'ganancia': float(ingresos - gastos_total),
+                    'ingresos': float(row['ingresos']),
+                    'gastos': float(row['gastos']),
+                    'ganancia': float(row['ingresos'] - row['gastos']),
                     'ganancia_real': float(ganancia_real)
                 },
                 'compras': {
-                    'total': float(compras_con_adelantos + compras_sin_adelantos),
-                    'sin_adelantos': float(compras_sin_adelantos),
-                    'con_adelantos': float(compras_con_adelantos)
+                    'total': float(row['con_adelantos'] + row['sin_adelantos']),
+                    'sin_adelantos': float(row['sin_adelantos']),
+                    'con_adelantos': float(row['con_adelantos'])
                 },
                 'metodos_pago': {
-                    'efectivo': float(gastos_efectivo),
-                    'transferencia': float(gastos_transferencia),
-                    'otro': float(gastos_total - gastos_efectivo - gastos_transferencia)
+                    'efectivo': float(row['efectivo']),
+                    'transferencia': float(row['transferencia']),
+                    'otro': float(row['gastos'] - row['efectivo'] - row['transferencia'])
                 },
                 'operaciones': {
-                    'compras': len(day_compras),
-                    'ventas': len(day_ventas),
-                    'gastos': len(day_gastos)
+                    'compras': int(row['ops_compras']),
+                    'ventas': int(row['ops_ventas']),
+                    'gastos': int(row['ops_gastos'])
                 }
-            }
-            
-            daily_summaries.append(day_summary)
+            })
             
         return daily_summaries
     except Exception as e:
@@ -857,11 +933,8 @@ def get_coffee_types_summary():
             logger.warning("Columna tipo_cafe no encontrada en compras")
             return {}
             
-        # Asegurar que la columna cantidad sea numérica
-        compras_df['cantidad'] = pd.to_numeric(compras_df['cantidad'], errors='coerce').fillna(0)
-        
         # Agrupar por tipo de café
-        tipos_cafe = compras_df.groupby('tipo_cafe').agg({
+        tipos_cafe = compras_df.groupby('tipo_cafe', observed=True).agg({
             'cantidad': 'sum',
             'tipo_cafe': 'count'
         }).rename(columns={'tipo_cafe': 'operaciones'})
@@ -0,0 +1,327 @@
+"""
+Caché de instantáneas de las hojas de Google Sheets.
+Mantiene en memoria la última lectura de cada hoja y la refresca en segundo plano.
+"""
+import logging
+import threading
+import time
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+class _Snapshot:
+    """Datos de una hoja junto con el momento en que se leyeron y se usaron por última vez"""
+    __slots__ = ('data', 'loaded_at', 'accessed_at')
+
+    def __init__(self, data, loaded_at):
+        self.data = data
+        self.loaded_at = loaded_at
+        self.accessed_at = loaded_at
+
+class _Flight:
+    """Lectura en curso de un conjunto de hojas, compartida por quienes la esperan"""
+    __slots__ = ('done', 'data', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = {}
+        self.error = None
+
+class SheetSnapshotCache:
+    """
+    Caché de instantáneas por nombre de hoja con TTL y refresco en segundo plano
+
+    - Si la instantánea tiene menos de `ttl` segundos se devuelve directamente (hit).
+    - Si es más antigua pero no supera `max_stale` se devuelve igualmente y se
+      programa su refresco en el hilo de fondo (stale-while-revalidate).
+    - Si no existe o supera `max_stale` se lee de forma síncrona (miss). Si esa
+      lectura falla y hay una instantánea anterior, se sirve esta (stale-if-error).
+
+    Un único hilo refrescador atiende las hojas vencidas y mantiene al día cada
+    `ttl` segundos las hojas que se han consultado en los últimos `max_stale`
+    segundos. Todas las hojas pendientes se refrescan con una sola llamada al loader.
+
+    Las lecturas son de vuelo único (single-flight): si una hoja ya se está
+    leyendo, las peticiones concurrentes esperan esa lectura y comparten su
+    resultado en lugar de lanzar otra.
+    """
+
+    def __init__(self, loader, ttl=60, max_stale=900, copy=None, group=(), wait_timeout=30):
+        """
+        Args:
+            loader (callable): Función que recibe una lista de nombres de hojas y
+                devuelve un dict con los datos de cada una. Debe lanzar una
+                excepción si la lectura falla.
+            ttl (int): Segundos durante los que una instantánea se considera fresca
+            max_stale (int): Segundos máximos durante los que se sirve una instantánea vencida
+            copy (callable): Función opcional aplicada a los datos antes de devolverlos
+            group (iterable): Hojas que se leen juntas cuando alguna falta en la caché
+            wait_timeout (float): Segundos máximos de espera de una lectura en curso
+        """
+        self._loader = loader
+        self._group = [key.lower() for key in group]
+        self.ttl = ttl
+        self.max_stale = max(max_stale, ttl)
+        self.wait_timeout = wait_timeout
+        self._copy = copy
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._inflight = {}
+        self._wakeup = threading.Event()
+        self._refresher = None
+        self._listeners = []
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'stale_if_error': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'coalesced': 0,
+            'coalesce_timeouts': 0
+        }
+
+    def get(self, sheet_name):
+        """
+        Obtiene los datos de una hoja desde la caché
+
+        Args:
+            sheet_name (str): Nombre de la hoja ('compras', 'ventas', etc.)
+
+        Returns:
+            Datos de la hoja tal como los devuelve el loader
+        """
+        key = sheet_name.lower()
+        return self.get_many([key])[key]
+
+    def get_many(self, sheet_names):
+        """
+        Obtiene los datos de varias hojas desde la caché
+
+        Si falta alguna hoja, todas las hojas ausentes o vencidas del grupo se
+        leen juntas en una única llamada al loader.
+
+        Args:
+            sheet_names (iterable): Nombres de las hojas
+
+        Returns:
+            dict: Datos de cada hoja indexados por nombre en minúsculas
+        """
+        keys = [name.lower() for name in sheet_names]
+        now = time.monotonic()
+        result = {}
+        missing = []
+
+        with self._lock:
+            for key in keys:
+                snapshot = self._entries.get(key)
+                if snapshot is not None:
+                    age = now - snapshot.loaded_at
+                    snapshot.accessed_at = now
+                    if age < self.ttl:
+                        self._stats['hits'] += 1
+                        result[key] = snapshot.data
+                        continue
+                    if age < self.max_stale:
+                        self._stats['stale_hits'] += 1
+                        self._pending.add(key)
+                        self._wakeup.set()
+                        result[key] = snapshot.data
+                        continue
+                self._stats['misses'] += 1
+                missing.append(key)
+
+            if missing:
+                # Esperar las hojas que ya se están leyendo en lugar de volver a leerlas
+                waiting = {key: self._inflight[key] for key in missing if key in self._inflight}
+                own = [key for key in missing if key not in waiting]
+                self._stats['coalesced'] += len(waiting)
+                flight = None
+                if own:
+                    # Aprovechar el viaje para traer también las hojas del grupo que no están frescas
+                    to_load = set(own)
+                    to_load.update(key for key in self._group
+                                   if key not in self._inflight
+                                   and (key not in self._entries
+                                        or now - self._entries[key].loaded_at >= self.ttl))
+                    flight = self._start_flight(to_load)
+
+        if missing:
+            if flight is not None:
+                # Lectura síncrona fuera del lock para no bloquear otras hojas
+                try:
+                    loaded = self._load(to_load)
+                    self._finish_flight(flight, loaded)
+                except Exception as e:
+                    self._finish_flight(flight, error=e)
+                    loaded = self._stale_if_error(own, e)
+                for key in own:
+                    result[key] = loaded[key]
+
+            for key, other in waiting.items():
+                result[key] = self._wait_flight(key, other)
+
+        if self._copy:
+            return {key: self._copy(data) for key, data in result.items()}
+        return result
+
+    def _start_flight(self, keys):
+        """Registra una lectura en curso de las hojas indicadas (requiere el lock)"""
+        flight = _Flight()
+        for key in keys:
+            self._inflight[key] = flight
+        return flight
+
+    def _finish_flight(self, flight, data=None, error=None):
+        """Publica el resultado de una lectura y despierta a quienes la esperan"""
+        flight.data = data or {}
+        flight.error = error
+        with self._lock:
+            for key in [key for key, other in self._inflight.items() if other is flight]:
+                del self._inflight[key]
+        flight.done.set()
+
+    def _wait_flight(self, key, flight):
+        """
+        Espera la lectura en curso de una hoja y devuelve sus datos
+
+        Si la lectura falla o no termina en `wait_timeout` segundos se sirve la
+        instantánea vencida, si existe.
+        """
+        if not flight.done.wait(self.wait_timeout):
+            with self._lock:
+                self._stats['coalesce_timeouts'] += 1
+            return self._stale_if_error([key], TimeoutError(
+                f"La lectura en curso de {key} no terminó en {self.wait_timeout} segundos"))[key]
+        if flight.error is not None:
+            return self._stale_if_error([key], flight.error)[key]
+        if key not in flight.data:
+            return self._stale_if_error([key], KeyError(key))[key]
+        return flight.data[key]
+
+    def _stale_if_error(self, keys, error):
+        """
+        Devuelve las instantáneas vencidas de las hojas tras un error de lectura
+
+        Relanza el error si alguna hoja no tiene instantánea.
+        """
+        with self._lock:
+            if any(key not in self._entries for key in keys):
+                raise error
+            self._stats['stale_if_error'] += len(keys)
+            logger.warning(f"Error al leer {', '.join(keys)}: {error}; se sirven instantáneas vencidas")
+            return {key: self._entries[key].data for key in keys}
+
+    def seed(self, snapshots):
+        """
+        Carga instantáneas obtenidas fuera del loader (p. ej. desde disco)
+
+        Las instantáneas se marcan al menos como vencidas para que el hilo
+        refrescador las reconcilie en cuanto arranque.
+
+        Args:
+            snapshots (dict): Nombre de la hoja -> (datos, edad en segundos)
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key, (data, age) in snapshots.items():
+                key = key.lower()
+                if key in self._entries:
+                    continue
+                self._entries[key] = _Snapshot(data, now - max(age, self.ttl))
+                self._pending.add(key)
+            if snapshots:
+                self._ensure_refresher()
+                self._wakeup.set()
+
+    def add_listener(self, callback):
+        """
+        Registra una función que se llama tras cada lectura del loader
+
+        Args:
+            callback (callable): Recibe el dict con los datos recién leídos
+        """
+        self._listeners.append(callback)
+
+    def invalidate(self, sheet_name=None):
+        """Descarta la instantánea de una hoja, o de todas si no se indica ninguna"""
+        with self._lock:
+            if sheet_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(sheet_name.lower(), None)
+
+    def stats(self):
+        """
+        Devuelve los contadores de la caché y la edad de cada instantánea
+
+        Returns:
+            dict: Contadores de aciertos/fallos y edad en segundos por hoja
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['ttl'] = self.ttl
+            stats['max_stale'] = self.max_stale
+            stats['sheets'] = {
+                key: {'age_seconds': round(now - snapshot.loaded_at, 3)}
+                for key, snapshot in self._entries.items()
+            }
+        total = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['stale_hits']) / total, 4) if total else 0.0
+        return stats
+
+    def _load(self, keys):
+        """Lee las hojas con el loader y guarda las nuevas instantáneas"""
+        loaded = self._loader(sorted(keys))
+        loaded_at = time.monotonic()
+        with self._lock:
+            for key, data in loaded.items():
+                self._entries[key] = _Snapshot(data, loaded_at)
+            self._ensure_refresher()
+
+        for callback in self._listeners:
+            try:
+                callback(loaded)
+            except Exception as e:
+                logger.error(f"Error en el listener de la caché de hojas: {e}")
+        return loaded
+
+    def _ensure_refresher(self):
+        """Arranca el hilo refrescador si aún no está en marcha (requiere el lock)"""
+        if self._refresher is None or not self._refresher.is_alive():
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name='sheet-cache-refresher', daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        """Bucle del hilo refrescador"""
+        while True:
+            self._wakeup.wait(timeout=self.ttl)
+            self._wakeup.clear()
+
+            now = time.monotonic()
+            with self._lock:
+                keys = set(self._pending)
+                self._pending.clear()
+                # Mantener al día las hojas vencidas que siguen en uso
+                keys.update(key for key, snapshot in self._entries.items()
+                            if now - snapshot.loaded_at >= self.ttl
+                            and now - snapshot.accessed_at < self.max_stale)
+                # Las hojas que ya se están leyendo no se vuelven a pedir
+                keys.difference_update(self._inflight)
+                flight = self._start_flight(keys) if keys else None
+
+            if not keys:
+                continue
+
+            try:
+                self._finish_flight(flight, self._load(keys))
+                with self._lock:
+                    self._stats['refreshes'] += 1
+            except Exception as e:
+                self._finish_flight(flight, error=e)
+                logger.error(f"Error al refrescar las hojas {sorted(keys)} en segundo plano: {e}")
+                with self._lock:
+                    self._stats['refresh_errors'] += 1
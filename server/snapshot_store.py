@@ -0,0 +1,228 @@
+"""
+Almacén local en disco de las instantáneas de las hojas.
+Guarda cada DataFrame normalizado en formato Feather (columnar) para que los
+workers arranquen con los últimos datos sin esperar a Google Sheets y puedan
+seguir respondiendo si la API no está disponible.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+class SnapshotStore:
+    """
+    Instantáneas en disco: `<hoja>.feather` con los datos y `<hoja>.json` con metadatos
+
+    Las escrituras son atómicas (archivo temporal + rename), de modo que varios
+    workers pueden compartir el mismo directorio.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Directorio donde se guardan las instantáneas
+        """
+        self.directory = directory
+        if feather is None:
+            logger.warning("pyarrow no está instalado; las instantáneas no se guardarán en disco")
+
+    @property
+    def available(self):
+        """Indica si el almacén puede usarse (pyarrow instalado)"""
+        return feather is not None
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def save(self, key, df, metadata=None):
+        """
+        Guarda la instantánea de una hoja
+
+        Args:
+            key (str): Nombre interno de la hoja
+            df (pandas.DataFrame): DataFrame normalizado
+            metadata (dict): Datos adicionales serializables a JSON
+        """
+        if not self.available:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+        data_path = self._path(key, 'feather')
+        meta_path = self._path(key, 'json')
+
+        table, json_columns = _to_arrow_compatible(df)
+        feather.write_feather(table, data_path + suffix)
+        with open(meta_path + suffix, 'w') as f:
+            json.dump({'saved_at': time.time(), 'metadata': metadata or {}, 'json_columns': json_columns},
+                      f, default=str)
+
+        os.replace(data_path + suffix, data_path)
+        os.replace(meta_path + suffix, meta_path)
+
+    def load(self, key):
+        """
+        Carga la instantánea de una hoja
+
+        Los datos se leen del archivo a un DataFrame nuevo, con los mismos
+        valores y tipos que el DataFrame guardado.
+
+        Returns:
+            tuple: (DataFrame, metadatos, edad en segundos) o None si no existe
+        """
+        if not self.available:
+            return None
+
+        data_path = self._path(key, 'feather')
+        meta_path = self._path(key, 'json')
+        if not os.path.exists(data_path) or not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        df = _from_arrow_compatible(feather.read_feather(data_path), meta.get('json_columns', []))
+        return df, meta.get('metadata', {}), max(time.time() - meta['saved_at'], 0.0)
+
+    def load_all(self, keys):
+        """
+        Carga las instantáneas disponibles de varias hojas
+
+        Las instantáneas ilegibles se ignoran.
+
+        Returns:
+            dict: Nombre de la hoja -> (DataFrame, metadatos, edad en segundos)
+        """
+        snapshots = {}
+        for key in keys:
+            try:
+                snapshot = self.load(key)
+            except Exception as e:
+                logger.error(f"Error al cargar la instantánea en disco de {key}: {e}")
+                continue
+            if snapshot is not None:
+                snapshots[key] = snapshot
+        return snapshots
+
+def _to_arrow_compatible(df):
+    """
+    Prepara un DataFrame para Feather
+
+    Las columnas con valores de varios tipos (texto y números mezclados en una
+    misma columna de la hoja) no tienen tipo en Arrow: cada valor se guarda
+    como su texto JSON, de modo que al cargarlo recupera su tipo y la huella
+    del DataFrame restaurado es la misma que la del leído de la hoja.
+
+    Returns:
+        tuple: (DataFrame para Feather, posiciones de las columnas guardadas como JSON)
+    """
+    df = df.reset_index(drop=True)
+    json_columns = []
+    for position in range(len(df.columns)):
+        series = df.iloc[:, position]
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) not in ['string', 'empty']:
+            df.isetitem(position, series.map(lambda value: None if value is None else json.dumps(value)))
+            json_columns.append(position)
+    return df, json_columns
+
+def _from_arrow_compatible(df, json_columns):
+    """Recupera los valores de las columnas guardadas como JSON por _to_arrow_compatible"""
+    for position in json_columns:
+        series = df.iloc[:, position].astype(object)
+        df.isetitem(position, series.map(lambda value: json.loads(value) if isinstance(value, str) else None))
+    return df
+
+class SnapshotWriter:
+    """
+    Escritor en segundo plano de las instantáneas de un SnapshotStore
+
+    `submit` solo apunta la última versión de cada hoja, de modo que las
+    lecturas del loader (y las peticiones que las esperan) no pagan la
+    escritura en disco. Si una hoja se envía varias veces antes de escribirse,
+    solo se guarda la más reciente.
+    """
+
+    def __init__(self, store):
+        """
+        Args:
+            store (SnapshotStore): Almacén donde se escriben las instantáneas
+        """
+        self.store = store
+        self._lock = threading.Lock()
+        self._pending = {}      # hoja -> (DataFrame, metadatos) pendientes de escribir
+        self._saved = {}        # hoja -> último DataFrame escrito o restaurado
+        self._idle = threading.Condition(self._lock)
+        self._writing = False
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def mark_saved(self, key, df):
+        """Anota que df ya está en disco (p. ej. porque se acaba de restaurar)"""
+        with self._lock:
+            self._saved[key] = df
+
+    def submit(self, key, df, metadata=None):
+        """
+        Programa la escritura de la instantánea de una hoja si no está ya en disco
+
+        Args:
+            key (str): Nombre interno de la hoja
+            df (pandas.DataFrame): DataFrame normalizado
+            metadata (dict): Datos adicionales serializables a JSON
+        """
+        with self._lock:
+            if self._saved.get(key) is df:
+                return
+            self._pending[key] = (df, metadata)
+            self._ensure_thread()
+        self._wakeup.set()
+
+    def flush(self, timeout=None):
+        """
+        Espera a que se escriban las instantáneas pendientes
+
+        Returns:
+            bool: False si se agotó el tiempo de espera
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def _ensure_thread(self):
+        """Arranca el hilo escritor en este proceso si no está en marcha (requiere el lock)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._write_loop, name='snapshot-writer', daemon=True)
+        self._thread.start()
+
+    def _write_loop(self):
+        """Bucle del hilo escritor"""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._writing = True
+
+            for key, (df, metadata) in pending.items():
+                try:
+                    self.store.save(key, df, metadata)
+                    with self._lock:
+                        self._saved[key] = df
+                except Exception as e:
+                    logger.error(f"Error al guardar la instantánea en disco de {key}: {e}")
+
+            with self._idle:
+                self._writing = False
+                self._idle.notify_all()
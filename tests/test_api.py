@@ -0,0 +1,111 @@
+"""
+Pruebas de las respuestas de la API (validación condicional con ETag)
+"""
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+from server.config import get_config
+from server.json_provider import FastJSONProvider
+from server.routes import api
+
+@pytest.fixture
+def client(monkeypatch):
+    """Cliente de una aplicación con solo la API y datos de hojas simulados"""
+    state = {'fingerprint': 'a' * 40, 'calls': 0}
+
+    def coffee_types():
+        state['calls'] += 1
+        return {'Arábica': {'kg_total': 140.64}}
+
+    monkeypatch.setattr(api, 'data_fingerprint', lambda: state['fingerprint'])
+    monkeypatch.setattr(api, 'data_version', lambda: None)
+    monkeypatch.setattr(api, 'get_coffee_types_summary', coffee_types)
+
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_object(get_config())
+    app.register_blueprint(api.api_bp, url_prefix='/api')
+    test_client = app.test_client()
+    test_client.state = state
+    return test_client
+
+def test_responde_304_con_el_mismo_etag(client):
+    first = client.get('/api/coffee-types')
+    assert first.status_code == 200
+    assert first.get_json() == {'Arábica': {'kg_total': 140.64}}
+    etag = first.headers['ETag']
+    assert 'Last-Modified' not in first.headers
+
+    second = client.get('/api/coffee-types', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == etag
+    assert client.state['calls'] == 1
+
+    # Las respuestas comprimidas llevan el ETag como débil
+    weak = client.get('/api/coffee-types', headers={'If-None-Match': 'W/' + etag})
+    assert weak.status_code == 304
+
+def test_el_etag_cambia_con_los_datos(client):
+    etag = client.get('/api/coffee-types').headers['ETag']
+    client.state['fingerprint'] = 'b' * 40
+    response = client.get('/api/coffee-types', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_sin_huella_no_hay_etag(client):
+    client.state['fingerprint'] = None
+    response = client.get('/api/coffee-types')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+def test_comprime_una_vez_por_version_de_datos(client, monkeypatch):
+    versions = {'current': 1}
+    compressed = []
+
+    def compress(data, encoding, **levels):
+        compressed.append(encoding)
+        return gzip.compress(data)
+
+    monkeypatch.setattr(api, 'data_version', lambda: versions['current'])
+    monkeypatch.setattr(api, 'compress_body', compress)
+    monkeypatch.setattr(api, 'negotiate_encoding', lambda: 'gzip')
+    client.application.config.update(RESPONSE_CACHE_ENABLED=True, COMPRESSION_MIN_SIZE=0)
+    api.response_cache.clear()
+
+    for _ in range(3):
+        response = client.get('/api/coffee-types')
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert json.loads(gzip.decompress(response.get_data())) == {'Arábica': {'kg_total': 140.64}}
+    assert compressed == ['gzip']
+    assert client.state['calls'] == 1
+
+    # Una versión nueva de los datos descarta también los cuerpos comprimidos
+    versions['current'] = 2
+    client.get('/api/coffee-types')
+    assert compressed == ['gzip', 'gzip']
+    assert client.state['calls'] == 2
+
+def test_un_resumen_con_error_no_lleva_etag(client, monkeypatch):
+    failures = {'error': 'cuota agotada'}
+
+    def coffee_types():
+        client.state['calls'] += 1
+        if failures['error']:
+            return {'error': failures['error']}
+        return {'Arábica': {'kg_total': 140.64}}
+
+    monkeypatch.setattr(api, 'get_coffee_types_summary', coffee_types)
+    failed = client.get('/api/coffee-types')
+    assert failed.status_code == 500
+    assert 'ETag' not in failed.headers
+
+    # Sin validador que revalidar, cuando el error desaparece llegan los datos
+    failures['error'] = None
+    response = client.get('/api/coffee-types')
+    assert response.status_code == 200
+    assert response.get_json() == {'Arábica': {'kg_total': 140.64}}
+    assert 'ETag' in response.headers
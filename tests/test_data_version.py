@@ -0,0 +1,22 @@
+"""
+Pruebas de la versión de los datos servidos por la caché de hojas
+"""
+import pandas as pd
+
+from server import sheets_service
+
+def test_la_version_solo_cambia_si_cambia_el_contenido():
+    compras = pd.DataFrame({'id': ['C1', 'C2'], 'total': [140.64, 22.905]})
+    sheets_service._track_data_version({'compras': compras})
+    version = sheets_service._data_version
+    fingerprint = sheets_service._data_fingerprint
+
+    # Misma información en un DataFrame nuevo (p. ej. tras una relectura completa)
+    sheets_service._track_data_version({'compras': compras.copy()})
+    assert sheets_service._data_version == version
+    assert sheets_service._data_fingerprint == fingerprint
+
+    changed = compras.assign(total=[140.64, 23.0])
+    sheets_service._track_data_version({'compras': changed})
+    assert sheets_service._data_version == version + 1
+    assert sheets_service._data_fingerprint != fingerprint
@@ -0,0 +1,169 @@
+"""
+Pruebas de la ganancia detallada por proceso frente al recorrido fila a fila original
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from server import sheets_service
+from server.frames import normalize_sheet
+from server.lineage import LineageIndex
+from server.query_session import query_session
+from server.sheets_service import get_detailed_profit_by_process
+
+def _raw_sheets():
+    # IDs con espacios, una compra inexistente, procesos sin compra y lotes sin ventas
+    return {
+        'compras': pd.DataFrame({
+            'fecha': ['2024-01-01', '2024-01-02', '2024-01-02', '2024-01-05'],
+            'id': ['C1', ' C2 ', 'C3', 'C1'],
+            'tipo_cafe': ['Arábica', 'Geisha', 'Bourbon', 'Arábica'],
+            'cantidad': ['100', '50', '', '30'],
+            'precio': ['10', '12.5', '9', '11'],
+            'total': ['1000', '625.3', '', '330']}),
+        'proceso': pd.DataFrame({
+            'fecha': ['2024-01-03', '2024-01-04', '2024-01-04', '2024-01-06', '2024-01-08'],
+            'id': ['P1', 'P2 ', 'P3', '', 'P5'],
+            'compras_ids': ['C1', 'C2', 'C9', 'C3', ''],
+            'tipo_cafe': ['Arábica', 'Geisha', 'Bourbon', 'Bourbon', 'Arábica'],
+            'cantidad': ['95', '48.5', '20', '10', '']}),
+        'almacen': pd.DataFrame({
+            'fecha': ['2024-01-05', '2024-01-06', '2024-01-07', '2024-01-09'],
+            'id': ['A1', 'A2', ' A3', 'A4'],
+            'proceso_id': ['P1', 'P1', 'P2', 'P5'],
+            'tipo_cafe': ['Arábica', 'Arábica', 'Geisha', 'Arábica'],
+            'cantidad': ['60', '30', '45', '']}),
+        'ventas': pd.DataFrame({
+            'fecha': ['2024-01-10', '2024-01-11', '2024-01-11', '2024-01-12', '2024-01-13'],
+            'almacen_id': ['A1', 'A3', 'A1 ', 'A7', 'A2'],
+            'cliente': ['Ana', 'Luis', 'Eva', 'Ana', 'Luis'],
+            'tipo_cafe': ['Arábica', 'Geisha', 'Arábica', 'Bourbon', 'Arábica'],
+            'cantidad': ['10', '5', '8', '2', '3.5'],
+            'precio': ['14.064', '20', '12.5', '9', '15'],
+            'total': ['140.64', '100', '100.1', '18', '52.5']})
+    }
+
+def _fecha(value):
+    return value.strftime('%Y-%m-%d') if isinstance(value, (datetime, pd.Timestamp)) else None
+
+def _baseline_detailed_profit(sheets, start_date=None, end_date=None):
+    """
+    Cálculo original de get_detailed_profit_by_process: búsquedas lineales por proceso
+
+    Con almacen_id_col resuelto como en calculate_profit_by_process (el original
+    lo usaba sin definirlo) y el filtro de rango inclusivo por día.
+    """
+    frames = {name: df.copy() for name, df in sheets.items()}
+    compras_df, proceso_df, almacen_df, ventas_df = (
+        frames[name] for name in ['compras', 'proceso', 'almacen', 'ventas'])
+
+    for df in [compras_df, proceso_df, almacen_df, ventas_df]:
+        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+        for col in df.columns:
+            if col.lower() in ['cantidad', 'precio', 'total', 'preciototal', 'precio_kg']:
+                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    if start_date or end_date:
+        start = pd.Timestamp(start_date) if start_date else pd.Timestamp.min
+        end = pd.Timestamp(end_date) + pd.Timedelta(days=1) if end_date else pd.Timestamp.max
+        proceso_df = proceso_df[(proceso_df['fecha'] >= start) & (proceso_df['fecha'] < end)]
+
+    detailed_results = []
+    for _, proceso_row in proceso_df.iterrows():
+        proceso_id = str(proceso_row['id']).strip() if pd.notna(proceso_row['id']) else ''
+        if not proceso_id:
+            continue
+
+        compra_id = str(proceso_row['compras_ids']).strip() if pd.notna(proceso_row['compras_ids']) else ''
+        proceso_info = {
+            'proceso_id': proceso_id,
+            'fecha_proceso': _fecha(proceso_row['fecha']),
+            'compra_id': compra_id,
+            'tipo_cafe': proceso_row['tipo_cafe'],
+            'cantidad_entrada': float(proceso_row['cantidad']),
+            'costo_compra': 0.0,
+            'ingresos_ventas': 0.0,
+            'ganancia': 0.0,
+            'ventas': [],
+            'detalles': {}
+        }
+
+        if compra_id:
+            compra_matches = compras_df[compras_df['id'].astype(str).str.strip() == compra_id]
+            if not compra_matches.empty:
+                compra_row = compra_matches.iloc[0]
+                proceso_info['costo_compra'] = float(compra_row['total'])
+                proceso_info['detalles']['compra'] = {
+                    'fecha': _fecha(compra_row.get('fecha')),
+                    'tipo_cafe': compra_row.get('tipo_cafe', 'Desconocido'),
+                    'cantidad': float(compra_row.get('cantidad', 0)),
+                    'precio_kg': float(compra_row.get('precio', 0)),
+                    'total': float(compra_row['total'])
+                }
+
+        almacen_asociado = []
+        almacen_matches = almacen_df[almacen_df['proceso_id'].astype(str).str.strip() == proceso_id]
+        for _, almacen_row in almacen_matches.iterrows():
+            almacen_asociado.append({
+                'almacen_id': str(almacen_row['id']).strip() if pd.notna(almacen_row.get('id')) else '',
+                'fecha': _fecha(almacen_row.get('fecha')),
+                'tipo_cafe': almacen_row.get('tipo_cafe', 'Desconocido'),
+                'cantidad': float(almacen_row.get('cantidad', 0))
+            })
+        proceso_info['detalles']['almacen'] = almacen_asociado
+
+        for almacen_item in almacen_asociado:
+            ventas_matches = ventas_df[ventas_df['almacen_id'].astype(str).str.strip() == almacen_item['almacen_id']]
+            for _, venta_row in ventas_matches.iterrows():
+                venta_total = float(venta_row['total'])
+                proceso_info['ingresos_ventas'] += venta_total
+                proceso_info['ventas'].append({
+                    'fecha': _fecha(venta_row.get('fecha')),
+                    'cliente': venta_row.get('cliente', 'Desconocido'),
+                    'tipo_cafe': venta_row.get('tipo_cafe', 'Desconocido'),
+                    'cantidad': float(venta_row.get('cantidad', 0)),
+                    'precio_kg': float(venta_row.get('precio', 0)),
+                    'total': venta_total
+                })
+
+        proceso_info['ganancia'] = proceso_info['ingresos_ventas'] - proceso_info['costo_compra']
+        detailed_results.append(proceso_info)
+
+    return {
+        'procesos': detailed_results,
+        'resumen': {
+            'total_procesos': len(detailed_results),
+            'total_costo': float(sum(p['costo_compra'] for p in detailed_results)),
+            'total_ingresos': float(sum(p['ingresos_ventas'] for p in detailed_results)),
+            'total_ganancia': float(sum(p['ganancia'] for p in detailed_results))
+        }
+    }
+
+@pytest.mark.parametrize('start_date, end_date', [
+    (None, None),
+    ('2024-01-04', '2024-01-06'),
+    ('2024-01-05', None),
+])
+def test_ganancia_detallada_igual_al_recorrido_por_proceso(monkeypatch, start_date, end_date):
+    monkeypatch.setattr(sheets_service, 'lineage_index', LineageIndex())
+    raw = _raw_sheets()
+    sheets = {name: normalize_sheet(df) for name, df in raw.items()}
+
+    with query_session(lambda *names: {name: sheets[name] for name in names}):
+        result = get_detailed_profit_by_process(start_date, end_date)
+
+    assert result == _baseline_detailed_profit(raw, start_date, end_date)
+
+def test_ganancia_detallada_de_un_proceso(monkeypatch):
+    monkeypatch.setattr(sheets_service, 'lineage_index', LineageIndex())
+    sheets = {name: normalize_sheet(df) for name, df in _raw_sheets().items()}
+    with query_session(lambda *names: {name: sheets[name] for name in names}):
+        result = get_detailed_profit_by_process()
+
+    # P1: compra C1 (la primera con ese ID); lotes A1 y A2 con tres ventas
+    p1 = result['procesos'][0]
+    assert p1['costo_compra'] == 1000.0
+    assert [venta['total'] for venta in p1['ventas']] == [140.64, 100.1, 52.5]
+    assert [lote['almacen_id'] for lote in p1['detalles']['almacen']] == ['A1', 'A2']
+    assert result['resumen']['total_procesos'] == 4
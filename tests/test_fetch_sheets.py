@@ -0,0 +1,63 @@
+"""
+Pruebas de la lectura de hojas desde Google Sheets
+"""
+import threading
+
+from server import sheets_service
+from server.sheets_service import fetch_sheets_data
+
+def test_todas_las_hojas_en_una_sola_lectura(monkeypatch):
+    calls = []
+
+    def batch_get(ranges):
+        calls.append(list(ranges))
+        return [
+            [['fecha', 'id', 'total'], ['2024-01-01', 'C1', '10'], ['2024-01-02', 'C2']],
+            [],
+            [['fecha', 'monto'], ['2024-01-03', '5', 'columna de más']]
+        ]
+
+    monkeypatch.setattr(sheets_service, '_batch_get_values', batch_get)
+    frames = fetch_sheets_data(['Compras', 'ventas', 'gastos'])
+
+    assert calls == [['Compras!A:Z', 'Ventas!A:Z', 'Gastos!A:Z']]
+    assert list(frames) == ['compras', 'ventas', 'gastos']
+    # Las filas cortas se completan y las largas se recortan a los encabezados
+    assert frames['compras']['total'].tolist() == [10.0, 0.0]
+    assert frames['ventas'].empty
+    assert frames['gastos'].columns.tolist() == ['fecha', 'monto']
+
+def test_credenciales_por_proceso_y_cliente_por_hilo(monkeypatch):
+    created = {'credentials': 0, 'clients': 0}
+
+    def from_info(info, scopes):
+        created['credentials'] += 1
+        return object()
+
+    def build(*args, **kwargs):
+        created['clients'] += 1
+        return object()
+
+    monkeypatch.setattr(sheets_service, '_credentials', None)
+    monkeypatch.setattr(sheets_service, '_thread_local', threading.local())
+    monkeypatch.setattr(sheets_service.config, 'get_google_credentials_dict', lambda: {'type': 'service_account'})
+    monkeypatch.setattr(sheets_service.service_account.Credentials, 'from_service_account_info', from_info)
+    monkeypatch.setattr(sheets_service, 'AuthorizedHttp', lambda credentials, http: http)
+    monkeypatch.setattr(sheets_service, 'build', build)
+
+    service = sheets_service.get_sheets_service()
+    assert sheets_service.get_sheets_service() is service
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(sheets_service.get_sheets_service()))
+    thread.start()
+    thread.join()
+
+    # Otro hilo construye su propio cliente con las mismas credenciales
+    assert other[0] is not service
+    assert created == {'credentials': 1, 'clients': 2}
+
+    # Tras un fork el hijo no reutiliza el cliente del padre
+    monkeypatch.setattr(sheets_service.os, 'getpid', lambda: -1)
+    assert sheets_service.get_sheets_service() is not service
+    assert created == {'credentials': 1, 'clients': 3}
@@ -0,0 +1,111 @@
+"""
+Pruebas de la serialización y el filtrado por fechas de DataFrames normalizados
+"""
+import json
+import logging
+
+import pandas as pd
+import pytest
+
+from server.frames import DateIndex, filter_by_date_range, frame_to_json, frame_to_records, normalize_sheet
+
+def test_frame_to_json_conserva_decimales_cortos():
+    df = pd.DataFrame({'total': [140.64, 22.905, 0.1]})
+    assert frame_to_json(df) == '[{"total":140.64},{"total":22.905},{"total":0.1}]'
+
+def test_frame_to_json_equivale_a_frame_to_records():
+    df = pd.DataFrame({
+        'tipo_cafe': pd.Categorical(['Arábica', 'Robusta', 'Arábica']),
+        'fecha': [pd.Timestamp('2024-01-05'), pd.NaT, pd.Timestamp('2024-01-07 10:30:00')],
+        'total': [140.64, 0.0, 22.905],
+        'notas': ['Compra con adelanto', None, 'Café "a","b" \\\n'],
+        'id': ['C1', 'C2', 'C3'],
+        'cantidad': [100, 50, 3],
+        'precio': [10.5, float('nan'), 1e-07],
+        'pagado': [True, False, True]
+    })
+    expected = json.loads(json.dumps(frame_to_records(df), sort_keys=True))
+    assert json.loads(frame_to_json(df)) == expected
+    assert list(json.loads(frame_to_json(df))[0]) == sorted(df.columns)
+
+def _ventas(fechas):
+    return pd.DataFrame({'fecha': fechas, 'total': [float(n) for n in range(len(fechas))]})
+
+def _expected(df, start_date, end_date):
+    """Filtro de referencia con comparaciones directas en hora de Lima"""
+    fechas = df['fecha']
+    if fechas.dt.tz is not None:
+        fechas = fechas.dt.tz_convert('America/Lima').dt.tz_localize(None)
+    mask = pd.Series(True, index=df.index)
+    if start_date:
+        mask &= fechas >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= fechas <= pd.Timestamp(end_date) + pd.Timedelta(hours=23, minutes=59, seconds=59)
+    return df[mask]
+
+FECHAS = [
+    pd.Timestamp('2024-03-01 00:00:00'),
+    pd.Timestamp('2024-03-02 08:15:00'),
+    pd.NaT,
+    pd.Timestamp('2024-03-31 23:59:59'),
+    pd.Timestamp('2024-02-29 23:59:59'),
+    pd.Timestamp('2024-04-01 00:00:00'),
+    pd.Timestamp('2024-03-15 12:00:00'),
+]
+
+@pytest.mark.parametrize('start_date, end_date', [
+    ('2024-03-01', '2024-03-31'),
+    ('2024-03-02', '2024-03-02'),
+    ('2024-03-15', None),
+    (None, '2024-02-29'),
+    ('2024-05-01', '2024-05-31'),
+])
+def test_filtro_por_fechas_igual_que_pandas(start_date, end_date):
+    df = _ventas(FECHAS)
+    pd.testing.assert_frame_equal(filter_by_date_range(df, 'fecha', start_date, end_date),
+                                  _expected(df, start_date, end_date))
+
+def test_fechas_con_zona_se_convierten_a_lima():
+    # 2024-04-01 03:00 UTC son las 22:00 del 31 de marzo en Lima (UTC-5)
+    df = _ventas(pd.to_datetime(['2024-03-01 04:59:59', '2024-03-01 05:00:00',
+                                 '2024-04-01 03:00:00', '2024-04-01 05:00:00']).tz_localize('UTC'))
+    result = filter_by_date_range(df, 'fecha', '2024-03-01', '2024-03-31')
+    assert result['total'].tolist() == [1.0, 2.0]
+    pd.testing.assert_frame_equal(result, _expected(df, '2024-03-01', '2024-03-31'))
+
+def test_fechas_ordenadas_devuelven_un_corte():
+    df = _ventas(sorted(fecha for fecha in FECHAS if fecha is not pd.NaT))
+    assert DateIndex(df['fecha']).contiguous
+    result = filter_by_date_range(df, 'fecha', '2024-03-01', '2024-03-31')
+    assert result['total'].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert not DateIndex(_ventas(FECHAS)['fecha']).contiguous
+
+def test_fecha_invalida_no_filtra_ese_limite(caplog):
+    df = _ventas(FECHAS)
+    with caplog.at_level(logging.ERROR, logger='server.frames'):
+        result = filter_by_date_range(df, 'fecha', 'no-es-fecha', '2024-03-02')
+    assert caplog.records
+    pd.testing.assert_frame_equal(result, _expected(df, None, '2024-03-02'))
+
+def test_normalizar_hoja_tipa_las_columnas_conocidas():
+    raw = pd.DataFrame({
+        'Fecha': ['2024-03-01', 45352, 'sin fecha'],
+        'ID': [' C1 ', 'C2', None],
+        'compras_ids': ['C1', ' C2', ''],
+        'Cantidad': ['10.5', '', 'n/a'],
+        'tipo_cafe': ['Geisha', 'Arábica', 'Geisha'],
+        'Notas': ['a', 'b', 'c']
+    })
+    df = normalize_sheet(raw)
+
+    # Las fechas de texto y los números de serie de Sheets quedan como datetime64
+    assert df['Fecha'].tolist()[:2] == [pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-01')]
+    assert pd.isna(df['Fecha'].iloc[2])
+    assert df['ID'].tolist() == ['C1', 'C2', '']
+    assert df['compras_ids'].tolist() == ['C1', 'C2', '']
+    assert df['Cantidad'].dtype == 'float64'
+    assert df['Cantidad'].tolist() == [10.5, 0.0, 0.0]
+    assert isinstance(df['tipo_cafe'].dtype, pd.CategoricalDtype)
+    assert df['Notas'].tolist() == ['a', 'b', 'c']
+    # La hoja leída no se modifica
+    assert raw['Cantidad'].tolist() == ['10.5', '', 'n/a']
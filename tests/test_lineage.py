@@ -0,0 +1,54 @@
+"""
+Pruebas del índice de trazabilidad
+"""
+import pandas as pd
+
+from server.frames import append_rows, normalize_sheet
+from server.lineage import LineageIndex, LineageSnapshot
+
+def _sheets(ventas_rows=2):
+    ventas = pd.DataFrame({
+        'fecha': ['2024-01-10', '2024-01-11', '2024-01-12'][:ventas_rows],
+        'almacen_id': ['A1', 'A1', 'A2'][:ventas_rows],
+        'cantidad': [10, 5, 8][:ventas_rows],
+        'total': [140.64, 70.0, 99.5][:ventas_rows]
+    })
+    return {
+        'compras': normalize_sheet(pd.DataFrame({
+            'fecha': ['2024-01-01', '2024-01-02'], 'id': ['C1', 'C2'],
+            'cantidad': [100, 50], 'precio': [10, 12], 'total': [1000, 600]})),
+        'proceso': normalize_sheet(pd.DataFrame({
+            'fecha': ['2024-01-03', '2024-01-04'], 'id': ['P1', 'P2'], 'compras_ids': ['C1', 'C2']})),
+        'almacen': normalize_sheet(pd.DataFrame({
+            'fecha': ['2024-01-05', '2024-01-06'], 'id': ['A1', 'A2'], 'proceso_id': ['P1', 'P2']})),
+        'ventas': normalize_sheet(ventas)
+    }
+
+def test_extension_incremental_equivale_a_reconstruir():
+    index = LineageIndex()
+    before = index.update(_sheets(ventas_rows=2))
+    assert before.unsold_lots() == ['A2']
+
+    sheets = dict(before.frames)
+    full = _sheets(ventas_rows=3)
+    sheets['ventas'] = append_rows(before.frames['ventas'], full['ventas'].iloc[2:])
+    after = index.update(sheets)
+    rebuilt = LineageSnapshot.build(sheets)
+
+    assert after is index.current
+    for almacen_id in ['A1', 'A2']:
+        assert after.trace(almacen_id) == rebuilt.trace(almacen_id)
+    assert after.unsold_lots() == rebuilt.unsold_lots() == []
+
+def test_los_indices_publicados_no_cambian():
+    index = LineageIndex()
+    before = index.update(_sheets(ventas_rows=2))
+    ventas_before = before.ventas_for_proceso('P2')
+
+    sheets = dict(before.frames)
+    sheets['ventas'] = append_rows(before.frames['ventas'], _sheets(ventas_rows=3)['ventas'].iloc[2:])
+    index.update(sheets)
+
+    assert before.ventas_for_proceso('P2') == ventas_before == []
+    assert before.unsold_lots() == ['A2']
+    assert before.trace('A1')['resumen']['ingresos_ventas'] == 210.64
@@ -0,0 +1,25 @@
+"""
+Pruebas de las fechas por defecto y del precalentamiento
+"""
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from server.prewarm import parse_hot_queries, seconds_until_midnight
+from server.routes import api
+
+LIMA = ZoneInfo('America/Lima')
+
+def test_rango_por_defecto_usa_el_dia_de_lima(monkeypatch):
+    # 02:30 UTC del 1 de abril son las 21:30 del 31 de marzo en Lima
+    now = datetime(2024, 4, 1, 2, 30, tzinfo=ZoneInfo('UTC')).astimezone(LIMA)
+    monkeypatch.setattr(api, 'local_now', lambda: now)
+    assert api._default_range(None, None, 'month') == ('2024-03-01', '2024-03-31')
+    assert api._default_range(None, None, '7d') == ('2024-03-24', '2024-03-31')
+    assert api._default_range('2024-01-01', None, 'month') == ('2024-01-01', '2024-03-31')
+
+def test_medianoche_en_hora_de_lima():
+    assert seconds_until_midnight(datetime(2024, 3, 31, 21, 30, tzinfo=LIMA)) == 2.5 * 3600
+
+def test_parse_hot_queries():
+    assert parse_hot_queries(' summary, daily:7d ,,coffee-types') == [
+        ('summary', None), ('daily', '7d'), ('coffee-types', None)]
@@ -0,0 +1,40 @@
+"""
+Pruebas de la ganancia por proceso
+"""
+import numpy as np
+import pandas as pd
+
+from server.frames import sequential_sum
+from server.query_session import query_session
+from server.sheets_service import calculate_profit_by_process
+
+from tests.test_lineage import _sheets
+
+def test_ganancia_por_proceso_con_las_hojas_de_la_sesion():
+    sheets = _sheets(ventas_rows=3)
+    with query_session(lambda *names: {name: sheets[name] for name in names}):
+        result = calculate_profit_by_process()
+
+    # Compras C1 y C2 procesadas; las tres ventas son de lotes de almacén
+    assert result == {
+        'costo_compras': 1600.0,
+        'ingresos_ventas': 0.0 + 140.64 + 70.0 + 99.5,
+        'ganancia_real': (0.0 + 140.64 + 70.0 + 99.5) - 1600.0
+    }
+
+def test_ganancia_por_proceso_filtrada_por_fecha():
+    sheets = _sheets(ventas_rows=3)
+    with query_session(lambda *names: {name: sheets[name] for name in names}):
+        result = calculate_profit_by_process('2024-01-02', '2024-01-11')
+
+    # De las compras procesadas solo C2 está en el rango; ventas del 10 y 11
+    assert result['costo_compras'] == 600.0
+    assert result['ingresos_ventas'] == 0.0 + 140.64 + 70.0
+
+def test_la_suma_es_identica_a_acumular_en_orden():
+    values = np.random.default_rng(3).integers(100, 1_500_000, 20_000) / 100
+    expected = 0.0
+    for value in values.tolist():
+        expected += value
+    assert sequential_sum(pd.Series(values)) == expected
+    assert sequential_sum(pd.Series([], dtype='float64')) == 0.0
@@ -0,0 +1,74 @@
+"""
+Pruebas de las sesiones de consulta
+"""
+import contextvars
+
+from server import sheets_service
+from server.frames import append_rows
+from server.lineage import LINEAGE_SHEETS, LineageIndex
+from server.query_session import query_session
+from server.rollups import DailyRollup, ROLLUP_SHEETS, RollupSnapshot
+
+from tests.test_lineage import _sheets
+from tests.test_rollups import _sheets as _rollup_sheets
+
+def test_la_sesion_lee_cada_hoja_una_vez():
+    reads = []
+    sheets = _sheets()
+
+    def reader(*names):
+        reads.append(names)
+        return {name: sheets[name] for name in names}
+
+    with query_session(reader) as session:
+        session.sheets('compras', 'ventas')
+        with query_session(reader) as nested:
+            assert nested is session
+            nested.sheets('ventas', 'proceso')
+    assert reads == [('compras', 'ventas'), ('proceso',)]
+
+def test_el_indice_de_la_sesion_corresponde_a_su_instantanea():
+    index = LineageIndex()
+    first = _sheets(ventas_rows=2)
+    newer = dict(first)
+    newer['ventas'] = append_rows(first['ventas'], _sheets(ventas_rows=3)['ventas'].iloc[2:])
+
+    def build(session):
+        return index.update(session.sheets(*LINEAGE_SHEETS))
+
+    with query_session(lambda *names: {name: first[name] for name in names}) as session:
+        lineage = session.derived('lineage', build)
+        # Otra petición sincroniza el índice con una instantánea posterior
+        index.update(newer)
+        assert session.derived('lineage', build) is lineage
+        assert lineage.matches(session.sheets(*LINEAGE_SHEETS))
+        assert lineage.unsold_lots() == ['A2']
+    assert index.current.unsold_lots() == []
+
+def test_los_agregados_de_la_sesion_corresponden_a_su_instantanea(monkeypatch):
+    monkeypatch.setattr(sheets_service, 'daily_rollup', DailyRollup())
+    first = _rollup_sheets()
+    second = _rollup_sheets(seed=11)
+
+    def reader(sheets):
+        return lambda *names: {name: sheets[name] for name in names}
+
+    def rollup_in_new_session(sheets):
+        # Otra petición: un contexto sin sesión activa
+        def run():
+            with query_session(reader(sheets)):
+                rollup = sheets_service.get_daily_rollup()
+                return rollup, rollup.totals('2024-01-15', '2024-02-10')
+        return contextvars.Context().run(run)
+
+    with query_session(reader(first)):
+        rollup = sheets_service.get_daily_rollup()
+        other, other_totals = rollup_in_new_session(second)
+        totals = rollup.totals('2024-01-15', '2024-02-10')
+        assert sheets_service.get_daily_rollup() is rollup
+        assert rollup.matches(first) and other.matches(second)
+
+    assert totals == RollupSnapshot.build(first).totals('2024-01-15', '2024-02-10')
+    assert other_totals == RollupSnapshot.build(second).totals('2024-01-15', '2024-02-10')
+    assert totals != other_totals
+    assert set(ROLLUP_SHEETS) <= set(first)
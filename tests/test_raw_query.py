@@ -0,0 +1,164 @@
+"""
+Pruebas de las consultas sobre los datos crudos (/api/raw)
+"""
+import gzip
+import io
+import json
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+from server.compression import compress_response
+from server.config import get_config
+from server.frames import frame_to_records, normalize_sheet
+from server.json_provider import FastJSONProvider
+from server.raw_query import RawQueryError, apply_raw_query, iter_csv, iter_ndjson
+from server.routes import api
+
+def _ventas():
+    return normalize_sheet(pd.DataFrame({
+        'fecha': ['2024-03-01 09:00:00', '2024-03-02 10:30:00', '2024-03-03 08:15:00',
+                  '2024-03-04 17:45:00', '2024-03-05 12:00:00'],
+        'almacen_id': ['A1', 'A2', 'A1', 'A3', 'A2'],
+        'tipo_cafe': ['Arábica', 'Geisha', 'arábica ', 'Robusta', 'Geisha'],
+        'cantidad': [10, 5, 8, 3, 12],
+        'total': [140.64, 70.0, 99.5, 30.25, 180.0]
+    }))
+
+@pytest.fixture
+def client(monkeypatch):
+    """Cliente de una aplicación con solo la API y la hoja de ventas simulada"""
+    monkeypatch.setattr(api, 'data_fingerprint', lambda: None)
+    monkeypatch.setattr(api, 'get_ventas_data', _ventas)
+
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_object(get_config())
+    app.register_blueprint(api.api_bp, url_prefix='/api')
+    return app.test_client()
+
+def test_sin_parametros_devuelve_todas_las_filas():
+    page, total = apply_raw_query(_ventas(), {})
+    assert total == 5
+    pd.testing.assert_frame_equal(page, _ventas())
+
+@pytest.mark.parametrize('offset, limit, expected', [
+    ('0', '2', [140.64, 70.0]),
+    ('3', '10', [30.25, 180.0]),
+    ('5', '2', []),
+    ('8', None, []),
+    (None, '0', []),
+    ('2', None, [99.5, 30.25, 180.0]),
+])
+def test_limit_y_offset(offset, limit, expected):
+    args = {name: value for name, value in (('offset', offset), ('limit', limit)) if value is not None}
+    page, total = apply_raw_query(_ventas(), args)
+    assert page['total'].tolist() == expected
+    assert total == 5
+
+@pytest.mark.parametrize('args', [
+    {'limit': 'diez'},
+    {'offset': '-1'},
+    {'sort': 'precio'},
+    {'fields': 'fecha,precio'},
+])
+def test_parametros_no_validos(args):
+    with pytest.raises(RawQueryError):
+        apply_raw_query(_ventas(), args)
+
+def test_orden_ascendente_y_descendente():
+    page, _ = apply_raw_query(_ventas(), {'sort': 'almacen_id,-total'})
+    assert page['total'].tolist() == [140.64, 99.5, 180.0, 70.0, 30.25]
+    page, _ = apply_raw_query(_ventas(), {'sort': '-Cantidad'})
+    assert page['cantidad'].tolist() == [12, 10, 8, 5, 3]
+
+def test_proyeccion_de_columnas():
+    page, total = apply_raw_query(_ventas(), {'fields': 'total, FECHA', 'limit': '1'})
+    assert list(page.columns) == ['total', 'fecha']
+    assert total == 5
+
+def test_filtros_de_fecha_y_tipo_de_cafe():
+    page, total = apply_raw_query(_ventas(), {'start_date': '2024-03-02', 'end_date': '2024-03-04'})
+    assert page['total'].tolist() == [70.0, 99.5, 30.25]
+    assert total == 3
+
+    page, total = apply_raw_query(_ventas(), {'tipo_cafe': 'ARÁBICA,robusta', 'end_date': '2024-03-03'})
+    assert page['total'].tolist() == [140.64, 99.5]
+    assert total == 2
+
+def test_respuesta_con_total_y_pagina_siguiente(client):
+    response = client.get('/api/raw/ventas?sort=-total&limit=2&fields=total')
+    assert response.status_code == 200
+    assert response.get_json() == [{'total': 180.0}, {'total': 140.64}]
+    assert response.headers['X-Total-Count'] == '5'
+    link = response.headers['Link']
+    assert link.endswith('>; rel="next"')
+    assert 'offset=2' in link and 'limit=2' in link and 'sort=-total' in link
+
+    last = client.get('/api/raw/ventas?sort=-total&limit=2&offset=4&fields=total')
+    assert last.get_json() == [{'total': 30.25}]
+    assert last.headers['X-Total-Count'] == '5'
+    assert 'Link' not in last.headers
+
+def test_sin_limit_no_hay_pagina_siguiente(client):
+    response = client.get('/api/raw/ventas?start_date=2024-03-04')
+    assert [row['total'] for row in response.get_json()] == [30.25, 180.0]
+    assert response.headers['X-Total-Count'] == '2'
+    assert 'Link' not in response.headers
+
+@pytest.mark.parametrize('query', ['limit=-5', 'offset=x', 'sort=precio', 'fields=nada', 'format=xml'])
+def test_parametros_no_validos_responden_400(client, query):
+    response = client.get(f'/api/raw/ventas?{query}')
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['message'] == 'Parámetros no válidos para los datos de ventas'
+    assert body['error']
+
+def test_ndjson_un_registro_por_linea():
+    chunks = list(iter_ndjson(_ventas(), json.dumps, chunk_rows=2))
+    assert len(chunks) == 3
+    assert all(chunk.endswith('\n') for chunk in chunks)
+    lines = ''.join(chunks).splitlines()
+    assert [json.loads(line) for line in lines] == frame_to_records(_ventas())
+    assert list(iter_ndjson(_ventas().iloc[:0], json.dumps)) == []
+
+def test_csv_con_cabecera_y_valores_escapados():
+    df = pd.DataFrame({
+        'fecha': [pd.Timestamp('2024-03-01 09:00:00'), pd.NaT],
+        'nota': ['Pago, "adelanto"', None],
+        'total': [140.64, 70.0]
+    })
+    chunks = list(iter_csv(df, chunk_rows=1))
+    assert chunks[0] == 'fecha,nota,total\n'
+    assert ''.join(chunks[1:]) == '2024-03-01 09:00:00,"Pago, ""adelanto""",140.64\n,,70.0\n'
+    assert pd.read_csv(io.StringIO(''.join(chunks)))['nota'].tolist()[0] == 'Pago, "adelanto"'
+
+@pytest.mark.parametrize('export_format, mimetype', [('ndjson', 'application/x-ndjson'), ('csv', 'text/csv')])
+def test_exportacion_por_streaming_sin_cache_ni_compresion_completa(client, export_format, mimetype):
+    app = client.application
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, min_size=0)
+
+    stats = api.response_cache.stats()
+    response = client.get(f'/api/raw/ventas?format={export_format}&sort=total',
+                          headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    # Se envía por bloques: sin Content-Length y comprimido bloque a bloque
+    assert response.is_streamed
+    assert 'Content-Length' not in response.headers
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['X-Total-Count'] == '5'
+    body = gzip.decompress(b''.join(response.iter_encoded())).decode('utf-8')
+    response.close()
+
+    if export_format == 'ndjson':
+        assert [json.loads(line)['total'] for line in body.splitlines()] == [30.25, 70.0, 99.5, 140.64, 180.0]
+    else:
+        assert body.splitlines()[0] == 'fecha,almacen_id,tipo_cafe,cantidad,total'
+        assert response.headers['Content-Disposition'] == 'attachment; filename=ventas.csv'
+    # Las exportaciones no pasan por la caché de respuestas
+    assert api.response_cache.stats() == stats
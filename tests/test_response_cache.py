@@ -0,0 +1,35 @@
+"""
+Pruebas de la caché de respuestas serializadas
+"""
+from server.response_cache import ResponseCache
+
+def test_guarda_las_codificaciones_junto_al_cuerpo():
+    cache = ResponseCache()
+    cache.put(('summary',), 1, b'{}')
+    assert cache.get_encoded(('summary',), 1, 'gzip') is None
+
+    cache.put_encoded(('summary',), 1, 'gzip', b'gz')
+    assert cache.get(('summary',), 1) == b'{}'
+    assert cache.get_encoded(('summary',), 1, 'gzip') == b'gz'
+    assert cache.get_encoded(('summary',), 1, 'br') is None
+
+def test_una_version_nueva_descarta_las_codificaciones():
+    cache = ResponseCache()
+    cache.put(('summary',), 1, b'{}')
+    cache.put_encoded(('summary',), 1, 'gzip', b'gz')
+
+    # Una codificación calculada con datos viejos no se guarda
+    assert cache.get(('summary',), 2) is None
+    cache.put(('summary',), 2, b'[]')
+    cache.put_encoded(('summary',), 1, 'gzip', b'old')
+    assert cache.get_encoded(('summary',), 2, 'gzip') is None
+
+def test_lru_expulsa_la_entrada_menos_usada():
+    cache = ResponseCache(max_entries=2)
+    cache.put(('a',), 1, b'a')
+    cache.put(('b',), 1, b'b')
+    cache.get(('a',), 1)
+    cache.put(('c',), 1, b'c')
+    assert cache.get(('b',), 1) is None
+    assert cache.get(('a',), 1) == b'a'
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,128 @@
+"""
+Pruebas de los agregados diarios y sus sumas acumuladas
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from server.frames import append_rows, normalize_sheet
+from server.rollups import DailyRollup, ROLLUP_SHEETS, RollupSnapshot
+
+def _sheets(rows=300, seed=7):
+    rng = np.random.default_rng(seed)
+
+    def fechas(n):
+        days = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 90, n), unit='D')
+        hours = pd.to_timedelta(rng.integers(0, 24 * 60, n), unit='min')
+        values = (days + hours).strftime('%Y-%m-%d %H:%M:%S').tolist()
+        values[0] = ''   # fila sin fecha
+        return values
+
+    return {
+        'compras': normalize_sheet(pd.DataFrame({
+            'fecha': fechas(rows), 'id': [f'C{i}' for i in range(rows)],
+            'cantidad': rng.integers(1, 100, rows), 'total': rng.integers(10, 1000, rows) / 4,
+            'notas': rng.choice(['Compra con adelanto', ''], rows)})),
+        'ventas': normalize_sheet(pd.DataFrame({
+            'fecha': fechas(rows), 'cantidad': rng.integers(1, 50, rows),
+            'total': rng.integers(10, 1000, rows) / 4})),
+        'gastos': normalize_sheet(pd.DataFrame({
+            'fecha': fechas(rows // 2), 'monto': rng.integers(1, 300, rows // 2) / 2,
+            'descripcion': rng.choice(['Pago EFECTIVO', 'TRANSFERENCIA banco', 'otro'], rows // 2)})),
+        'proceso': normalize_sheet(pd.DataFrame({
+            'fecha': fechas(rows // 2), 'id': [f'P{i}' for i in range(rows // 2)],
+            'compras_ids': [f'C{i}' for i in range(rows // 2)], 'total': rng.integers(10, 1000, rows // 2) / 4,
+            'notas': rng.choice(['Compra con adelanto', ''], rows // 2)})),
+        'almacen': normalize_sheet(pd.DataFrame({
+            'fecha': fechas(rows // 3), 'id': [f'A{i}' for i in range(rows // 3)]}))
+    }
+
+def _plain_totals(sheets, start_date, end_date):
+    """Filtro y suma directos con pandas, sin agregados"""
+    def filtered(df):
+        mask = df['fecha'].notna()
+        if start_date:
+            mask &= df['fecha'] >= pd.Timestamp(start_date)
+        if end_date:
+            mask &= df['fecha'] <= pd.Timestamp(end_date) + pd.Timedelta(hours=23, minutes=59, seconds=59)
+        return df[mask] if (start_date or end_date) else df
+
+    compras, ventas, gastos = filtered(sheets['compras']), filtered(sheets['ventas']), filtered(sheets['gastos'])
+    proceso = filtered(sheets['proceso'])
+    adelanto = proceso['notas'].str.contains('Compra con adelanto')
+    return {
+        'kg_comprados': compras['cantidad'].sum(),
+        'kg_vendidos': ventas['cantidad'].sum(),
+        'ingresos': ventas['total'].sum(),
+        'gastos': gastos['monto'].sum(),
+        'efectivo': gastos.loc[gastos['descripcion'].str.contains('EFECTIVO'), 'monto'].sum(),
+        'con_adelantos': proceso.loc[adelanto, 'total'].sum(),
+        'sin_adelantos': proceso.loc[~adelanto, 'total'].sum(),
+        'ops_compras': len(compras),
+        'ops_ventas': len(ventas),
+        'ops_almacen': len(filtered(sheets['almacen']))
+    }
+
+RANGES = [
+    (None, None),
+    ('2024-01-15', '2024-02-10'),
+    ('2024-02-01', None),
+    (None, '2024-01-31'),
+    ('2024-03-05', '2024-03-05'),
+    ('2025-01-01', '2025-02-01')
+]
+
+@pytest.mark.parametrize('start_date,end_date', RANGES)
+def test_totales_de_rango_igual_que_filtrar_y_sumar(start_date, end_date, caplog):
+    sheets = _sheets()
+    rollup = DailyRollup().update(sheets)
+
+    # Los rangos de días completos se resuelven con las sumas acumuladas, sin errores
+    assert rollup.prefix.totals(start_date, end_date) is not None
+    totals = rollup.totals(start_date, end_date)
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+
+    for name, value in _plain_totals(sheets, start_date, end_date).items():
+        assert totals[name] == pytest.approx(value), name
+
+def test_agregados_incrementales_igual_que_recalcular():
+    sheets = _sheets()
+    extra = _sheets(rows=30, seed=11)
+    incremental = DailyRollup()
+    incremental.update({name: df.iloc[:len(df) - 10] for name, df in sheets.items()})
+    grown = {name: append_rows(df.iloc[:len(df) - 10], df.iloc[len(df) - 10:]) for name, df in sheets.items()}
+    grown['ventas'] = append_rows(grown['ventas'], extra['ventas'])
+    incremental = incremental.update(grown)
+
+    full = RollupSnapshot.build(grown)
+    for start_date, end_date in RANGES:
+        assert incremental.totals(start_date, end_date) == pytest.approx(full.totals(start_date, end_date))
+    assert set(ROLLUP_SHEETS) <= set(grown)
+
+def test_los_agregados_publicados_solo_avanzan():
+    rollup = DailyRollup()
+    older = {name: df.iloc[:len(df) - 10] for name, df in _sheets().items()}
+    newer = {name: append_rows(df, _sheets()[name].iloc[len(df):]) for name, df in older.items()}
+    rollup.observe(older)
+    published = rollup.update(older)
+    assert rollup.current is published
+
+    rollup.observe(newer)
+    latest = rollup.update(newer)
+    before = latest.totals()
+    assert rollup.current is latest
+
+    # Una petición que aún usa la instantánea anterior no hace retroceder los compartidos
+    stale = rollup.update(older)
+    assert stale.matches(older)
+    assert stale.totals() == pytest.approx(published.totals())
+    assert rollup.current is latest
+    assert latest.totals() == before
+
+def test_fecha_invalida_solo_ignora_ese_limite():
+    sheets = _sheets()
+    totals = DailyRollup().update(sheets).totals('no-es-fecha', '2024-01-31')
+    for name, value in _plain_totals(sheets, None, '2024-01-31').items():
+        assert totals[name] == pytest.approx(value), name
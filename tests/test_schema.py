@@ -0,0 +1,65 @@
+"""
+Pruebas del registro de esquemas de las hojas
+"""
+import logging
+
+import pandas as pd
+
+from server.schema import resolve_schema, validate_schemas
+
+def test_se_elige_el_nombre_con_mas_prioridad():
+    # 'id' tiene prioridad sobre 'codigo' aunque aparezca después en la hoja
+    df = pd.DataFrame(columns=['Codigo', 'Fecha', 'ID', 'PrecioTotal', 'Total', 'Observaciones', 'Notas'])
+    schema = resolve_schema('compras', df)
+
+    assert schema['id'] == 'ID'
+    assert schema['fecha'] == 'Fecha'
+    assert schema['total'] == 'Total'
+    assert schema['nota'] == 'Notas'
+    assert schema['cantidad'] is None
+    assert schema.missing == []
+
+def test_las_referencias_usan_la_primera_columna_que_coincide():
+    df = pd.DataFrame(columns=['fecha', 'id', 'Compras_IDs', 'compras_id_extra'])
+    schema = resolve_schema('proceso', df)
+
+    assert schema['compra_ref'] == 'Compras_IDs'
+    assert schema['id'] == 'id'
+
+def test_campos_obligatorios_faltantes(caplog):
+    df = pd.DataFrame(columns=['fecha', 'cliente', 'importe'])
+    with caplog.at_level(logging.WARNING, logger='server.schema'):
+        schema = resolve_schema('ventas', df)
+        again = resolve_schema('ventas', df.copy())
+
+    assert again is schema
+    assert schema.missing == ['almacen_ref', 'total']
+    assert schema.errors() == [
+        "falta 'almacen_ref' (se acepta una columna que contenga 'almacen' y 'id')",
+        "falta 'total' (se acepta total, precio_total)"
+    ]
+    # El aviso sale una sola vez por combinación de encabezados
+    warnings = [record.getMessage() for record in caplog.records]
+    assert len(warnings) == 1
+    assert 'Encabezados incompletos en la hoja ventas' in warnings[0]
+    assert "'importe'" in warnings[0]
+
+def test_hoja_vacia_no_avisa(caplog):
+    with caplog.at_level(logging.WARNING, logger='server.schema'):
+        schema = resolve_schema('gastos', pd.DataFrame())
+
+    assert schema.missing == ['fecha', 'monto']
+    assert caplog.records == []
+
+def test_validar_al_cargar_deja_el_esquema_resuelto(caplog):
+    frames = {
+        'gastos': pd.DataFrame(columns=['Fecha', 'Monto', 'Descripcion', 'Categoria']),
+        'almacen': pd.DataFrame(columns=['fecha', 'lote', 'proceso_ref'])
+    }
+    with caplog.at_level(logging.WARNING, logger='server.schema'):
+        validate_schemas(frames)
+
+    assert resolve_schema('gastos', frames['gastos'])['descripcion'] == 'Descripcion'
+    assert resolve_schema('almacen', frames['almacen']).missing == ['id', 'proceso_ref']
+    assert [record.getMessage() for record in caplog.records if 'almacen' in record.getMessage()]
+    assert not [record.getMessage() for record in caplog.records if 'gastos' in record.getMessage()]
@@ -0,0 +1,72 @@
+"""
+Pruebas de la sincronización incremental de hojas
+"""
+import re
+
+import pandas as pd
+import pytest
+
+from server.sheet_sync import IncrementalSheetLoader
+from server.sheets_service import _values_to_sheet_frame
+
+HEADER = ['fecha', 'id', 'tipo_cafe', 'cantidad', 'total']
+
+class _Spreadsheet:
+    """Hoja de cálculo en memoria que responde a rangos A1 como batchGet"""
+
+    def __init__(self, rows):
+        self.sheets = {'Ventas': [list(HEADER)] + [list(row) for row in rows]}
+        self.requests = []
+
+    def batch_get(self, ranges):
+        self.requests.append(list(ranges))
+        values = []
+        for spec in ranges:
+            sheet, _, cells = spec.partition('!')
+            rows = self.sheets[sheet]
+            match = re.fullmatch(r'A(\d+):Z(\d*)', cells)
+            if cells == 'A:Z':
+                values.append([list(row) for row in rows])
+            else:
+                start = int(match.group(1)) - 1
+                end = int(match.group(2)) if match.group(2) else len(rows)
+                values.append([list(row) for row in rows[start:end]])
+        return values
+
+def _row(day, number, tipo='Arábica'):
+    return [f'2024-03-{day:02d}', f'V{number:03d}', tipo, '1.5', f'{140.64 + number:.2f}']
+
+@pytest.fixture
+def spreadsheet():
+    return _Spreadsheet([_row(1 + n % 28, n) for n in range(30)])
+
+@pytest.fixture
+def loader(spreadsheet):
+    return IncrementalSheetLoader(spreadsheet.batch_get, _values_to_sheet_frame,
+                                  {'ventas': 'Ventas'}, tail_rows=5)
+
+def _full_reload(spreadsheet):
+    return _values_to_sheet_frame(spreadsheet.sheets['Ventas'])
+
+def test_filas_nuevas_igual_que_una_lectura_completa(spreadsheet, loader):
+    loader(['ventas'])
+    spreadsheet.sheets['Ventas'].extend([_row(29, 30, 'Geisha'), _row(30, 31)])
+
+    frame = loader(['ventas'])['ventas']
+    # Solo se pidieron la cabecera y las últimas filas
+    assert spreadsheet.requests[-1] == ['Ventas!A1:Z1', 'Ventas!A27:Z']
+    assert loader.stats()['rows_appended'] == 2
+    pd.testing.assert_frame_equal(frame, _full_reload(spreadsheet))
+
+def test_sin_filas_nuevas_devuelve_el_mismo_dataframe(spreadsheet, loader):
+    first = loader(['ventas'])['ventas']
+    assert loader(['ventas'])['ventas'] is first
+
+def test_edicion_de_filas_conocidas_relee_la_hoja(spreadsheet, loader):
+    loader(['ventas'])
+    spreadsheet.sheets['Ventas'][-2][4] = '999.99'
+    spreadsheet.sheets['Ventas'].append(_row(30, 30))
+
+    frame = loader(['ventas'])['ventas']
+    assert loader.stats()['reconciles'] == 1
+    pd.testing.assert_frame_equal(frame, _full_reload(spreadsheet))
@@ -0,0 +1,145 @@
+"""
+Pruebas de la caché de instantáneas de las hojas
+"""
+import threading
+import time
+
+import pytest
+
+from server import snapshot_cache
+from server.snapshot_cache import SheetSnapshotCache
+
+class _Clock:
+    """Reloj monotónico controlado por la prueba"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class _Loader:
+    """Loader que devuelve la versión actual de cada hoja y cuenta las lecturas"""
+
+    def __init__(self):
+        self.version = 1
+        self.calls = []
+        self.error = None
+
+    def __call__(self, keys):
+        self.calls.append(list(keys))
+        if self.error is not None:
+            raise self.error
+        return {key: f'{key}-v{self.version}' for key in keys}
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(snapshot_cache.time, 'monotonic', clock)
+    return clock
+
+def test_instantanea_fresca_no_vuelve_a_leer(clock):
+    loader = _Loader()
+    cache = SheetSnapshotCache(loader, ttl=60, max_stale=900)
+
+    assert cache.get('Compras') == 'compras-v1'
+    loader.version = 2
+    clock.now += 59
+    assert cache.get('compras') == 'compras-v1'
+    assert loader.calls == [['compras']]
+    assert cache.stats()['hits'] == 1
+
+def test_instantanea_vencida_se_sirve_y_se_refresca_en_segundo_plano(clock):
+    loader = _Loader()
+    cache = SheetSnapshotCache(loader, ttl=60, max_stale=900)
+    cache.get('compras')
+    # Los listeners se llaman después de guardar la instantánea nueva
+    refreshed = threading.Event()
+    cache.add_listener(lambda frames: refreshed.set())
+
+    loader.version = 2
+    clock.now += 61
+    assert cache.get('compras') == 'compras-v1'
+    assert refreshed.wait(5)
+    assert cache.get('compras') == 'compras-v2'
+    assert cache.stats()['stale_hits'] == 1
+
+def test_instantanea_demasiado_vieja_se_lee_de_forma_sincrona(clock):
+    loader = _Loader()
+    cache = SheetSnapshotCache(loader, ttl=60, max_stale=900)
+    cache.get('compras')
+
+    loader.version = 2
+    clock.now += 901
+    assert cache.get('compras') == 'compras-v2'
+    assert cache.stats()['misses'] == 2
+
+def test_si_falla_la_lectura_se_sirve_la_instantanea_anterior(clock):
+    loader = _Loader()
+    cache = SheetSnapshotCache(loader, ttl=60, max_stale=900)
+    cache.get('compras')
+
+    loader.error = RuntimeError('cuota agotada')
+    clock.now += 901
+    assert cache.get('compras') == 'compras-v1'
+    assert cache.stats()['stale_if_error'] == 1
+
+    # Sin instantánea previa el error se propaga
+    with pytest.raises(RuntimeError):
+        cache.get('ventas')
+
+class _BlockingLoader(_Loader):
+    """Loader que no termina hasta que la prueba lo libera"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, keys):
+        self.started.set()
+        self.release.wait(5)
+        return super().__call__(keys)
+
+def _concurrent_gets(cache, loader, count):
+    """Lanza `count` lecturas concurrentes de compras y devuelve sus resultados"""
+    results, errors = [], []
+
+    def read():
+        try:
+            results.append(cache.get('compras'))
+        except Exception as e:
+            errors.append(e)
+
+    first = threading.Thread(target=read)
+    first.start()
+    assert loader.started.wait(5)
+    others = [threading.Thread(target=read) for _ in range(count - 1)]
+    for thread in others:
+        thread.start()
+    # Esperar a que todas las peticiones estén esperando la lectura en curso
+    while cache.stats()['coalesced'] < count - 1:
+        time.sleep(0.01)
+    loader.release.set()
+    for thread in [first] + others:
+        thread.join(5)
+    return results, errors
+
+def test_lecturas_concurrentes_comparten_una_sola_llamada(clock):
+    loader = _BlockingLoader()
+    cache = SheetSnapshotCache(loader, ttl=60, max_stale=900)
+
+    results, errors = _concurrent_gets(cache, loader, 8)
+    assert errors == []
+    assert results == ['compras-v1'] * 8
+    assert loader.calls == [['compras']]
+
+def test_el_error_de_la_lectura_compartida_llega_a_todos(clock):
+    loader = _BlockingLoader()
+    loader.error = RuntimeError('cuota agotada')
+    cache = SheetSnapshotCache(loader, ttl=60, max_stale=900)
+
+    results, errors = _concurrent_gets(cache, loader, 4)
+    assert results == []
+    assert len(errors) == 4
+    assert len(loader.calls) == 1
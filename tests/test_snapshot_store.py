@@ -0,0 +1,76 @@
+"""
+Pruebas de las instantáneas en disco
+"""
+import threading
+
+import pandas as pd
+
+from server.frames import frame_fingerprint, normalize_sheet
+from server.snapshot_store import SnapshotStore, SnapshotWriter
+
+class _SlowStore:
+    """Almacén que bloquea cada escritura hasta que se libera"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.saved = []
+
+    def save(self, key, df, metadata=None):
+        self.release.wait(5)
+        self.saved.append((key, df))
+
+def test_submit_no_espera_a_la_escritura():
+    store = _SlowStore()
+    writer = SnapshotWriter(store)
+    first, second = pd.DataFrame({'a': [1]}), pd.DataFrame({'a': [2]})
+
+    writer.submit('compras', first)
+    writer.submit('compras', second)
+    assert not writer.flush(timeout=0.1)
+
+    store.release.set()
+    assert writer.flush(timeout=5)
+    # La escritura bloqueada pudo tomar la primera; la última siempre se escribe
+    assert store.saved[-1] == ('compras', second)
+    assert len(store.saved) <= 2
+
+def test_no_reescribe_lo_restaurado():
+    store = _SlowStore()
+    store.release.set()
+    writer = SnapshotWriter(store)
+    df = pd.DataFrame({'a': [1]})
+    writer.mark_saved('ventas', df)
+    writer.submit('ventas', df)
+    assert writer.flush(timeout=5)
+    assert store.saved == []
+
+def test_escribe_y_lee_desde_disco(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    if not store.available:
+        return
+    writer = SnapshotWriter(store)
+    df = pd.DataFrame({'fecha': pd.to_datetime(['2024-01-01']), 'total': [140.64], 'id': ['C1']})
+    writer.submit('compras', df, {'sync': None})
+    assert writer.flush(timeout=5)
+
+    loaded, metadata, age = store.load('compras')
+    pd.testing.assert_frame_equal(loaded, df, check_dtype=False)
+    assert metadata == {'sync': None}
+
+def test_columnas_con_tipos_mezclados_se_recuperan_igual(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    if not store.available:
+        return
+    df = normalize_sheet(pd.DataFrame({
+        'fecha': ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04'],
+        'total': [140.64, 70, '', 'x'],
+        'notas': ['Compra con adelanto', 5, 2.5, None],
+        'pagado': [True, 'no', False, ''],
+        'cliente': ['Ana', 'Luis', 'Ana', 'Eva']
+    }))
+    store.save('compras', df)
+
+    loaded, _, _ = store.load('compras')
+    pd.testing.assert_frame_equal(loaded, df)
+    assert loaded['notas'].tolist() == ['Compra con adelanto', 5, 2.5, None]
+    assert frame_fingerprint(loaded) == frame_fingerprint(df)
@@ -0,0 +1,152 @@
+"""
+Pruebas de los resúmenes diarios frente al cálculo día por día original
+"""
+import pandas as pd
+import pytest
+
+from server import sheets_service
+from server.frames import normalize_sheet
+from server.query_session import query_session
+from server.rollups import DailyRollup
+from server.sheets_service import get_daily_summaries
+
+def _raw_sheets():
+    # Valores tal como llegan de Google Sheets: texto, importes en blanco y notas variadas
+    return {
+        'compras': pd.DataFrame({
+            'fecha': ['2024-03-01', '2024-03-01', '2024-03-03', '2024-03-05'],
+            'id': ['C1', 'C2', 'C3', 'C4'],
+            'tipo_cafe': ['Arábica', 'Geisha', 'Arábica', 'Bourbon'],
+            'cantidad': ['100', '50.5', '', '20'],
+            'precio': ['10', '12', '11', '15'],
+            'total': ['1000', '606', '0', '300']}),
+        'ventas': pd.DataFrame({
+            'fecha': ['2024-03-02', '2024-03-02', '2024-03-05', '2024-03-07'],
+            'cliente': ['Ana', 'Luis', 'Ana', 'Eva'],
+            'cantidad': ['10', '5', '8.25', ''],
+            'total': ['140.64', '70.1', '99.5', '33.3']}),
+        'gastos': pd.DataFrame({
+            'fecha': ['2024-03-01', '2024-03-02', '2024-03-02', '2024-03-04', '2024-03-07'],
+            'descripcion': ['Flete EFECTIVO', 'transferencia bancaria', 'Luz', 'pago efectivo', ''],
+            'monto': ['15.5', '200', '48.2', '', '12']}),
+        'proceso': pd.DataFrame({
+            'fecha': ['2024-03-01', '2024-03-03', '2024-03-03', '2024-03-06'],
+            'id': ['P1', 'P2', 'P3', 'P4'],
+            'compras_ids': ['C1', 'C2', 'C3', 'C4'],
+            'total': ['1000', '606', '120.75', '300'],
+            'notas': ['', 'Compra con ADELANTO de cliente', 'sin nota', 'compra con adelanto']}),
+        'almacen': pd.DataFrame({
+            'fecha': ['2024-03-04', '2024-03-06'],
+            'id': ['A1', 'A2'],
+            'proceso_id': ['P1', 'P2'],
+            'cantidad': ['80', '40']})
+    }
+
+def _baseline_daily_summaries(sheets, start_date=None, end_date=None):
+    """
+    Cálculo original de get_daily_summaries: máscaras por día sobre cada hoja
+
+    El filtro de rango es el inclusivo por día (el original comparaba fechas
+    sin zona con límites con zona y no llegaba a filtrar).
+    """
+    frames = {name: df.copy() for name, df in sheets.items()}
+    compras_df, ventas_df, gastos_df, proceso_df, almacen_df = (
+        frames[name] for name in ['compras', 'ventas', 'gastos', 'proceso', 'almacen'])
+    all_frames = [compras_df, ventas_df, gastos_df, proceso_df, almacen_df]
+
+    for df in all_frames:
+        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+        for col in df.columns:
+            if col.lower() in ['cantidad', 'precio', 'total', 'monto', 'preciototal']:
+                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    if start_date or end_date:
+        start = pd.Timestamp(start_date) if start_date else pd.Timestamp.min
+        end = pd.Timestamp(end_date) + pd.Timedelta(days=1) if end_date else pd.Timestamp.max
+        all_frames = [df[(df['fecha'] >= start) & (df['fecha'] < end)] for df in all_frames]
+        compras_df, ventas_df, gastos_df, proceso_df, almacen_df = all_frames
+
+    all_dates = pd.concat([df[['fecha']] for df in all_frames if not df.empty])
+    unique_dates = sorted(all_dates['fecha'].dt.date.unique())
+
+    proceso_df = proceso_df.assign(es_adelanto=proceso_df['notas'].astype(str).str.contains(
+        'Compra con adelanto', case=False, na=False))
+
+    daily_summaries = []
+    for date in unique_dates:
+        day_compras = compras_df[compras_df['fecha'].dt.date == date]
+        day_ventas = ventas_df[ventas_df['fecha'].dt.date == date]
+        day_gastos = gastos_df[gastos_df['fecha'].dt.date == date]
+        day_proceso = proceso_df[proceso_df['fecha'].dt.date == date]
+
+        kg_comprados = day_compras['cantidad'].sum()
+        kg_vendidos = day_ventas['cantidad'].sum()
+        ingresos = day_ventas['total'].sum()
+        gastos_total = day_gastos['monto'].sum()
+
+        if not day_gastos.empty:
+            descripcion = day_gastos['descripcion'].astype(str).str.upper()
+            gastos_efectivo = day_gastos[descripcion.str.contains('EFECTIVO', na=False)]['monto'].sum()
+            gastos_transferencia = day_gastos[descripcion.str.contains('TRANSFERENCIA', na=False)]['monto'].sum()
+        else:
+            gastos_efectivo = 0
+            gastos_transferencia = 0
+
+        compras_con_adelantos = 0
+        compras_sin_adelantos = 0
+        if not day_proceso.empty:
+            compras_con_adelantos = day_proceso[day_proceso['es_adelanto']]['total'].sum()
+            compras_sin_adelantos = day_proceso[~day_proceso['es_adelanto']]['total'].sum()
+
+        daily_summaries.append({
+            'fecha': date.strftime('%Y-%m-%d'),
+            'inventario': {
+                'kg_comprados': float(kg_comprados),
+                'kg_vendidos': float(kg_vendidos)
+            },
+            'financiero': {
+                'ingresos': float(ingresos),
+                'gastos': float(gastos_total),
+                'ganancia': float(ingresos - gastos_total),
+                'ganancia_real': 0.0
+            },
+            'compras': {
+                'total': float(compras_con_adelantos + compras_sin_adelantos),
+                'sin_adelantos': float(compras_sin_adelantos),
+                'con_adelantos': float(compras_con_adelantos)
+            },
+            'metodos_pago': {
+                'efectivo': float(gastos_efectivo),
+                'transferencia': float(gastos_transferencia),
+                'otro': float(gastos_total - gastos_efectivo - gastos_transferencia)
+            },
+            'operaciones': {
+                'compras': len(day_compras),
+                'ventas': len(day_ventas),
+                'gastos': len(day_gastos)
+            }
+        })
+    return daily_summaries
+
+@pytest.mark.parametrize('start_date, end_date', [
+    (None, None),
+    ('2024-03-02', '2024-03-05'),
+    ('2024-03-04', None),
+    (None, '2024-03-01'),
+])
+def test_resumenes_diarios_iguales_al_calculo_por_dia(monkeypatch, start_date, end_date):
+    monkeypatch.setattr(sheets_service, 'daily_rollup', DailyRollup())
+    raw = _raw_sheets()
+    sheets = {name: normalize_sheet(df) for name, df in raw.items()}
+
+    with query_session(lambda *names: {name: sheets[name] for name in names}):
+        result = get_daily_summaries(start_date, end_date)
+
+    assert result == _baseline_daily_summaries(raw, start_date, end_date)
+
+def test_rango_sin_actividad_devuelve_lista_vacia(monkeypatch):
+    monkeypatch.setattr(sheets_service, 'daily_rollup', DailyRollup())
+    sheets = {name: normalize_sheet(df) for name, df in _raw_sheets().items()}
+
+    with query_session(lambda *names: {name: sheets[name] for name in names}):
+        assert get_daily_summaries('2025-01-01', '2025-01-31') == []